@@ -0,0 +1,138 @@
+"""Контроль допуска вебхуков платежей в воркере.
+
+Одновременно обрабатывается не больше limit платежей; остальные ждут в
+короткой очереди FIFO (queue_size мест, не дольше queue_timeout секунд).
+Если очередь заполнена или ожидание истекло, вебхук сразу получает 503 с
+Retry-After: провайдер повторит его позже, а воркер не копит запросы,
+пока база данных перегружена.
+
+В адаптивном режиме limit меняется по AIMD от времени обработки платежа
+(работа с базой данных): медленнее target_latency — limit уменьшается в
+decrease раз (не чаще раза за время одной обработки), иначе растет на
+1/limit за платеж, то есть примерно на единицу за каждые limit платежей,
+в пределах [min_limit, max_limit].
+
+Все методы вызываются из event loop воркера, блокировки не нужны.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Optional
+
+from app.config import Config
+
+
+class Overloaded(Exception):
+    """Вебхук отклонен: reason — queue_full или queue_timeout"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionLimiter:
+    """Ограничение числа одновременно обрабатываемых запросов с очередью"""
+
+    def __init__(
+        self,
+        limit: int,
+        queue_size: int,
+        queue_timeout: float,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        target_latency: float = 0.1,
+        decrease: float = 0.9,
+    ):
+        self.max_limit = limit
+        self.min_limit = min(min_limit, limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.limit = float(limit)
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._decreased_at = float("-inf")
+
+    async def acquire(self) -> float:
+        """Занять место; возвращает время ожидания в очереди (секунды).
+
+        Overloaded, если очередь заполнена или ожидание истекло.
+        """
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return 0.0
+        if len(self._waiters) >= self.queue_size:
+            raise Overloaded("queue_full")
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        started = loop.time()
+        try:
+            # Место передается вместе с результатом waiter (см. _wake)
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded("queue_timeout") from None
+        except asyncio.CancelledError:
+            # Клиент отключился после того, как место уже передано
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        return loop.time() - started
+
+    def release(self, latency: Optional[float] = None) -> None:
+        """Освободить место; latency — время обработки для адаптивного limit"""
+        self.inflight -= 1
+        if self.adaptive and latency is not None:
+            self._adapt(latency)
+        self._wake()
+
+    def _adapt(self, latency: float) -> None:
+        now = asyncio.get_running_loop().time()
+        if latency > self.target_latency:
+            # Обработки, начатые до уменьшения, еще медленные: уменьшаем
+            # не чаще раза за время одной обработки
+            if now - self._decreased_at >= latency:
+                self.limit = max(self.limit * self.decrease, self.min_limit)
+                self._decreased_at = now
+        else:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+    def _wake(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                # Ожидание уже истекло или отменено
+                continue
+            self.inflight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "limit": int(self.limit),
+        }
+
+
+# None, если контроль допуска выключен
+webhook_admission = (
+    AdmissionLimiter(
+        limit=Config.WEBHOOK_MAX_INFLIGHT,
+        queue_size=Config.WEBHOOK_QUEUE_SIZE,
+        queue_timeout=Config.WEBHOOK_QUEUE_TIMEOUT,
+        adaptive=Config.WEBHOOK_ADAPTIVE_LIMIT,
+        min_limit=Config.WEBHOOK_MIN_INFLIGHT,
+        target_latency=Config.WEBHOOK_TARGET_LATENCY_MS / 1000,
+    )
+    if Config.WEBHOOK_ADMISSION_ENABLED
+    else None
+)
@@ -0,0 +1,386 @@
+"""Архив старых платежей в сегментах на локальном диске.
+
+Сегмент — неизменяемая пара файлов:
+
+- <name>.seg: подряд записанные блоки, каждый — zlib-сжатый JSON-массив до
+  ARCHIVE_BLOCK_ROWS строк, отсортированных по (user_id, created_at, id)
+- <name>.idx: разреженный индекс, для каждого блока первый и последний ключ
+  (user_id, created_at в микросекундах), смещение, длина и число строк
+
+manifest.json перечисляет опубликованные сегменты и границу архива:
+платежи старше границы читаются из сегментов, остальные из PostgreSQL.
+Сегменты покрывают непересекающиеся интервалы времени. Все файлы
+записываются во временный файл и переименовываются, поэтому читатели
+(воркеры сервера) никогда не видят частично записанных данных.
+
+Внутри воркера архив читается из пула потоков: манифест перечитывается и
+кеш блоков меняется под блокировкой, а запрос работает с одним снимком
+(граница и список сегментов), даже если архивация тем временем
+опубликовала новый сегмент.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from decimal import Decimal
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.config import Config
+from app.rows import PaymentRow
+from app.schemas import to_minor_units
+
+MANIFEST = "manifest.json"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+Cursor = Tuple[datetime, int]
+
+
+def to_micros(moment: datetime) -> int:
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def minor_units(amount) -> int:
+    # Сегменты, записанные до перехода на BIGINT, хранят десятичные строки
+    return amount if isinstance(amount, int) else to_minor_units(Decimal(amount))
+
+
+class SegmentWriter:
+    """Запись сегмента из строк, отсортированных по (user_id, created_at, id)"""
+
+    def __init__(self, directory: str, name: str, block_rows: int, level: int = 6):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.block_rows = block_rows
+        self.level = level
+        self.rows = 0
+        self._path = os.path.join(directory, f"{name}.seg")
+        self._file = open(f"{self._path}.tmp", "wb")
+        self._block: List[list] = []
+        self._blocks: List[list] = []
+        self._offset = 0
+
+    def add(self, row: PaymentRow) -> None:
+        self._block.append(
+            [
+                row.id,
+                row.transaction_id,
+                row.account_id,
+                row.user_id,
+                row.amount,
+                to_micros(row.created_at),
+            ]
+        )
+        if len(self._block) >= self.block_rows:
+            self._flush_block()
+
+    def _flush_block(self) -> None:
+        if not self._block:
+            return
+        data = zlib.compress(
+            json.dumps(self._block, separators=(",", ":")).encode(), self.level
+        )
+        first, last = self._block[0], self._block[-1]
+        self._blocks.append(
+            [
+                first[3],
+                first[5],
+                last[3],
+                last[5],
+                self._offset,
+                len(data),
+                len(self._block),
+            ]
+        )
+        self._file.write(data)
+        self._offset += len(data)
+        self.rows += len(self._block)
+        self._block = []
+
+    def close(self) -> dict:
+        """Завершение сегмента; возвращает его описание для манифеста"""
+        self._flush_block()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(f"{self._path}.tmp", self._path)
+        index = json.dumps({"blocks": self._blocks}, separators=(",", ":")).encode()
+        write_atomic(os.path.join(self.directory, f"{self.name}.idx"), index)
+        return {"name": self.name, "rows": self.rows, "bytes": self._offset}
+
+    def abort(self) -> None:
+        self._file.close()
+        os.unlink(f"{self._path}.tmp")
+
+
+class Segment:
+    """Открытый для чтения сегмент"""
+
+    def __init__(self, directory: str, meta: dict):
+        self.name = meta["name"]
+        self.since = meta["since"]
+        self.until = meta["until"]
+        self.path = os.path.join(directory, f"{self.name}.seg")
+        with open(os.path.join(directory, f"{self.name}.idx"), "rb") as f:
+            self.blocks = json.load(f)["blocks"]
+        self.last_keys = [(block[2], block[3]) for block in self.blocks]
+
+    def candidate_blocks(self, user_id: int, lower: int, upper: int) -> range:
+        """Блоки, которые могут содержать строки пользователя за [lower, upper]"""
+        start = bisect.bisect_left(self.last_keys, (user_id, lower))
+        end = start
+        while end < len(self.blocks) and (
+            self.blocks[end][0],
+            self.blocks[end][1],
+        ) <= (user_id, upper):
+            end += 1
+        return range(start, end)
+
+
+class ArchiveSnapshot(NamedTuple):
+    """Граница архива и сегменты (от новых к старым) одной версии манифеста"""
+
+    boundary: Optional[datetime]
+    segments: List[Segment]
+
+
+EMPTY = ArchiveSnapshot(None, [])
+
+
+class PaymentArchive:
+    """Чтение архива платежей с кешем распакованных блоков"""
+
+    def __init__(self, directory: str, cache_blocks: int):
+        self.directory = directory
+        self.cache_blocks = cache_blocks
+        self._manifest_mtime: Optional[float] = None
+        self._snapshot = EMPTY
+        self._cache: "OrderedDict[Tuple[str, int], list]" = OrderedDict()
+        # Архив читают потоки пула (read_user_async) и event loop
+        self._lock = threading.Lock()
+
+    def manifest(self) -> dict:
+        """Текущий манифест (пустой, если архива нет)"""
+        try:
+            with open(os.path.join(self.directory, MANIFEST), "rb") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"boundary": None, "segments": []}
+
+    def snapshot(self) -> ArchiveSnapshot:
+        """Текущие граница и сегменты архива.
+
+        Манифест меняет задание архивации; он перечитывается при смене mtime.
+        Читает файлы: из event loop вызывается через snapshot_async.
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(os.path.join(self.directory, MANIFEST)).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._manifest_mtime:
+                manifest = self.manifest()
+                boundary = manifest["boundary"]
+                self._snapshot = ArchiveSnapshot(
+                    from_micros(boundary) if boundary is not None else None,
+                    [
+                        Segment(self.directory, meta)
+                        for meta in reversed(manifest["segments"])
+                    ],
+                )
+                self._manifest_mtime = mtime
+            return self._snapshot
+
+    async def snapshot_async(self) -> ArchiveSnapshot:
+        """snapshot в пуле потоков: stat и чтение манифеста и индексов
+        сегментов не блокируют event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.snapshot)
+
+    def boundary(self) -> Optional[datetime]:
+        """Граница архива: платежи старше нее читаются из сегментов"""
+        return self.snapshot().boundary
+
+    def _block(self, segment: Segment, index: int) -> list:
+        key = (segment.name, index)
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                return rows
+        # Распаковка вне блокировки: сегменты неизменяемы, в худшем случае
+        # два потока прочитают один блок
+        _, _, _, _, offset, length, _ = segment.blocks[index]
+        with open(segment.path, "rb") as f:
+            f.seek(offset)
+            rows = json.loads(zlib.decompress(f.read(length)))
+        with self._lock:
+            self._cache[key] = rows
+            if len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+        return rows
+
+    @staticmethod
+    def _rows(segment: Segment):
+        # Полное чтение сегмента мимо кеша блоков
+        with open(segment.path, "rb") as f:
+            for _, _, _, _, offset, length, _ in segment.blocks:
+                f.seek(offset)
+                yield from json.loads(zlib.decompress(f.read(length)))
+
+    def read_user(
+        self,
+        user_id: int,
+        limit: Optional[int] = None,
+        before: Optional[Cursor] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        snapshot: Optional[ArchiveSnapshot] = None,
+    ) -> List[PaymentRow]:
+        """Платежи пользователя из архива от новых к старым.
+
+        before — (created_at, id) последней строки предыдущей страницы,
+        since/until — период как у PaymentService (until не включается),
+        limit=None — без ограничения. snapshot — версия архива, по границе
+        которой уже прочитаны строки PostgreSQL (по умолчанию текущая).
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        lower = to_micros(since) if since is not None else -(2**63)
+        upper = to_micros(until) - 1 if until is not None else 2**63
+        cursor = None
+        if before is not None:
+            cursor = (to_micros(before[0]), before[1])
+            upper = min(upper, cursor[0])
+
+        result: List[PaymentRow] = []
+        for segment in snapshot.segments:
+            if segment.until <= lower or (
+                segment.since is not None and segment.since > upper
+            ):
+                continue
+            found = []
+            for index in segment.candidate_blocks(user_id, lower, upper):
+                for row in self._block(segment, index):
+                    if row[3] != user_id or not lower <= row[5] <= upper:
+                        continue
+                    if cursor is not None and (row[5], row[0]) >= cursor:
+                        continue
+                    found.append(row)
+            found.sort(key=lambda row: (row[5], row[0]), reverse=True)
+            if limit is not None:
+                found = found[: limit - len(result)]
+            for row in found:
+                result.append(
+                    PaymentRow(
+                        row[0],
+                        row[1],
+                        row[2],
+                        row[3],
+                        minor_units(row[4]),
+                        from_micros(row[5]),
+                    )
+                )
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def account_totals(self) -> Tuple[Optional[datetime], Dict[int, List[int]]]:
+        """Граница архива и [сумма, число платежей] каждого счета в архиве.
+
+        Читает все блоки всех сегментов; используется один раз при первом
+        запуске сверки балансов.
+        """
+        snapshot = self.snapshot()
+        totals: Dict[int, List[int]] = {}
+        for segment in snapshot.segments:
+            for row in self._rows(segment):
+                total = totals.setdefault(row[2], [0, 0])
+                total[0] += minor_units(row[4])
+                total[1] += 1
+        return snapshot.boundary, totals
+
+    def earliest(self) -> Optional[datetime]:
+        """Время самого старого платежа архива (None, если архив пуст)"""
+        # Сегменты покрывают непересекающиеся интервалы: достаточно первого
+        # непустого по времени
+        for segment in reversed(self.snapshot().segments):
+            found = min((row[5] for row in self._rows(segment)), default=None)
+            if found is not None:
+                return from_micros(found)
+        return None
+
+    def daily_totals(
+        self, since: datetime, until: datetime
+    ) -> Dict[date, Dict[int, int]]:
+        """Суммы платежей по дням UTC и счетам за [since, until).
+
+        Читаются только сегменты, пересекающиеся с периодом.
+        """
+        lower, upper = to_micros(since), to_micros(until)
+        totals: Dict[date, Dict[int, int]] = {}
+        for segment in self.snapshot().segments:
+            if segment.until <= lower or (
+                segment.since is not None and segment.since >= upper
+            ):
+                continue
+            for row in self._rows(segment):
+                if lower <= row[5] < upper:
+                    day = totals.setdefault(from_micros(row[5]).date(), {})
+                    day[row[2]] = day.get(row[2], 0) + minor_units(row[4])
+        return totals
+
+    async def read_user_async(self, *args, **kwargs) -> List[PaymentRow]:
+        """read_user в пуле потоков: чтение и распаковка блоков не блокируют
+        event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.read_user(*args, **kwargs))
+
+
+def publish(
+    directory: str, segment: dict, since: Optional[datetime], until: datetime
+) -> None:
+    """Добавление сегмента в манифест и сдвиг границы архива до until"""
+    archive = PaymentArchive(directory, 0)
+    manifest = archive.manifest()
+    segment = dict(
+        segment,
+        since=to_micros(since) if since is not None else None,
+        until=to_micros(until),
+    )
+    manifest["segments"].append(segment)
+    manifest["boundary"] = to_micros(until)
+    write_atomic(
+        os.path.join(directory, MANIFEST), json.dumps(manifest, indent=1).encode()
+    )
+
+
+def archive_stats(directory: str) -> Dict[str, int]:
+    manifest = PaymentArchive(directory, 0).manifest()
+    return {
+        "segments": len(manifest["segments"]),
+        "rows": sum(segment["rows"] for segment in manifest["segments"]),
+        "bytes": sum(segment["bytes"] for segment in manifest["segments"]),
+    }
+
+
+payment_archive = PaymentArchive(Config.ARCHIVE_DIR, Config.ARCHIVE_CACHE_BLOCKS)
@@ -1,7 +1,7 @@
+import asyncio
 from datetime import datetime, timedelta
 from typing import Optional, Union
 
-import bcrypt
 import jwt
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,16 +14,36 @@ class AuthService:
     """Сервис для аутентификации и авторизации пользователей"""
 
     @staticmethod
-    def hash_password(password: str) -> str:
-        """Хеширование пароля"""
-        salt = bcrypt.gensalt()
+    def hash_password(password: str, salt: Optional[bytes] = None) -> str:
+        """Хеширование пароля; salt по умолчанию случайная"""
+        # bcrypt нужен только на путях входа и смены пароля
+        import bcrypt
+
+        if salt is None:
+            salt = bcrypt.gensalt()
         return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
 
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
         """Проверка пароля"""
+        import bcrypt
+
         return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
 
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Хеширование пароля в пуле потоков, чтобы не блокировать event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, AuthService.hash_password, password)
+
+    @staticmethod
+    async def verify_password_async(password: str, hashed_password: str) -> bool:
+        """Проверка пароля в пуле потоков, чтобы не блокировать event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, AuthService.verify_password, password, hashed_password
+        )
+
     @staticmethod
     def create_token(user_id: int, role: str) -> str:
         """Создание JWT токена"""
@@ -56,7 +76,9 @@ class AuthService:
         result = await session.execute(stmt)
         user = result.scalar_one_or_none()
 
-        if user and AuthService.verify_password(password, user.password_hash):
+        if user and await AuthService.verify_password_async(
+            password, user.password_hash
+        ):
             return user
         return None
 
@@ -69,7 +91,9 @@ class AuthService:
         result = await session.execute(stmt)
         admin = result.scalar_one_or_none()
 
-        if admin and AuthService.verify_password(password, admin.password_hash):
+        if admin and await AuthService.verify_password_async(
+            password, admin.password_hash
+        ):
             return admin
         return None
 
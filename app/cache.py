@@ -0,0 +1,134 @@
+"""Внутрипроцессный кеш счетов пользователей"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.rows import AccountRow
+
+
+class AccountCache:
+    """LRU-кеш счетов пользователя с TTL и сквозной записью.
+
+    Все методы синхронные и не содержат await, поэтому в рамках одного
+    event loop выполняются атомарно. Кеш локален для воркера: изменения,
+    сделанные другими воркерами, становятся видны не позднее чем через TTL.
+    """
+
+    def __init__(self, max_users: int, ttl: float, clock=time.monotonic):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, Dict[int, AccountRow]]]" = (
+            OrderedDict()
+        )
+        # Номер последней записи и записи, случившиеся во время загрузки из БД
+        self._seq = 0
+        self._inflight: Dict[int, int] = {}
+        self._written: Dict[int, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_fills = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_users > 0
+
+    def get(self, user_id: int) -> Optional[List[AccountRow]]:
+        """Получение счетов пользователя из кеша или None при промахе"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, accounts = entry
+        if expires_at <= self._clock():
+            del self._entries[user_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return sorted(accounts.values())
+
+    def begin_load(self, user_id: int) -> int:
+        """Регистрация начала загрузки счетов из БД, возвращает токен"""
+        self._inflight[user_id] = self._inflight.get(user_id, 0) + 1
+        return self._seq
+
+    def finish_load(
+        self,
+        user_id: int,
+        token: int,
+        accounts: Optional[List[AccountRow]],
+    ) -> None:
+        """Сохранение загруженных счетов.
+
+        Если во время загрузки по пользователю прошла запись, прочитанные
+        данные могут быть старше нее, и они отбрасываются. accounts=None
+        означает, что загрузка завершилась ошибкой.
+        """
+        remaining = self._inflight.pop(user_id, 1) - 1
+        if remaining:
+            self._inflight[user_id] = remaining
+            written = self._written.get(user_id)
+        else:
+            written = self._written.pop(user_id, None)
+
+        if accounts is None or not self.enabled:
+            return
+        if written is not None and written > token:
+            self.stale_fills += 1
+            return
+
+        self._entries[user_id] = (
+            self._clock() + self.ttl,
+            {account.id: account for account in accounts},
+        )
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def update_account(self, snapshot: AccountRow) -> None:
+        """Сквозная запись закоммиченного состояния счета"""
+        self._mark_written(snapshot.user_id)
+        entry = self._entries.get(snapshot.user_id)
+        if entry is not None:
+            entry[1][snapshot.id] = snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        """Удаление счетов пользователя из кеша"""
+        self._mark_written(user_id)
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Полная очистка кеша"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Статистика использования кеша"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_users": self.max_users,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_fills": self.stale_fills,
+        }
+
+    def _mark_written(self, user_id: int) -> None:
+        self._seq += 1
+        if user_id in self._inflight:
+            self._written[user_id] = self._seq
+
+
+account_cache = AccountCache(Config.ACCOUNT_CACHE_MAX_USERS, Config.ACCOUNT_CACHE_TTL)
@@ -0,0 +1,209 @@
+"""Дневные срезы балансов счетов.
+
+Срез (account_id, day, balance) — баланс счета на конец дня UTC: сумма
+всех его платежей до полуночи следующего дня. Строка пишется только за
+дни с платежами счета, поэтому срез дня строится из предыдущего среза
+счета и платежей за этот день, а баланс на любой момент — из последнего
+среза до него и платежей после среза (AccountService.get_balance_as_of).
+
+День строится, когда все его платежи закоммичены: через settle секунд
+после полуночи (та же оценка длительности транзакций, что у
+app.reconciliation). Платежи старше границы архива берутся из сегментов
+app.archive.
+
+Каждый день строится в отдельной транзакции под pg_try_advisory_xact_lock
+и сдвигает balance_checkpoint_state.day, поэтому прерванное построение
+продолжается с первого непостроенного дня.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.archive import PaymentArchive, payment_archive
+
+LOCK_KEY = 7_311_002
+DAY = timedelta(days=1)
+
+TRY_LOCK = text("SELECT pg_try_advisory_xact_lock(:key)")
+
+READ_STATE = text("SELECT day, now() FROM balance_checkpoint_state WHERE id = 1")
+
+LOCK_STATE = text("SELECT day FROM balance_checkpoint_state WHERE id = 1 FOR UPDATE")
+
+WRITE_STATE = text("""
+    UPDATE balance_checkpoint_state SET day = :day, updated_at = now() WHERE id = 1
+    """)
+
+# Первичный ключ (id, created_at) есть в каждой секции: первая строка без
+# чтения таблицы
+FIRST_PAYMENT = text("SELECT created_at FROM payments ORDER BY id LIMIT 1")
+
+# Платежи дня из PostgreSQL (по BRIN-индексу created_at) и из архива
+# (параметры accounts/totals) добавляются к предыдущему срезу счета
+BUILD_DAY = text("""
+    INSERT INTO balance_checkpoints (account_id, day, balance)
+    SELECT d.account_id, CAST(:day AS date), coalesce(prev.balance, 0) + d.total
+    FROM (
+        SELECT account_id, CAST(sum(total) AS bigint) AS total
+        FROM (
+            SELECT account_id, amount AS total FROM payments
+            WHERE created_at >= :start AND created_at < :end
+            UNION ALL
+            SELECT * FROM unnest(
+                CAST(:accounts AS integer[]), CAST(:totals AS bigint[])
+            )
+        ) AS day_payments
+        GROUP BY account_id
+    ) AS d
+    LEFT JOIN LATERAL (
+        SELECT balance FROM balance_checkpoints c
+        WHERE c.account_id = d.account_id AND c.day < CAST(:day AS date)
+        ORDER BY c.day DESC
+        LIMIT 1
+    ) AS prev ON true
+    ON CONFLICT (account_id, day) DO UPDATE SET balance = excluded.balance
+    """)
+
+DayTotals = Dict[date, Dict[int, int]]
+
+
+def day_start(day: date) -> datetime:
+    """Полночь UTC, с которой начинается день"""
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def last_closed_day(now: datetime, settle: float) -> date:
+    """Последний день, все платежи которого уже закоммичены"""
+    return (now - timedelta(seconds=settle)).astimezone(timezone.utc).date() - DAY
+
+
+class ArchiveMoved(Exception):
+    """Граница архива сдвинулась во время построения дня"""
+
+
+class CheckpointBuilder:
+    """Построение дневных срезов балансов по порядку дней"""
+
+    def __init__(
+        self,
+        settle: float,
+        chunk_days: int = 31,
+        archive: PaymentArchive = payment_archive,
+    ):
+        self.settle = settle
+        self.chunk_days = chunk_days
+        self.archive = archive
+
+    async def pending(self, conn) -> Tuple[Optional[date], date]:
+        """Первый непостроенный день (None, если платежей нет) и последний
+        день, который уже можно построить"""
+        built, now = (await conn.execute(READ_STATE)).one()
+        last = last_closed_day(now, self.settle)
+        if built is not None:
+            return built + DAY, last
+
+        candidates = []
+        first = (await conn.execute(FIRST_PAYMENT)).scalar()
+        if first is not None:
+            # Платеж с меньшим временем может иметь id больше первого
+            candidates.append(first - timedelta(seconds=self.settle))
+        loop = asyncio.get_running_loop()
+        archived = await loop.run_in_executor(None, self.archive.earliest)
+        if archived is not None:
+            candidates.append(archived)
+        if not candidates:
+            return None, last
+        return min(candidates).astimezone(timezone.utc).date(), last
+
+    async def build(
+        self,
+        engine,
+        until: Optional[date] = None,
+        progress: Optional[Callable[[date, int], None]] = None,
+    ) -> Optional[dict]:
+        """Построение всех закрытых дней (не позже until).
+
+        Архив читается порциями по chunk_days дней. progress(day, rows)
+        вызывается после каждого дня. None, если срезы строит другой
+        процесс.
+        """
+        async with engine.connect() as conn:
+            day, last = await self.pending(conn)
+        if until is not None:
+            last = min(last, until)
+        built = {"days": 0, "checkpoints": 0, "day": None}
+        while day is not None and day <= last:
+            chunk_end = min(day + DAY * (self.chunk_days - 1), last)
+            boundary, archived = await self._archived(day, chunk_end)
+            try:
+                while day <= chunk_end:
+                    async with engine.connect() as conn:
+                        rows = await self.build_day(
+                            conn, day, boundary, archived.get(day, {})
+                        )
+                    if rows is None:
+                        return None
+                    built["days"] += 1
+                    built["checkpoints"] += rows
+                    built["day"] = day
+                    if progress is not None:
+                        progress(day, rows)
+                    day += DAY
+            except ArchiveMoved:
+                # Задание архивации опубликовало новый сегмент: суммы
+                # архива перечитываются с текущего дня
+                continue
+        return built
+
+    async def _archived(
+        self, first: date, last: date
+    ) -> Tuple[Optional[datetime], DayTotals]:
+        loop = asyncio.get_running_loop()
+        boundary = (await self.archive.snapshot_async()).boundary
+        start = day_start(first)
+        if boundary is None or boundary <= start:
+            return boundary, {}
+        end = min(day_start(last + DAY), boundary)
+        totals = await loop.run_in_executor(None, self.archive.daily_totals, start, end)
+        return boundary, totals
+
+    async def build_day(
+        self,
+        conn,
+        day: date,
+        boundary: Optional[datetime],
+        archived: Dict[int, int],
+    ) -> Optional[int]:
+        """Срезы счетов за один день; число записанных строк или None,
+        если день строит другой процесс"""
+        async with conn.begin():
+            if not (await conn.execute(TRY_LOCK, {"key": LOCK_KEY})).scalar():
+                return None
+            built = (await conn.execute(LOCK_STATE)).scalar()
+            if built is not None and built >= day:
+                return 0
+
+            start, end = day_start(day), day_start(day + DAY)
+            if boundary is not None and boundary > start:
+                # Строки старше границы уже в архиве (или ждут удаления)
+                start = min(boundary, end)
+            accounts = list(archived)
+            result = await conn.execute(
+                BUILD_DAY,
+                {
+                    "day": day,
+                    "start": start,
+                    "end": end,
+                    "accounts": accounts,
+                    "totals": [archived[account] for account in accounts],
+                },
+            )
+            # Архивация публикует сегмент до удаления строк: если граница
+            # не сдвинулась, выборка видела все платежи новее нее
+            if (await self.archive.snapshot_async()).boundary != boundary:
+                raise ArchiveMoved()
+            await conn.execute(WRITE_STATE, {"day": day})
+        return result.rowcount
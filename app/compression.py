@@ -0,0 +1,110 @@
+"""Сжатие HTTP-ответов gzip"""
+
+import asyncio
+import gzip
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Проверка, что клиент принимает gzip (с учетом q=0)"""
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def _compress(body: bytes, level: int) -> Tuple[bytes, float]:
+    started = time.thread_time()
+    compressed = gzip.compress(body, compresslevel=level, mtime=0)
+    return compressed, time.thread_time() - started
+
+
+class GzipCompressor:
+    """Сжатие тел ответов с выносом больших тел в пул потоков.
+
+    Маршрут отключает сжатие параметром ctx_gzip=False. Потоковые ответы
+    (например, Server-Sent Events) не сжимаются.
+    """
+
+    def __init__(self, min_size: int, thread_threshold: int, level: int, threads: int):
+        self.min_size = min_size
+        self.thread_threshold = thread_threshold
+        self.level = level
+        self.threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.compressed = 0
+        self.offloaded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    async def compress(self, request, response) -> None:
+        """Сжатие ответа на месте, если это допустимо и выгодно"""
+        body = response.body
+        if body is None or len(body) < self.min_size:
+            return
+        if response.status < 200 or response.status in (204, 304):
+            return
+        if "content-encoding" in response.headers:
+            return
+        if not (response.content_type or "").startswith(COMPRESSIBLE_TYPES):
+            return
+        route = request.route
+        if route is not None and getattr(route.ctx, "gzip", True) is False:
+            return
+
+        response.headers["vary"] = "Accept-Encoding"
+        if not accepts_gzip(request.headers.get("accept-encoding")):
+            return
+
+        if len(body) >= self.thread_threshold:
+            loop = asyncio.get_running_loop()
+            compressed, cpu = await loop.run_in_executor(
+                self._get_executor(), _compress, body, self.level
+            )
+            self.offloaded += 1
+        else:
+            compressed, cpu = _compress(body, self.level)
+
+        self.compressed += 1
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        self.cpu_seconds += cpu
+
+        response.body = compressed
+        response.headers["content-encoding"] = "gzip"
+        if "content-length" in response.headers:
+            response.headers["content-length"] = str(len(compressed))
+
+    def stats(self) -> dict:
+        """Статистика сжатия"""
+        return {
+            "compressed": self.compressed,
+            "offloaded": self.offloaded,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else 0.0,
+            "cpu_seconds": round(self.cpu_seconds, 6),
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.threads, thread_name_prefix="gzip"
+            )
+        return self._executor
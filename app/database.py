@@ -1,14 +1,83 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import Config
 
-# Создание асинхронного движка базы данных
-engine = create_async_engine(Config.DATABASE_URL, echo=True, future=True)
+# Создание асинхронного движка базы данных (утилиты и фоновые задачи)
+engine = create_async_engine(Config.DATABASE_URL, echo=Config.SQL_ECHO, future=True)
 
 # Создание фабрики асинхронных сессий
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Полосы нагрузки сервера: у каждой свой пул соединений, время ожидания
+# соединения из пула и statement_timeout. Тяжелые запросы администратора
+# занимают только соединения своей полосы и не задерживают вебхуки
+LANES = ("webhook", "user", "admin")
+
+# SQLSTATE query_canceled: запрос прерван statement_timeout
+QUERY_CANCELED = "57014"
+
+
+def lane_options(lane: str) -> dict:
+    """Параметры движка полосы из Config (DB_<LANE>_*)"""
+    prefix = f"DB_{lane.upper()}"
+    return {
+        "pool_size": getattr(Config, f"{prefix}_POOL_SIZE"),
+        "max_overflow": getattr(Config, f"{prefix}_MAX_OVERFLOW"),
+        "pool_timeout": getattr(Config, f"{prefix}_POOL_TIMEOUT"),
+        "connect_args": {
+            "server_settings": {
+                "statement_timeout": str(
+                    getattr(Config, f"{prefix}_STATEMENT_TIMEOUT_MS")
+                ),
+                "application_name": f"paysystem-{lane}",
+            }
+        },
+    }
+
+
+def create_lane_engine(lane: str) -> AsyncEngine:
+    return create_async_engine(
+        Config.DATABASE_URL, echo=Config.SQL_ECHO, future=True, **lane_options(lane)
+    )
+
+
+lane_engines = {lane: create_lane_engine(lane) for lane in LANES}
+
+# Сессии полос: вебхуки платежей, запросы пользователей, администратор и отчеты
+webhook_session = async_sessionmaker(
+    lane_engines["webhook"], class_=AsyncSession, expire_on_commit=False
+)
+user_session = async_sessionmaker(
+    lane_engines["user"], class_=AsyncSession, expire_on_commit=False
+)
+admin_session = async_sessionmaker(
+    lane_engines["admin"], class_=AsyncSession, expire_on_commit=False
+)
+
+
+def all_engines() -> list:
+    """Синхронные движки всех пулов процесса (для журналов и профилей)"""
+    return [engine.sync_engine] + [
+        lane_engine.sync_engine for lane_engine in lane_engines.values()
+    ]
+
+
+def is_overloaded(exc: BaseException) -> bool:
+    """Ошибка перегрузки БД: истекло ожидание соединения полосы или
+    statement_timeout. Транзакция откатывается, запрос можно повторить."""
+    if isinstance(exc, PoolTimeoutError):
+        return True
+    if isinstance(exc, DBAPIError):
+        return getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED
+    return False
+
 
 class Base(DeclarativeBase):
     """Базовый класс для всех моделей SQLAlchemy"""
@@ -0,0 +1,262 @@
+"""Внутрипроцессная шина событий для push-уведомлений пользователям"""
+
+import asyncio
+import json
+import uuid
+from typing import Dict, Optional, Set
+
+from sqlalchemy.engine import make_url
+
+from app.config import Config
+from app.logs import logger
+from app.schemas import format_minor_units
+from app.utils import custom_json_serializer
+
+
+def payment_event(payment, account) -> dict:
+    """Событие о зачислении платежа на счет"""
+    return {
+        "type": "payment",
+        "payment": {
+            "id": payment.id,
+            "transaction_id": payment.transaction_id,
+            "account_id": payment.account_id,
+            "amount": format_minor_units(payment.amount),
+            "created_at": payment.created_at,
+        },
+        "account": {"id": account.id, "balance": format_minor_units(account.balance)},
+    }
+
+
+class Subscription:
+    """Подписка одного клиента на события пользователя"""
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.evicted = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event: dict) -> bool:
+        """Неблокирующая постановка события в очередь подписчика"""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Ожидание события; None при таймауте или после вытеснения"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def evict(self) -> None:
+        """Вытеснение подписчика, не успевающего читать события"""
+        self.evicted = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        # Пробуждаем ожидающего читателя
+        self._queue.put_nowait(None)
+
+
+class EventHub:
+    """Рассылка событий подписчикам текущего воркера.
+
+    Каждый подписчик имеет ограниченную очередь. Подписчик, очередь
+    которого переполнена, вытесняется: клиент переподключается и заново
+    запрашивает актуальное состояние.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.bridge: Optional["PgNotifyBridge"] = None
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+
+        self.published = 0
+        self.delivered = 0
+        self.evictions = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Создание подписки на события пользователя"""
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Удаление подписки"""
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: int, event: dict) -> None:
+        """Публикация события: локальным подписчикам и другим воркерам"""
+        self.published += 1
+        self.dispatch(user_id, event)
+        if self.bridge is not None:
+            self.bridge.notify(user_id, event)
+
+    def dispatch(self, user_id: int, event: dict) -> None:
+        """Доставка события подписчикам этого воркера"""
+        for subscription in list(self._subscribers.get(user_id, ())):
+            if subscription.offer(event):
+                self.delivered += 1
+            else:
+                subscription.evict()
+                self.unsubscribe(subscription)
+                self.evictions += 1
+
+    def close(self) -> None:
+        """Вытеснение всех подписчиков (при остановке воркера)"""
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.evict()
+                self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        """Статистика шины событий"""
+        return {
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evictions": self.evictions,
+        }
+
+
+class PgNotifyBridge:
+    """Рассылка событий между воркерами через PostgreSQL LISTEN/NOTIFY.
+
+    Все воркеры слушают один канал. Собственные уведомления воркер
+    пропускает, так как локальные подписчики уже получили событие.
+
+    Потерянное соединение (перезапуск PostgreSQL, сбой сети) открывается
+    заново с экспоненциальной задержкой; события для отправки тем временем
+    ждут в очереди. Уведомления других воркеров за время разрыва потеряны,
+    поэтому после переподключения подписчики воркера вытесняются и
+    перечитывают состояние.
+    """
+
+    def __init__(
+        self,
+        hub: EventHub,
+        database_url: str,
+        channel: str,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self.hub = hub
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._dsn = make_url(database_url).set(drivername="postgresql")
+        self._connection = None
+        self._connected = asyncio.Event()
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=hub.queue_size * 10)
+        self._sender: Optional[asyncio.Task] = None
+        self._reconnector: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.dropped = 0
+        self.reconnects = 0
+
+    async def start(self) -> None:
+        """Подключение к БД и подписка на канал"""
+        await self._connect()
+        self._sender = asyncio.create_task(self._send_loop())
+        self.hub.bridge = self
+
+    async def stop(self) -> None:
+        """Отписка от канала и закрытие соединения"""
+        self._stopping = True
+        self.hub.bridge = None
+        for task in (self._sender, self._reconnector):
+            if task is not None:
+                task.cancel()
+        if self._connection is not None:
+            await self._connection.close()
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        connection = await asyncpg.connect(
+            self._dsn.render_as_string(hide_password=False)
+        )
+        try:
+            await connection.add_listener(self.channel, self._on_notification)
+        except Exception:
+            await connection.close()
+            raise
+        connection.add_termination_listener(self._lost)
+        self._connection = connection
+        self._connected.set()
+
+    def _lost(self, connection) -> None:
+        # Соединение закрыто сервером или сетью: LISTEN больше не доставляет
+        # уведомления
+        if self._stopping or connection is not self._connection:
+            return
+        self._connection = None
+        self._connected.clear()
+        self._reconnector = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+            except Exception as e:
+                logger.warning(
+                    "Event bridge reconnect failed",
+                    extra={"error": repr(e), "retry_in": delay},
+                )
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            self.reconnects += 1
+            self.hub.close()
+            return
+
+    def notify(self, user_id: int, event: dict) -> None:
+        """Постановка события в очередь на отправку другим воркерам"""
+        payload = json.dumps(
+            {"origin": self.origin, "user_id": user_id, "event": event},
+            default=custom_json_serializer,
+        )
+        try:
+            self._outbox.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _send_loop(self) -> None:
+        while True:
+            payload = await self._outbox.get()
+            await self._connected.wait()
+            connection = self._connection
+            try:
+                await connection.execute(
+                    "SELECT pg_notify($1, $2)", self.channel, payload
+                )
+            except Exception:
+                self.dropped += 1
+                if connection.is_closed():
+                    self._lost(connection)
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        message = json.loads(payload)
+        if message["origin"] == self.origin:
+            return
+        self.hub.dispatch(message["user_id"], message["event"])
+
+    def stats(self) -> dict:
+        """Статистика моста"""
+        return {
+            "connected": int(self._connected.is_set()),
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+event_hub = EventHub(Config.EVENTS_QUEUE_SIZE)
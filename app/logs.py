@@ -0,0 +1,174 @@
+"""Структурированное логирование без блокировки event loop.
+
+Записи ставятся в ограниченную очередь в потоке вызывающего кода, а
+форматирование в JSON и запись в stdout выполняет фоновый поток
+QueueListener. При переполнении очереди записи отбрасываются, а не
+блокируют обработку запросов.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from app.config import Config
+
+logger = logging.getLogger("paysystem")
+
+# Идентификатор текущего запроса (устанавливается middleware)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Стандартные атрибуты LogRecord; все остальные попадают в JSON как поля
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записи в одну строку JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Добавление request_id в запись в потоке вызывающего кода"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Сэмплирование частых событий.
+
+    Запись с атрибутом sample_rate (передается через extra) пропускается
+    с этой вероятностью; записи без него не сэмплируются.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        super().__init__()
+        self._random = (rng or random.Random()).random
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or self._random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """Ограничение повторяющихся одинаковых ошибок.
+
+    Для записей уровня ERROR и выше с одинаковыми логгером, шаблоном
+    сообщения и типом исключения пропускается не более burst записей за
+    interval секунд. Число подавленных записей добавляется в следующую
+    пропущенную запись как поле suppressed.
+    """
+
+    def __init__(self, interval: float, burst: int, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._clock = clock
+        self._windows: Dict[Tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info else None
+        key = (record.name, record.msg, exc_type)
+        now = self._clock()
+
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            if len(self._windows) > 1000:
+                self._windows.clear()
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокируется на полной очереди"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение собирается сразу, а traceback форматируется в фоновом
+        # потоке: очередь не покидает процесс, exc_info можно передать как есть
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging() -> DroppingQueueHandler:
+    """Подключение очереди логов и фонового потока записи для логгера приложения"""
+    global _listener
+
+    for handler in logger.handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return handler
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RateLimitFilter(Config.LOG_RATE_INTERVAL, Config.LOG_RATE_BURST))
+    handler.addFilter(ContextFilter())
+
+    logger.addHandler(handler)
+    logger.setLevel(Config.LOG_LEVEL)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(
+        handler.queue, stream, respect_handler_level=True
+    )
+    _listener.start()
+    return handler
+
+
+def stop_logging() -> None:
+    """Остановка фонового потока с записью оставшихся сообщений"""
+    global _listener
+    for handler in list(logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            logger.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
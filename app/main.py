@@ -1,15 +1,143 @@
+import asyncio
+import time
+
 from sanic import Sanic
-from sanic.response import json
+from sanic.exceptions import SanicException
+from sanic.response import json, text
 from sanic_ext import Extend
 
+from app.admission import webhook_admission
+from app.cache import account_cache
+from app.compression import GzipCompressor
+from app.config import Config
+from app.database import all_engines, engine, is_overloaded, lane_engines
+from app.events import PgNotifyBridge, event_hub
+from app.logs import logger, request_id_var, setup_logging, stop_logging
+from app.metrics import clear_directory, collect, metrics, render, route_table
+from app.profiling import profiler
+from app.reconciliation import reconciler
+from app.slow_queries import slow_query_log
+from app.watchdog import LoopWatchdog
+
 
 def create_app() -> Sanic:
     """Создание и настройка приложения Sanic"""
+    setup_logging()
     app = Sanic("paysystem")
+    app.config.update(
+        {
+            "KEEP_ALIVE_TIMEOUT": Config.KEEP_ALIVE_TIMEOUT,
+            "REQUEST_TIMEOUT": Config.REQUEST_TIMEOUT,
+            "RESPONSE_TIMEOUT": Config.RESPONSE_TIMEOUT,
+            "REQUEST_MAX_SIZE": Config.REQUEST_MAX_SIZE,
+            "GRACEFUL_SHUTDOWN_TIMEOUT": Config.GRACEFUL_SHUTDOWN_TIMEOUT,
+        }
+    )
 
     # Расширения
     Extend(app)
 
+    # Метрики. Middleware регистрируются первыми: request-middleware идут в
+    # порядке регистрации, response-middleware в обратном, поэтому время
+    # запроса включает работу остальных middleware (в том числе сжатие)
+    if Config.METRICS_ENABLED:
+
+        @app.main_process_start
+        async def clear_metrics(app, loop):
+            clear_directory(Config.METRICS_DIR)
+
+        @app.after_server_start
+        async def start_metrics(app, loop):
+            metrics.start(Config.METRICS_DIR, route_table(app))
+            gzip = getattr(app.ctx, "gzip", None)
+            pools = {"default": engine.sync_engine.pool}
+            for lane, lane_engine in lane_engines.items():
+                pools[lane] = lane_engine.sync_engine.pool
+            metrics.start_sampler(
+                Config.METRICS_SAMPLE_INTERVAL,
+                lambda: metrics.sample(
+                    pools,
+                    account_cache.stats(),
+                    gzip.stats() if gzip else None,
+                    event_hub.stats(),
+                    webhook_admission.stats() if webhook_admission else None,
+                    event_hub.bridge.stats() if event_hub.bridge else None,
+                ),
+            )
+
+        @app.before_server_stop
+        async def stop_metrics(app, loop):
+            metrics.stop_sampler()
+
+        @app.on_request
+        async def start_timer(request):
+            request.ctx.started = time.perf_counter()
+
+        @app.on_response
+        async def observe_request(request, response):
+            metrics.observe_request(
+                request.route.name if request.route else None,
+                request.method,
+                response.status,
+                time.perf_counter() - request.ctx.started,
+            )
+
+        @app.get("/metrics")
+        async def metrics_endpoint(request):
+            return text(
+                render(collect(Config.METRICS_DIR)),
+                content_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+
+    # Журнал медленных запросов с EXPLAIN для выборки SELECT во всех пулах;
+    # EXPLAIN выполняется в пуле по умолчанию, не занимая полосы запросов
+    if Config.SLOW_QUERY_ENABLED:
+        for sync_engine in all_engines():
+            slow_query_log.install(sync_engine, explain_engine=engine)
+
+    # Обнаружение блокировок event loop. В строгом режиме (интеграционные
+    # тесты) ответ обработчика, заблокировавшего loop, получает заголовок
+    # X-Loop-Blocked-Ms
+    if Config.LOOP_WATCHDOG_ENABLED:
+        app.ctx.watchdog = LoopWatchdog(
+            Config.LOOP_BLOCK_THRESHOLD, on_block=metrics.loop_blocked
+        )
+
+        @app.after_server_start
+        async def start_watchdog(app, loop):
+            app.ctx.watchdog.start(loop)
+
+        @app.before_server_stop
+        async def stop_watchdog(app, loop):
+            app.ctx.watchdog.stop()
+
+        if Config.LOOP_WATCHDOG_STRICT:
+
+            @app.on_response
+            async def report_loop_block(request, response):
+                blocked = app.ctx.watchdog.blocked_for(asyncio.current_task())
+                if blocked is not None:
+                    response.headers["X-Loop-Blocked-Ms"] = f"{blocked * 1000:.1f}"
+
+    # Профилирование запросов по требованию: заголовок X-Profile с токеном
+    # администратора или выборка PROFILE_SAMPLE_RATE
+    if Config.PROFILING_ENABLED:
+
+        @app.on_request
+        async def begin_profile(request):
+            if await profiler.should_profile(request):
+                request.ctx.profile = profiler.begin(
+                    request.method, request.path, all_engines()
+                )
+
+        @app.on_response
+        async def end_profile(request, response):
+            profile = getattr(request.ctx, "profile", None)
+            if profile is not None:
+                route = request.route.name if request.route else None
+                profiler.end(profile, route, response.status)
+                response.headers["X-Profile-Id"] = str(profile.id)
+
     # Простой тестовый роут
     @app.get("/health")
     async def health_check(request):
@@ -19,31 +147,100 @@ def create_app() -> Sanic:
     async def root(request):
         return json({"message": "Payment System API", "status": "running"})
 
-    # Добавляем все роуты
-    try:
-        from app.routes.auth import auth_bp
-        from app.routes.users import users_bp
-        from app.routes.admin import admin_bp
-        from app.routes.webhooks import webhooks_bp
+    # Добавляем все роуты. Ошибка импорта роутов останавливает запуск:
+    # воркер без части роутов хуже, чем воркер, который не стартовал
+    from app.routes.auth import auth_bp
+    from app.routes.users import users_bp
+    from app.routes.admin import admin_bp
+    from app.routes.webhooks import webhooks_bp
+
+    app.blueprint(auth_bp)
+    app.blueprint(users_bp)
+    app.blueprint(admin_bp)
+    app.blueprint(webhooks_bp)
+
+    # При остановке закрываем потоки событий, чтобы они не задерживали
+    # завершение воркера; клиенты переподключатся к другому воркеру
+    @app.before_server_stop
+    async def close_event_streams(app, loop):
+        event_hub.close()
+
+    # Рассылка событий между воркерами через PostgreSQL
+    if Config.EVENTS_PG_NOTIFY:
+
+        @app.after_server_start
+        async def start_event_bridge(app, loop):
+            app.ctx.event_bridge = PgNotifyBridge(
+                event_hub, Config.DATABASE_URL, Config.EVENTS_PG_CHANNEL
+            )
+            await app.ctx.event_bridge.start()
+
+        @app.before_server_stop
+        async def stop_event_bridge(app, loop):
+            await app.ctx.event_bridge.stop()
+
+    # Сверка балансов: задача запускается в каждом воркере, шаги выполняет
+    # тот, кто получил advisory lock
+    if Config.RECONCILE_ENABLED:
 
-        app.blueprint(auth_bp)
-        app.blueprint(users_bp)
-        app.blueprint(admin_bp)
-        app.blueprint(webhooks_bp)
-    except Exception as e:
-        print(f"Failed to load routes: {e}")
+        @app.after_server_start
+        async def start_reconciliation(app, loop):
+            reconciler.start(engine)
+
+        @app.before_server_stop
+        async def stop_reconciliation(app, loop):
+            reconciler.stop()
+
+    # Сжатие ответов gzip
+    if Config.GZIP_ENABLED:
+        app.ctx.gzip = GzipCompressor(
+            min_size=Config.GZIP_MIN_SIZE,
+            thread_threshold=Config.GZIP_THREAD_THRESHOLD,
+            level=Config.GZIP_LEVEL,
+            threads=Config.GZIP_THREADS,
+        )
+
+        @app.on_response
+        async def gzip_response(request, response):
+            await app.ctx.gzip.compress(request, response)
+
+    # Идентификатор запроса для логов: из X-Request-ID или сгенерированный
+    @app.on_request
+    async def bind_request_id(request):
+        request_id_var.set(str(request.id))
+
+    @app.on_response
+    async def add_request_id(request, response):
+        response.headers["X-Request-ID"] = str(request.id)
+
+    # Сбрасываем оставшиеся записи логов при остановке воркера
+    @app.after_server_stop
+    async def flush_logs(app, loop):
+        stop_logging()
 
     # Обработчик ошибок
     @app.exception(Exception)
     async def exception_handler(request, exception):
-        print(f"Exception: {exception}")
-        return json({"error": "Internal server error"}), 500
+        if isinstance(exception, SanicException):
+            return json({"error": str(exception)}, status=exception.status_code)
+        if is_overloaded(exception):
+            # Полоса пула занята или истек statement_timeout: клиент
+            # повторяет запрос позже, остальные полосы не затронуты
+            return json(
+                {"error": "Service busy"},
+                status=503,
+                headers={"Retry-After": str(Config.DB_RETRY_AFTER)},
+            )
+        logger.exception(
+            "Unhandled exception",
+            extra={"path": request.path, "method": request.method},
+        )
+        return json({"error": "Internal server error"}, status=500)
 
     return app
 
 
 if __name__ == "__main__":
-    from app.config import Config
-
+    # Режим разработки; для production используйте python -m app.server
     app = create_app()
     app.run(host=Config.HOST, port=Config.PORT, debug=True, single_process=True)
@@ -0,0 +1,499 @@
+"""Метрики приложения в формате Prometheus.
+
+Каждый воркер пишет значения в свой файл в METRICS_DIR, отображенный в
+память (mmap). Файл состоит из заголовка со списком сэмплов и массива
+double; писатель в файле один (event loop воркера), поэтому запись не
+требует блокировок. /metrics читает файлы всех воркеров и суммирует их,
+так что один запрос видит весь узел.
+
+Формат файла: b"PSM1", длина заголовка (uint32), JSON-список сэмплов,
+выравнивание до 8 байт, значения (double, порядок байт платформы).
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"PSM1"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+WEBHOOK_OUTCOMES = (
+    "success",
+    "duplicate",
+    "bad_signature",
+    "rejected",
+    "busy",
+    "error",
+)
+ADMISSION_REJECTIONS = ("queue_full", "queue_timeout")
+POOL_STATES = ("size", "checked_in", "checked_out", "overflow")
+# Пулы процесса: движок по умолчанию (фоновые задачи) и полосы
+# app.database.LANES
+POOL_LANES = ("default", "webhook", "user", "admin")
+UNMATCHED_ROUTE = ("<unmatched>", "*")
+
+REQUESTS = "paysystem_http_requests_total"
+DURATION = "paysystem_http_request_duration_seconds"
+QUEUE_WAIT = "paysystem_webhook_queue_wait_seconds"
+
+# Имя -> (тип, описание, агрегация по воркерам)
+FAMILIES = {
+    REQUESTS: (
+        "counter",
+        "HTTP requests by route, method and status class",
+        "sum",
+    ),
+    DURATION: (
+        "histogram",
+        "HTTP request latency until the response is sent",
+        "sum",
+    ),
+    "paysystem_webhook_outcomes_total": ("counter", "Payment webhook outcomes", "sum"),
+    "paysystem_webhook_admission_rejections_total": (
+        "counter",
+        "Payment webhooks rejected with 503 by admission control",
+        "sum",
+    ),
+    QUEUE_WAIT: (
+        "histogram",
+        "Time admitted payment webhooks waited in the admission queue",
+        "sum",
+    ),
+    "paysystem_webhook_inflight": ("gauge", "Payment webhooks in progress", "sum"),
+    "paysystem_webhook_queued": (
+        "gauge",
+        "Payment webhooks waiting in the admission queue",
+        "sum",
+    ),
+    "paysystem_webhook_concurrency_limit": (
+        "gauge",
+        "Admission limit of concurrent payment webhooks",
+        "sum",
+    ),
+    "paysystem_db_pool_connections": (
+        "gauge",
+        "Database pool connections by lane and state",
+        "sum",
+    ),
+    "paysystem_event_loop_lag_seconds": (
+        "gauge",
+        "Event loop lag measured by the sampler, worst worker",
+        "max",
+    ),
+    "paysystem_event_loop_blocks_total": (
+        "counter",
+        "Event loop blocks longer than LOOP_BLOCK_THRESHOLD",
+        "sum",
+    ),
+    "paysystem_event_loop_blocked_seconds_total": (
+        "counter",
+        "Total duration of event loop blocks",
+        "sum",
+    ),
+    "paysystem_account_cache_users": ("gauge", "Users in the account cache", "sum"),
+    "paysystem_account_cache_events_total": (
+        "counter",
+        "Account cache lookups and removals",
+        "sum",
+    ),
+    "paysystem_gzip_responses_total": (
+        "counter",
+        "Responses compressed with gzip",
+        "sum",
+    ),
+    "paysystem_gzip_bytes_total": ("counter", "Bytes before and after gzip", "sum"),
+    "paysystem_gzip_offloaded_total": (
+        "counter",
+        "Responses compressed in the gzip thread pool",
+        "sum",
+    ),
+    "paysystem_gzip_cpu_seconds_total": (
+        "counter",
+        "CPU time spent compressing responses",
+        "sum",
+    ),
+    "paysystem_event_subscribers": ("gauge", "Open event streams", "sum"),
+    "paysystem_events_total": ("counter", "Events published and delivered", "sum"),
+    "paysystem_event_bridge_connected": (
+        "gauge",
+        "Workers with a live LISTEN/NOTIFY connection",
+        "sum",
+    ),
+    "paysystem_event_bridge_dropped_total": (
+        "counter",
+        "Events not sent to other workers",
+        "sum",
+    ),
+    "paysystem_event_bridge_reconnects_total": (
+        "counter",
+        "LISTEN/NOTIFY connections reopened after a loss",
+        "sum",
+    ),
+    "paysystem_reconciled_payments_total": (
+        "counter",
+        "Payments added to reconciled account sums",
+        "sum",
+    ),
+    "paysystem_balance_drifts_total": (
+        "counter",
+        "Balance drifts found by reconciliation",
+        "sum",
+    ),
+}
+
+
+def sample_key(name: str, **labels) -> str:
+    """Строка сэмпла Prometheus: имя и метки"""
+    if not labels:
+        return name
+    inner = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return f"{name}{{{inner}}}"
+
+
+def family_of(key: str) -> str:
+    """Семейство метрики по строке сэмпла"""
+    name = key.split("{", 1)[0]
+    if name not in FAMILIES:
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[: -len(suffix)] in FAMILIES:
+                return name[: -len(suffix)]
+    return name
+
+
+class Metrics:
+    """Метрики воркера с фиксированной раскладкой значений.
+
+    До start значения хранятся в анонимной памяти, поэтому запись
+    метрик безопасна и в тестах, и до запуска сервера.
+    """
+
+    def __init__(self, routes: Iterable[Tuple[str, str, str]] = ()):
+        self.path: Optional[str] = None
+        self._build(routes)
+        self._map = mmap.mmap(-1, self._size)
+        self._values = memoryview(self._map)[self._offset :].cast("d")
+        self._sampler: Optional[asyncio.Task] = None
+
+    def _build(self, routes: Iterable[Tuple[str, str, str]]) -> None:
+        keys: List[str] = []
+        index: Dict[str, int] = {}
+
+        def add(key: str) -> int:
+            index[key] = len(keys)
+            keys.append(key)
+            return index[key]
+
+        # Маршрут: (имя маршрута, метод) -> (первый счетчик статусов, первая корзина)
+        self._routes: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        for name, method, path in [(*UNMATCHED_ROUTE, "<unmatched>"), *routes]:
+            labels = {"route": path, "method": method}
+            counters = len(keys)
+            for status in STATUS_CLASSES:
+                add(sample_key(REQUESTS, **labels, status=status))
+            buckets = len(keys)
+            for bound in (*map(str, LATENCY_BUCKETS), "+Inf"):
+                add(sample_key(f"{DURATION}_bucket", **labels, le=bound))
+            add(sample_key(f"{DURATION}_sum", **labels))
+            add(sample_key(f"{DURATION}_count", **labels))
+            self._routes[(name, method)] = (counters, buckets)
+
+        self._webhook = {
+            outcome: add(
+                sample_key("paysystem_webhook_outcomes_total", outcome=outcome)
+            )
+            for outcome in WEBHOOK_OUTCOMES
+        }
+        self._rejections = {
+            reason: add(
+                sample_key(
+                    "paysystem_webhook_admission_rejections_total", reason=reason
+                )
+            )
+            for reason in ADMISSION_REJECTIONS
+        }
+        self._queue_wait = len(keys)
+        for bound in (*map(str, LATENCY_BUCKETS), "+Inf"):
+            add(sample_key(f"{QUEUE_WAIT}_bucket", le=bound))
+        add(f"{QUEUE_WAIT}_sum")
+        add(f"{QUEUE_WAIT}_count")
+        add("paysystem_webhook_inflight")
+        add("paysystem_webhook_queued")
+        add("paysystem_webhook_concurrency_limit")
+        for lane in POOL_LANES:
+            for state in POOL_STATES:
+                add(sample_key("paysystem_db_pool_connections", lane=lane, state=state))
+        add("paysystem_event_loop_lag_seconds")
+        self._loop_blocks = add("paysystem_event_loop_blocks_total")
+        self._loop_blocked = add("paysystem_event_loop_blocked_seconds_total")
+        add("paysystem_account_cache_users")
+        for event in ("hits", "misses", "evictions", "expirations", "stale_fills"):
+            add(sample_key("paysystem_account_cache_events_total", event=event))
+        add("paysystem_gzip_responses_total")
+        for direction in ("in", "out"):
+            add(sample_key("paysystem_gzip_bytes_total", direction=direction))
+        add("paysystem_gzip_offloaded_total")
+        add("paysystem_gzip_cpu_seconds_total")
+        add("paysystem_event_subscribers")
+        for stage in ("published", "delivered", "evicted"):
+            add(sample_key("paysystem_events_total", stage=stage))
+        add("paysystem_event_bridge_connected")
+        add("paysystem_event_bridge_dropped_total")
+        add("paysystem_event_bridge_reconnects_total")
+        self._reconciled = add("paysystem_reconciled_payments_total")
+        self._drifts = {
+            outcome: add(sample_key("paysystem_balance_drifts_total", outcome=outcome))
+            for outcome in ("detected", "repaired")
+        }
+
+        self.keys = keys
+        self._index = index
+        self._header = json.dumps(keys).encode()
+        self._offset = -(-(8 + len(self._header)) // 8) * 8
+        self._size = self._offset + 8 * len(keys)
+
+    def start(self, directory: str, routes: Iterable[Tuple[str, str, str]]) -> None:
+        """Перенос метрик воркера в файл в общем каталоге"""
+        self._build(routes)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"worker-{os.getpid()}.bin")
+
+        with open(self.path, "wb") as file:
+            file.write(MAGIC + struct.pack("<I", len(self._header)) + self._header)
+            file.truncate(self._size)
+        with open(self.path, "r+b") as file:
+            self._map = mmap.mmap(file.fileno(), self._size)
+        self._values = memoryview(self._map)[self._offset :].cast("d")
+
+    def stop_sampler(self) -> None:
+        """Остановка фоновой задачи; файл остается, чтобы счетчики не обнулились"""
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+
+    # Горячий путь: только запись в свой массив, без блокировок
+
+    def observe_request(
+        self, route: Optional[str], method: str, status: int, seconds: float
+    ) -> None:
+        """Учет запроса: счетчик по классу статуса и гистограмма времени"""
+        slots = self._routes.get((route, method)) or self._routes[UNMATCHED_ROUTE]
+        counters, buckets = slots
+        self._values[counters + min(max(status // 100, 1), 5) - 1] += 1
+        self._observe(buckets, seconds)
+
+    def _observe(self, buckets: int, seconds: float) -> None:
+        # Корзины кумулятивные: увеличиваем все начиная с первой подходящей
+        values = self._values
+        inf = buckets + len(LATENCY_BUCKETS)
+        for slot in range(buckets + bisect_left(LATENCY_BUCKETS, seconds), inf + 1):
+            values[slot] += 1
+        values[inf + 1] += seconds
+        values[inf + 2] += 1
+
+    def webhook_outcome(self, outcome: str) -> None:
+        """Учет результата обработки вебхука"""
+        self._values[self._webhook[outcome]] += 1
+
+    def webhook_rejected(self, reason: str) -> None:
+        """Учет вебхука, отклоненного контролем допуска"""
+        self._values[self._rejections[reason]] += 1
+
+    def observe_webhook_wait(self, seconds: float) -> None:
+        """Учет времени ожидания допущенного вебхука в очереди"""
+        self._observe(self._queue_wait, seconds)
+
+    def loop_blocked(self, seconds: float) -> None:
+        """Учет блокировки event loop (вызывается из event loop)"""
+        self._values[self._loop_blocks] += 1
+        self._values[self._loop_blocked] += seconds
+
+    def reconciled(self, payments: int, drifts: int, repaired: int) -> None:
+        """Учет шага сверки балансов"""
+        self._values[self._reconciled] += payments
+        self._values[self._drifts["detected"]] += drifts
+        self._values[self._drifts["repaired"]] += repaired
+
+    def set(self, key: str, value: float) -> None:
+        """Установка значения сэмпла (gauge или снимок счетчика)"""
+        self._values[self._index[key]] = value
+
+    def values(self) -> Dict[str, float]:
+        """Значения метрик текущего воркера"""
+        return dict(zip(self.keys, self._values.tolist()))
+
+    # Периодический сбор gauge-метрик
+
+    def sample(
+        self,
+        pools: Dict[str, object],
+        cache_stats: dict,
+        gzip_stats: Optional[dict],
+        event_stats: dict,
+        admission_stats: Optional[dict] = None,
+        bridge_stats: Optional[dict] = None,
+    ) -> None:
+        """Снимок пулов соединений по полосам, статистики кеша, сжатия,
+        событий, моста событий и контроля допуска вебхуков"""
+        for lane, pool in pools.items():
+            if not hasattr(pool, "checkedout"):
+                continue
+            for state, value in (
+                ("size", pool.size()),
+                ("checked_in", pool.checkedin()),
+                ("checked_out", pool.checkedout()),
+                ("overflow", max(pool.overflow(), 0)),
+            ):
+                self.set(
+                    sample_key("paysystem_db_pool_connections", lane=lane, state=state),
+                    value,
+                )
+
+        self.set("paysystem_account_cache_users", cache_stats["size"])
+        for event in ("hits", "misses", "evictions", "expirations", "stale_fills"):
+            self.set(
+                sample_key("paysystem_account_cache_events_total", event=event),
+                cache_stats[event],
+            )
+        if gzip_stats is not None:
+            self.set("paysystem_gzip_responses_total", gzip_stats["compressed"])
+            self.set(
+                sample_key("paysystem_gzip_bytes_total", direction="in"),
+                gzip_stats["bytes_in"],
+            )
+            self.set(
+                sample_key("paysystem_gzip_bytes_total", direction="out"),
+                gzip_stats["bytes_out"],
+            )
+            self.set("paysystem_gzip_offloaded_total", gzip_stats["offloaded"])
+            self.set("paysystem_gzip_cpu_seconds_total", gzip_stats["cpu_seconds"])
+        self.set("paysystem_event_subscribers", event_stats["subscribers"])
+        for stage, field in (
+            ("published", "published"),
+            ("delivered", "delivered"),
+            ("evicted", "evictions"),
+        ):
+            self.set(
+                sample_key("paysystem_events_total", stage=stage), event_stats[field]
+            )
+        if bridge_stats is not None:
+            self.set("paysystem_event_bridge_connected", bridge_stats["connected"])
+            self.set("paysystem_event_bridge_dropped_total", bridge_stats["dropped"])
+            self.set(
+                "paysystem_event_bridge_reconnects_total", bridge_stats["reconnects"]
+            )
+        if admission_stats is not None:
+            self.set("paysystem_webhook_inflight", admission_stats["inflight"])
+            self.set("paysystem_webhook_queued", admission_stats["queued"])
+            self.set("paysystem_webhook_concurrency_limit", admission_stats["limit"])
+
+    def start_sampler(self, interval: float, collect) -> None:
+        """Фоновая задача: задержка event loop и снимки gauge-метрик"""
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            while True:
+                started = loop.time()
+                await asyncio.sleep(interval)
+                lag = max(loop.time() - started - interval, 0.0)
+                self.set("paysystem_event_loop_lag_seconds", lag)
+                collect()
+
+        self._sampler = asyncio.get_running_loop().create_task(run())
+
+
+def read_metrics_file(path: str) -> Dict[str, float]:
+    """Чтение значений из файла метрик воркера"""
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:4] != MAGIC:
+        return {}
+    (header_size,) = struct.unpack_from("<I", data, 4)
+    keys = json.loads(data[8 : 8 + header_size])
+    offset = -(-(8 + header_size) // 8) * 8
+    values = memoryview(data)[offset : offset + 8 * len(keys)].cast("d")
+    return dict(zip(keys, values.tolist()))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(directory: str) -> Dict[str, float]:
+    """Сумма метрик всех воркеров каталога.
+
+    Счетчики завершившихся воркеров сохраняются, а их gauge-метрики
+    отбрасываются.
+    """
+    totals: Dict[str, float] = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return totals
+    for name in names:
+        if not (name.startswith("worker-") and name.endswith(".bin")):
+            continue
+        alive = _pid_alive(int(name[len("worker-") : -len(".bin")]))
+        for key, value in read_metrics_file(os.path.join(directory, name)).items():
+            kind, _, aggregate = FAMILIES[family_of(key)]
+            if kind == "gauge" and not alive:
+                continue
+            if aggregate == "max":
+                totals[key] = max(totals.get(key, value), value)
+            else:
+                totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def render(totals: Dict[str, float]) -> str:
+    """Текстовый формат Prometheus"""
+    grouped: Dict[str, List[str]] = {name: [] for name in FAMILIES}
+    for key in totals:
+        grouped[family_of(key)].append(key)
+
+    lines = []
+    for name, (kind, help_text, _) in FAMILIES.items():
+        if not grouped[name]:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in grouped[name]:
+            value = totals[key]
+            lines.append(f"{key} {int(value) if value.is_integer() else repr(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def clear_directory(directory: str) -> None:
+    """Удаление файлов метрик прошлого запуска (в главном процессе)"""
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith("worker-") and name.endswith(".bin"):
+            os.remove(os.path.join(directory, name))
+
+
+def route_table(app) -> List[Tuple[str, str, str]]:
+    """Маршруты приложения: (имя, метод, путь).
+
+    HEAD и OPTIONS, которые добавляет sanic-ext, учитываются как <unmatched>.
+    """
+    table = []
+    for route in app.router.routes:
+        for method in sorted(route.methods - {"HEAD", "OPTIONS"}):
+            table.append((route.name, method, "/" + route.path))
+    return table
+
+
+metrics = Metrics()
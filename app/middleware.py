@@ -33,20 +33,24 @@ def require_auth(roles=None):
                 return response.json({"error": "Insufficient permissions"}, status=403)
 
             # Проверяем существование пользователя
-            from app.database import async_session
+            from app.database import admin_session, user_session
 
-            async with async_session() as session:
+            # Сессия закрывается до вызова обработчика, чтобы долгие
+            # запросы (например, потоки событий) не удерживали соединение.
+            # Проверка идет в полосе пула своей роли
+            session_factory = admin_session if user_role == "admin" else user_session
+            async with session_factory() as session:
                 current_user = await AuthService.get_current_user(
                     session, payload.get("user_id"), user_role
                 )
-                if not current_user:
-                    return response.json({"error": "User not found"}, status=401)
+            if not current_user:
+                return response.json({"error": "User not found"}, status=401)
 
-                # Добавляем информацию о пользователе в request
-                request.ctx.current_user = current_user
-                request.ctx.user_role = user_role
+            # Добавляем информацию о пользователе в request
+            request.ctx.current_user = current_user
+            request.ctx.user_role = user_role
 
-                return await f(request, *args, **kwargs)
+            return await f(request, *args, **kwargs)
 
         return decorated_function
 
@@ -0,0 +1,39 @@
+"""Общие операции миграций Alembic (migrations/versions).
+
+Вызываются только из upgrade/downgrade миграций: используют alembic.op.
+В offline-режиме (alembic upgrade --sql) запросы к базе не выполняются.
+"""
+
+from typing import List
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.partitions import LIST_PARTITIONS
+
+
+def partitions() -> List[str]:
+    """Имена секций payments"""
+    if op.get_context().as_sql:
+        return []
+    return [row[0] for row in op.get_bind().execute(sa.text(LIST_PARTITIONS))]
+
+
+def drop_invalid_index(name: str) -> None:
+    """Удаление индекса, оставшегося невалидным после прерванной сборки"""
+    if op.get_context().as_sql:
+        return
+    invalid = (
+        op.get_bind()
+        .execute(
+            sa.text("""
+                SELECT 1 FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = :name AND NOT i.indisvalid
+                """),
+            {"name": name},
+        )
+        .scalar()
+    )
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -1,11 +1,14 @@
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
     Column,
+    Date,
     Integer,
     String,
-    Numeric,
+    Sequence,
     ForeignKey,
+    Index,
     DateTime,
-    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -18,7 +21,7 @@ class User(Base):
 
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, index=True, nullable=False)
     full_name = Column(String, nullable=False)
     password_hash = Column(String, nullable=False)
@@ -35,7 +38,7 @@ class Admin(Base):
 
     __tablename__ = "admins"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, index=True, nullable=False)
     full_name = Column(String, nullable=False)
     password_hash = Column(String, nullable=False)
@@ -47,9 +50,10 @@ class Account(Base):
 
     __tablename__ = "accounts"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    balance = Column(Numeric(precision=10, scale=2), default=0.0, nullable=False)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Суммы в минимальных единицах (копейках), см. app.schemas.Money
+    balance = Column(BigInteger, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Отношения
@@ -58,20 +62,110 @@ class Account(Base):
 
 
 class Payment(Base):
-    """Модель платежа (транзакции пополнения счета)"""
+    """Модель платежа (транзакции пополнения счета)
+
+    Таблица секционирована по месяцам created_at (см. app.partitions),
+    поэтому created_at входит в первичный ключ.
+    """
 
     __tablename__ = "payments"
 
-    id = Column(Integer, primary_key=True, index=True)
-    transaction_id = Column(String, unique=True, nullable=False, index=True)
+    id = Column(Integer, Sequence("payments_id_seq"), primary_key=True)
+    transaction_id = Column(String, nullable=False)
     account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    amount = Column(Numeric(precision=10, scale=2), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    amount = Column(BigInteger, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
 
     # Отношения
     account = relationship("Account", back_populates="payments")
     user = relationship("User")
 
-    # Уникальность транзакции
-    __table_args__ = (UniqueConstraint("transaction_id", name="unique_transaction"),)
+    __table_args__ = (
+        # Платежи пользователя, в том числе за период
+        Index("ix_payments_user_id_created_at", "user_id", "created_at"),
+        # Платежи счета; id — для сверки платежей после watermark
+        Index("ix_payments_account_id_id", "account_id", "id"),
+        # Платежи за день для дневных срезов балансов; BRIN почти не
+        # замедляет вставку: created_at растет вместе с таблицей
+        Index("ix_payments_created_at_brin", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class PaymentTransaction(Base):
+    """Обработанная транзакция: уникальность transaction_id для всех
+    секций payments"""
+
+    __tablename__ = "payment_transactions"
+
+    transaction_id = Column(String, primary_key=True)
+    payment_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ReconciliationState(Base):
+    """Состояние сверки балансов (одна строка, см. app.reconciliation)"""
+
+    __tablename__ = "reconciliation_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    # Платежи с id <= watermark учтены в account_payment_sums
+    watermark = Column(BigInteger, nullable=False, default=0)
+    # Счета с id <= audit_after проверены в текущем круге аудита
+    audit_after = Column(Integer, nullable=False, default=0)
+    # Суммы архива до этой границы загружены при первом запуске
+    seeded = Column(Boolean, nullable=False, default=False)
+    seeded_boundary = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AccountPaymentSum(Base):
+    """Сумма и число сверенных платежей счета"""
+
+    __tablename__ = "account_payment_sums"
+
+    account_id = Column(Integer, primary_key=True, autoincrement=False)
+    total = Column(BigInteger, nullable=False)
+    payments = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BalanceDrift(Base):
+    """Расхождение баланса счета с суммой его платежей"""
+
+    __tablename__ = "balance_drifts"
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, nullable=False, index=True)
+    balance = Column(BigInteger, nullable=False)
+    expected = Column(BigInteger, nullable=False)
+    repaired = Column(Boolean, nullable=False)
+    detected_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BalanceCheckpoint(Base):
+    """Баланс счета на конец дня UTC (см. app.checkpoints).
+
+    Строка пишется только за дни с платежами счета: баланс на конец дня
+    без строки равен последнему более раннему срезу.
+    """
+
+    __tablename__ = "balance_checkpoints"
+
+    account_id = Column(Integer, primary_key=True, autoincrement=False)
+    day = Column(Date, primary_key=True)
+    balance = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BalanceCheckpointState(Base):
+    """Последний день, за который построены срезы балансов (одна строка)"""
+
+    __tablename__ = "balance_checkpoint_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    day = Column(Date)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,112 @@
+"""Месячные секции таблицы payments.
+
+Таблица payments секционирована по диапазону created_at: одна секция на
+календарный месяц UTC с именем payments_YYYY_MM. Секции по умолчанию нет
+(с ней невозможен DETACH PARTITION CONCURRENTLY), поэтому секции заранее
+создаются обслуживающей командой utils/partitions.py на несколько месяцев
+вперед.
+
+Уникальный индекс секционированной таблицы обязан включать ключ
+секционирования, поэтому уникальность transaction_id обеспечивает
+отдельная таблица payment_transactions.
+
+Функции обслуживания принимают соединение asyncpg вне транзакции
+(PostgreSQL 14+).
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+PARENT = "payments"
+NAME_PATTERN = re.compile(r"^payments_(\d{4})_(\d{2})$")
+
+LIST_PARTITIONS = """
+    SELECT c.relname, i.inhdetachpending
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'payments'::regclass
+    ORDER BY c.relname
+"""
+
+
+def month_start(moment: datetime) -> datetime:
+    """Начало месяца (UTC), которому принадлежит момент"""
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    """Месяц секции по ее имени (None для посторонних таблиц)"""
+    match = NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    return datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+
+
+def create_partition_sql(month: datetime) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+        f"PARTITION OF {PARENT} FOR VALUES "
+        f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def months_between(first: datetime, last: datetime) -> List[datetime]:
+    """Месяцы от first до last включительно"""
+    months = []
+    month = month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+async def ensure_partitions(
+    conn, now: datetime, ahead: int, since: Optional[datetime] = None
+) -> List[str]:
+    """Создание секций с месяца since (по умолчанию текущего) на ahead
+    месяцев вперед; возвращает имена созданных секций"""
+    existing = {row[0] for row in await conn.fetch(LIST_PARTITIONS)}
+    last = add_months(month_start(now), ahead)
+    created = []
+    for month in months_between(since or now, last):
+        if partition_name(month) not in existing:
+            await conn.execute(create_partition_sql(month))
+            created.append(partition_name(month))
+    return created
+
+
+async def detach_partitions(
+    conn, now: datetime, retain: int, drop: bool = False
+) -> List[str]:
+    """Отсоединение секций старше retain полных месяцев.
+
+    DETACH CONCURRENTLY не блокирует запись в payments. Отсоединенные
+    таблицы остаются в базе (для архивации), если не задан drop. Записи
+    payment_transactions не удаляются: повтор старой транзакции по-прежнему
+    отклоняется.
+    """
+    cutoff = add_months(month_start(now), -retain)
+    detached = []
+    for row in await conn.fetch(LIST_PARTITIONS):
+        month = partition_month(row[0])
+        if month is None or month >= cutoff:
+            continue
+        # Прерванный DETACH CONCURRENTLY оставляет секцию в состоянии
+        # ожидания, его нужно завершить через FINALIZE
+        mode = "FINALIZE" if row[1] else "CONCURRENTLY"
+        await conn.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {row[0]} {mode}")
+        if drop:
+            await conn.execute(f"DROP TABLE {row[0]}")
+        detached.append(row[0])
+    return detached
@@ -0,0 +1,289 @@
+"""Профилирование отдельных запросов по требованию.
+
+Запрос профилируется, если в заголовке X-Profile передан токен
+существующего администратора или он попал в выборку (sample_rate). Пока есть хотя бы
+один профилируемый запрос, фоновый поток с заданным интервалом снимает
+стек потока event loop и относит его к профилю, если в этот момент
+выполняется задача профилируемого запроса; если задача ждет (например,
+ответа БД), записывается стек ее корутин с пометкой [waiting]. SQL-запросы
+и их время собираются через события движка SQLAlchemy.
+
+Поток и обработчики событий SQLAlchemy существуют только во время
+профилирования: без активных профилей накладных расходов нет.
+"""
+
+import asyncio
+import itertools
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.auth import AuthService
+from app.config import Config
+
+# Кадр стека: (файл, строка начала функции, имя функции), как в pstats
+Frame = Tuple[str, int, str]
+WAITING: Frame = ("~", 0, "[waiting]")
+
+
+def _frame_stack(frame) -> Tuple[Frame, ...]:
+    """Стек кадров от корня к листу"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def _task_stack(task: asyncio.Task) -> Tuple[Frame, ...]:
+    """Стек корутин ожидающей задачи"""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None)
+    return tuple(stack) + (WAITING,)
+
+
+class Profile:
+    """Профиль одного запроса"""
+
+    def __init__(self, profile_id: int, method: str, path: str, interval: float):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.samples: Counter = Counter()
+        self.sql: List[dict] = []
+        self._sql_started: List[float] = []
+
+    def summary(self) -> dict:
+        """Краткое описание профиля для списка"""
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.samples.values()),
+            "sql_count": len(self.sql),
+            "sql_ms": round(sum(item["duration_ms"] for item in self.sql), 3),
+        }
+
+    def to_dict(self) -> dict:
+        """Профиль с SQL-запросами и самыми частыми стеками"""
+        return {
+            **self.summary(),
+            "interval_ms": self.interval * 1000,
+            "sql": self.sql,
+            "top_stacks": [
+                {"stack": _collapse(stack), "samples": count}
+                for stack, count in self.samples.most_common(20)
+            ],
+        }
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed (flamegraph.pl, speedscope)"""
+        return "".join(
+            f"{_collapse(stack)} {count}\n" for stack, count in self.samples.items()
+        )
+
+    def pstats(self) -> bytes:
+        """Профиль в формате marshal-файла pstats.
+
+        Время функции пропорционально числу сэмплов, в которых она была
+        листом (tottime) или присутствовала в стеке (cumtime).
+        """
+        stats: Dict[Frame, list] = {}
+        for stack, count in self.samples.items():
+            seconds = count * self.interval
+            seen = set()
+            for depth, frame in enumerate(stack):
+                entry = stats.setdefault(frame, [0, 0, 0.0, 0.0, {}])
+                if frame not in seen:
+                    seen.add(frame)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth == len(stack) - 1:
+                    entry[2] += seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += seconds
+                    if depth == len(stack) - 1:
+                        caller[2] += seconds
+        return marshal.dumps(
+            {
+                frame: (cc, nc, tt, ct, {c: tuple(v) for c, v in callers.items()})
+                for frame, (cc, nc, tt, ct, callers) in stats.items()
+            }
+        )
+
+
+def _collapse(stack: Tuple[Frame, ...]) -> str:
+    return ";".join(
+        f"{name} ({os.path.basename(filename)}:{line})" if line else name
+        for filename, line, name in stack
+    )
+
+
+class RequestProfiler:
+    """Профилировщик запросов с кольцевым буфером последних профилей"""
+
+    def __init__(self, interval: float, keep: int, sample_rate: float = 0.0):
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.profiles: Deque[Profile] = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._active: Dict[asyncio.Task, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._engines: list = []
+
+    async def should_profile(self, request) -> bool:
+        """Запрос администратора с X-Profile или попадание в выборку"""
+        token = request.headers.get("x-profile")
+        if token:
+            payload = AuthService.decode_token(token)
+            if not payload or payload.get("role") != "admin":
+                return False
+            # Администратор проверяется по базе, как в require_admin_auth:
+            # токен удаленного администратора профилирование не включает
+            from app.database import admin_session
+
+            async with admin_session() as session:
+                admin = await AuthService.get_current_user(
+                    session, payload.get("user_id"), "admin"
+                )
+            return admin is not None
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, method: str, path: str, engines=()) -> Profile:
+        """Начало профилирования текущей задачи"""
+        profile = Profile(next(self._ids), method, path, self.interval)
+        task = asyncio.current_task()
+        with self._lock:
+            if not self._active:
+                self._start(asyncio.get_running_loop(), engines)
+            self._active[task] = profile
+        return profile
+
+    def end(self, profile: Profile, route: Optional[str], status: int) -> None:
+        """Завершение профилирования и сохранение профиля"""
+        profile.duration = time.perf_counter() - profile.started
+        profile.route = route
+        profile.status = status
+        with self._lock:
+            for task, active in list(self._active.items()):
+                if active is profile:
+                    del self._active[task]
+            if not self._active:
+                self._stop()
+        self.profiles.append(profile)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        """Профиль из буфера по идентификатору"""
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def _start(self, loop: asyncio.AbstractEventLoop, engines) -> None:
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._engines = list(engines)
+        for engine in self._engines:
+            event.listen(engine, "before_cursor_execute", self._before_execute)
+            event.listen(engine, "after_cursor_execute", self._after_execute)
+        # Поток прошлого профилирования может еще не заметить пустой список
+        # активных профилей; тогда он продолжит работу
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._sample, name="request-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _stop(self) -> None:
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._before_execute)
+            event.remove(engine, "after_cursor_execute", self._after_execute)
+        self._engines = []
+
+    def _sample(self) -> None:
+        interval = self.interval
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                # Задачи, завершившиеся без ответа (например, при разрыве
+                # соединения), сохраняются без статуса
+                for task in [task for task in self._active if task.done()]:
+                    profile = self._active.pop(task)
+                    profile.duration = time.perf_counter() - profile.started
+                    self.profiles.append(profile)
+                if not self._active:
+                    self._stop()
+                    self._thread = None
+                    return
+                frame = sys._current_frames().get(self._loop_thread)
+                running = asyncio.current_task(self._loop)
+                profile = self._active.get(running)
+                if profile is not None and frame is not None:
+                    profile.samples[_frame_stack(frame)] += 1
+                for task, waiting in self._active.items():
+                    if task is not running:
+                        try:
+                            waiting.samples[_task_stack(task)] += 1
+                        except Exception:
+                            # Стек корутин меняется в потоке event loop
+                            pass
+
+    def _current_profile(self) -> Optional[Profile]:
+        try:
+            return self._active.get(asyncio.current_task())
+        except RuntimeError:
+            return None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        profile = self._current_profile()
+        if profile is not None:
+            profile._sql_started.append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        profile = self._current_profile()
+        if profile is not None and profile._sql_started:
+            started = profile._sql_started.pop()
+            profile.sql.append(
+                {
+                    "statement": statement,
+                    "offset_ms": round((started - profile.started) * 1000, 3),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                }
+            )
+
+
+profiler = RequestProfiler(
+    Config.PROFILE_INTERVAL, Config.PROFILE_KEEP, Config.PROFILE_SAMPLE_RATE
+)
@@ -0,0 +1,312 @@
+"""Инкрементальная сверка балансов счетов с платежами.
+
+Сверка проходит payments по возрастанию id от сохраненного watermark и
+накапливает сумму и число платежей каждого счета в account_payment_sums.
+Баланс счета должен быть равен сверенной сумме плюс платежи с id больше
+watermark. Проверяются счета, получившие платежи в очередном пакете, и
+очередная порция всех счетов по кругу (аудит), чтобы найти расхождения и у
+счетов без новых платежей. Расхождения пишутся в balance_drifts и лог и,
+если включено, исправляются относительным UPDATE.
+
+Id платежей выдаются до коммита, поэтому транзакция с меньшим id может
+закоммититься позже большего. Watermark не переходит платежи новее
+settle секунд: если settle больше удвоенной длительности самой долгой
+транзакции платежа, ни один платеж с id ниже watermark уже не появится.
+
+Платежи, перенесенные в архив (app.archive) до первого запуска, один раз
+загружаются в суммы из сегментов; дальше задание архивации удаляет из
+payments только уже сверенные платежи.
+
+Шаг выполняется в одной транзакции под pg_try_advisory_xact_lock, поэтому
+сверку можно запускать во всех воркерах и из utils/reconcile.py
+одновременно: шаги не пересекаются.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.archive import payment_archive
+from app.config import Config
+from app.logs import logger
+from app.metrics import metrics
+
+LOCK_KEY = 7_311_001
+
+TRY_LOCK = text("SELECT pg_try_advisory_xact_lock(:key)")
+
+READ_STATE = text("""
+    SELECT watermark, audit_after, seeded, seeded_boundary, now()
+    FROM reconciliation_state WHERE id = 1 FOR UPDATE
+    """)
+
+WRITE_STATE = text("""
+    UPDATE reconciliation_state
+    SET watermark = :watermark, audit_after = :audit_after, seeded = true,
+        seeded_boundary = :seeded_boundary, updated_at = now()
+    WHERE id = 1
+    """)
+
+NEXT_PAYMENTS = text("""
+    SELECT id, account_id, amount, created_at FROM payments
+    WHERE id > :watermark AND created_at >= :lower
+    ORDER BY id
+    LIMIT :limit
+    """)
+
+ADD_SUMS = text("""
+    INSERT INTO account_payment_sums (account_id, total, payments, updated_at)
+    SELECT account_id, total, payments, now()
+    FROM unnest(
+        CAST(:accounts AS integer[]),
+        CAST(:totals AS bigint[]),
+        CAST(:counts AS bigint[])
+    ) AS batch (account_id, total, payments)
+    ON CONFLICT (account_id) DO UPDATE
+    SET total = account_payment_sums.total + excluded.total,
+        payments = account_payment_sums.payments + excluded.payments,
+        updated_at = now()
+    """)
+
+AUDIT_ACCOUNTS = text("""
+    SELECT id FROM accounts WHERE id > :after ORDER BY id LIMIT :limit
+    """)
+
+# Баланс и ожидаемая сумма в одном снимке: зачисление и вставка платежа
+# коммитятся одной транзакцией
+CHECK_ACCOUNTS = text("""
+    SELECT a.id,
+           a.balance,
+           coalesce(s.total, 0) + coalesce(
+               (
+                   SELECT sum(p.amount) FROM payments p
+                   WHERE p.account_id = a.id AND p.id > :watermark
+                     AND p.created_at >= :lower
+               ),
+               0
+           )
+    FROM accounts a
+    LEFT JOIN account_payment_sums s ON s.account_id = a.id
+    WHERE a.id = ANY(CAST(:accounts AS integer[]))
+    """)
+
+# Относительное исправление верно и при зачислениях после проверки: они
+# меняют баланс и ожидаемую сумму одинаково
+REPAIR = text("UPDATE accounts SET balance = balance - :drift WHERE id = :id")
+
+RECORD_DRIFT = text("""
+    INSERT INTO balance_drifts (account_id, balance, expected, repaired)
+    VALUES (:account_id, :balance, :expected, :repaired)
+    """)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+Totals = Dict[int, List[int]]
+
+
+def aggregate(rows, horizon: datetime) -> Tuple[Totals, Optional[int]]:
+    """Суммы платежей по счетам до первого платежа не старше horizon.
+
+    rows — (id, account_id, amount, created_at) по возрастанию id.
+    Возвращает [сумма, число] по счетам и id последнего учтенного
+    платежа (None, если учитывать нечего).
+    """
+    totals: Totals = {}
+    last_id = None
+    for payment_id, account_id, amount, created_at in rows:
+        if created_at >= horizon:
+            break
+        total = totals.setdefault(account_id, [0, 0])
+        total[0] += amount
+        total[1] += 1
+        last_id = payment_id
+    return totals, last_id
+
+
+class Reconciler:
+    """Сверка балансов пакетами с ограничением скорости"""
+
+    def __init__(
+        self,
+        batch_size: int,
+        audit_accounts: int,
+        settle: float,
+        repair: bool,
+        max_rows_per_second: float,
+        interval: float,
+        statement_timeout_ms: int,
+    ):
+        self.batch_size = batch_size
+        self.audit_accounts = audit_accounts
+        self.settle = settle
+        self.repair = repair
+        self.max_rows_per_second = max_rows_per_second
+        self.interval = interval
+        self.statement_timeout_ms = statement_timeout_ms
+        self._task: Optional[asyncio.Task] = None
+
+    async def step(self, conn) -> Optional[dict]:
+        """Один пакет платежей и порция аудита; None, если шаг выполняет
+        другой процесс"""
+        async with conn.begin():
+            if not (await conn.execute(TRY_LOCK, {"key": LOCK_KEY})).scalar():
+                return None
+            # Сверка уступает вебхукам: короткие запросы и ожидание
+            # блокировок строк счетов
+            await conn.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"
+            )
+            await conn.exec_driver_sql("SET LOCAL lock_timeout = 100")
+
+            state = (await conn.execute(READ_STATE)).one()
+            watermark, audit_after, seeded, lower, now = state
+            seeded_accounts = 0
+            if not seeded:
+                lower, seeded_accounts = await self._seed_archive(conn)
+
+            lower = lower or EPOCH
+            rows = (
+                await conn.execute(
+                    NEXT_PAYMENTS,
+                    {"watermark": watermark, "lower": lower, "limit": self.batch_size},
+                )
+            ).all()
+            totals, last_id = aggregate(rows, now - timedelta(seconds=self.settle))
+            if totals:
+                await self._add_sums(conn, totals)
+                watermark = last_id
+
+            result = await conn.execute(
+                AUDIT_ACCOUNTS, {"after": audit_after, "limit": self.audit_accounts}
+            )
+            audit = result.scalars().all()
+            audit_after = audit[-1] if len(audit) == self.audit_accounts else 0
+
+            checked = sorted(set(totals) | set(audit))
+            drifts = await self._check(conn, checked, watermark, lower)
+
+            await conn.execute(
+                WRITE_STATE,
+                {
+                    "watermark": watermark,
+                    "audit_after": audit_after,
+                    "seeded_boundary": lower if lower != EPOCH else None,
+                },
+            )
+
+        payments = sum(total[1] for total in totals.values())
+        repaired = sum(1 for drift in drifts if drift["repaired"])
+        metrics.reconciled(payments, len(drifts), repaired)
+        return {
+            "payments": payments,
+            "watermark": watermark,
+            "checked": len(checked),
+            "drifts": drifts,
+            "seeded_accounts": seeded_accounts,
+            "audit_wrapped": audit_after == 0,
+            "caught_up": len(rows) < self.batch_size or last_id != rows[-1][0],
+        }
+
+    async def _seed_archive(self, conn) -> Tuple[Optional[datetime], int]:
+        # Суммы архива читаются в пуле потоков; строки payments старше его
+        # границы (если еще не удалены) уже учтены в сегментах
+        loop = asyncio.get_running_loop()
+        boundary, totals = await loop.run_in_executor(
+            None, payment_archive.account_totals
+        )
+        if totals:
+            await self._add_sums(conn, totals)
+        return boundary, len(totals)
+
+    async def _add_sums(self, conn, totals: Totals) -> None:
+        accounts = list(totals)
+        await conn.execute(
+            ADD_SUMS,
+            {
+                "accounts": accounts,
+                "totals": [totals[account][0] for account in accounts],
+                "counts": [totals[account][1] for account in accounts],
+            },
+        )
+
+    async def _check(
+        self, conn, accounts: List[int], watermark: int, lower: datetime
+    ) -> List[dict]:
+        if not accounts:
+            return []
+        rows = await conn.execute(
+            CHECK_ACCOUNTS,
+            {"accounts": accounts, "watermark": watermark, "lower": lower},
+        )
+        drifts = []
+        for account_id, balance, expected in rows:
+            # sum(bigint) возвращает numeric
+            expected = int(expected)
+            if balance == expected:
+                continue
+            drift = {
+                "account_id": account_id,
+                "balance": balance,
+                "expected": expected,
+                "repaired": False,
+            }
+            if self.repair:
+                drift["repaired"] = await self._repair(
+                    conn, account_id, balance - expected
+                )
+            await conn.execute(RECORD_DRIFT, drift)
+            logger.warning("Balance drift", extra=drift)
+            drifts.append(drift)
+        return drifts
+
+    async def _repair(self, conn, account_id: int, drift: int) -> bool:
+        # Счет, заблокированный вебхуком дольше lock_timeout, исправляется
+        # на одном из следующих кругов
+        try:
+            async with conn.begin_nested():
+                await conn.execute(REPAIR, {"id": account_id, "drift": drift})
+            return True
+        except DBAPIError:
+            return False
+
+    async def run(self, engine) -> None:
+        """Цикл сверки: пакеты не чаще max_rows_per_second, при отсутствии
+        новых платежей пауза interval"""
+        while True:
+            started = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    result = await self.step(conn)
+            except Exception:
+                logger.exception("Reconciliation step failed")
+                result = None
+
+            if result is None or result["caught_up"]:
+                pause = self.interval
+            else:
+                pause = result["payments"] / self.max_rows_per_second
+            await asyncio.sleep(max(pause - (time.perf_counter() - started), 0))
+
+    def start(self, engine) -> None:
+        """Фоновая задача сверки в воркере"""
+        self._task = asyncio.get_running_loop().create_task(self.run(engine))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+reconciler = Reconciler(
+    batch_size=Config.RECONCILE_BATCH_SIZE,
+    audit_accounts=Config.RECONCILE_AUDIT_ACCOUNTS,
+    settle=Config.RECONCILE_SETTLE_SECONDS,
+    repair=Config.RECONCILE_REPAIR,
+    max_rows_per_second=Config.RECONCILE_MAX_ROWS_PER_SECOND,
+    interval=Config.RECONCILE_INTERVAL,
+    statement_timeout_ms=Config.RECONCILE_STATEMENT_TIMEOUT_MS,
+)
@@ -0,0 +1,38 @@
+"""Рендеринг ответов API напрямую в JSON"""
+
+from functools import lru_cache
+from typing import Any, Iterable, List, Type
+
+from pydantic import BaseModel, TypeAdapter
+from sanic.response import HTTPResponse
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+def render(schema: Type[BaseModel], obj: Any) -> bytes:
+    """Сериализация объекта (ORM, строки выборки или dict) по схеме в JSON.
+
+    Валидация атрибутов и запись JSON выполняются в pydantic-core без
+    промежуточных dict; денежные суммы выводятся точными строками.
+    """
+    adapter = _adapter(schema)
+    return adapter.dump_json(adapter.validate_python(obj, from_attributes=True))
+
+
+def render_many(schema: Type[BaseModel], objs: Iterable[Any]) -> bytes:
+    """Сериализация списка объектов по схеме в JSON-массив"""
+    adapter = _list_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(objs, from_attributes=True))
+
+
+def json_response(body: bytes, status: int = 200) -> HTTPResponse:
+    """HTTP-ответ с уже готовым JSON"""
+    return HTTPResponse(body, status=status, content_type="application/json")
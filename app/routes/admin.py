@@ -1,17 +1,25 @@
+from datetime import datetime, timezone
+
 from sanic import Blueprint, Request, response
 from sanic_ext import validate
 
-from app.database import async_session
+from app.config import Config
+from app.database import admin_session
 from app.middleware import require_admin_auth
+from app.profiling import profiler
+from app.slow_queries import slow_query_log
+from app.renderers import json_response, render, render_many
+from app.routes.users import parse_moment
 from app.schemas import (
+    AccountBalanceResponse,
     AdminResponse,
+    ProfilingSettings,
     UserResponse,
     UserCreate,
     UserUpdate,
-    AccountResponse,
+    UserWithAccountsResponse,
 )
-from app.services import UserService, AccountService
-from app.utils import custom_json_serializer
+from app.services import AccountService, UserService
 
 admin_bp = Blueprint("admin", url_prefix="/api/admin")
 
@@ -21,28 +29,40 @@ admin_bp = Blueprint("admin", url_prefix="/api/admin")
 async def get_current_admin(request: Request):
     """Получение данных о текущем администраторе"""
     admin = request.ctx.current_user
-    admin_data = AdminResponse.model_validate(admin).model_dump()
-    return response.json(admin_data, default=custom_json_serializer)
+    return json_response(render(AdminResponse, admin))
 
 
 @admin_bp.get("/users")
 @require_admin_auth
 async def get_users(request: Request):
-    """Получение списка всех пользователей"""
-    async with async_session() as session:
-        users = await UserService.get_users(session)
-
-        users_with_accounts = []
-        for user in users:
-            user_data = UserResponse.model_validate(user).model_dump()
-            accounts = await AccountService.get_user_accounts(session, user.id)
-            user_data["accounts"] = [
-                AccountResponse.model_validate(account).model_dump()
-                for account in accounts
-            ]
-            users_with_accounts.append(user_data)
-
-        return response.json(users_with_accounts, default=custom_json_serializer)
+    """Получение списка пользователей со счетами.
+
+    Поддерживает keyset-пагинацию: ?after_id=<id>&limit=<n>. Если страница
+    заполнена, id для следующей страницы возвращается в X-Next-After-Id.
+    """
+    try:
+        after_id = int(request.args.get("after_id", 0))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return response.json({"error": "Invalid pagination parameters"}, status=400)
+    if limit is not None and limit <= 0:
+        return response.json({"error": "Invalid pagination parameters"}, status=400)
+
+    async with admin_session() as session:
+        if Config.ADMIN_USERS_SQL_JSON:
+            body, count, last_id = await UserService.get_users_json(
+                session, after_id, limit
+            )
+        else:
+            users = await UserService.get_user_rows(session, after_id, limit)
+            body = render_many(UserWithAccountsResponse, users)
+            count, last_id = len(users), users[-1].id if users else None
+
+    resp = json_response(body)
+    if limit is not None and count == limit:
+        resp.headers["X-Next-After-Id"] = str(last_id)
+    return resp
 
 
 @admin_bp.post("/users")
@@ -50,11 +70,10 @@ async def get_users(request: Request):
 @validate(json=UserCreate)
 async def create_user(request: Request, body: UserCreate):
     """Создание нового пользователя"""
-    async with async_session() as session:
+    async with admin_session() as session:
         try:
             user = await UserService.create_user(session, body)
-            user_data = UserResponse.model_validate(user).model_dump()
-            return response.json(user_data, status=201, default=custom_json_serializer)
+            return json_response(render(UserResponse, user), status=201)
         except ValueError as e:
             return response.json({"error": str(e)}, status=400)
 
@@ -63,14 +82,11 @@ async def create_user(request: Request, body: UserCreate):
 @require_admin_auth
 async def get_user(request: Request, user_id: int):
     """Получение пользователя по ID"""
-    async with async_session() as session:
+    async with admin_session() as session:
         user = await UserService.get_user_by_id(session, user_id)
         if not user:
             return response.json({"error": "User not found"}, status=404)
-        return response.json(
-            UserResponse.model_validate(user).model_dump(),
-            default=custom_json_serializer,
-        )
+        return json_response(render(UserResponse, user))
 
 
 @admin_bp.put("/users/<user_id:int>")
@@ -78,14 +94,13 @@ async def get_user(request: Request, user_id: int):
 @validate(json=UserUpdate)
 async def update_user(request: Request, user_id: int, body: UserUpdate):
     """Обновление пользователя"""
-    async with async_session() as session:
+    async with admin_session() as session:
         try:
             user = await UserService.update_user(session, user_id, body)
             if not user:
                 return response.json({"error": "User not found"}, status=404)
 
-            user_data = UserResponse.model_validate(user).model_dump()
-            return response.json(user_data, default=custom_json_serializer)
+            return json_response(render(UserResponse, user))
         except ValueError as e:
             return response.json({"error": str(e)}, status=400)
 
@@ -94,9 +109,82 @@ async def update_user(request: Request, user_id: int, body: UserUpdate):
 @require_admin_auth
 async def delete_user(request: Request, user_id: int):
     """Удаление пользователя"""
-    async with async_session() as session:
+    async with admin_session() as session:
         success = await UserService.delete_user(session, user_id)
         if not success:
             return response.json({"error": "User not found"}, status=404)
 
         return response.json({"message": "User deleted successfully"})
+
+
+@admin_bp.get("/accounts/<account_id:int>/balance")
+@require_admin_auth
+async def get_account_balance(request: Request, account_id: int):
+    """Баланс любого счета на момент ?as_of=<ISO 8601> (по умолчанию сейчас)"""
+    try:
+        as_of = parse_moment(request.args.get("as_of")) or datetime.now(timezone.utc)
+    except ValueError:
+        return response.json({"error": "Invalid as_of"}, status=400)
+
+    async with admin_session() as session:
+        balance = await AccountService.get_balance_as_of(session, account_id, as_of)
+    if balance is None:
+        return response.json({"error": "Account not found"}, status=404)
+    return json_response(render(AccountBalanceResponse, balance))
+
+
+@admin_bp.get("/profiles")
+@require_admin_auth
+async def get_profiles(request: Request):
+    """Список последних профилей запросов этого воркера"""
+    return response.json(
+        {
+            "sample_rate": profiler.sample_rate,
+            "profiles": [profile.summary() for profile in reversed(profiler.profiles)],
+        }
+    )
+
+
+@admin_bp.get("/profiles/<profile_id:int>")
+@require_admin_auth
+async def get_profile(request: Request, profile_id: int):
+    """Профиль запроса: json, collapsed или pstats (?format=)"""
+    profile = profiler.get(profile_id)
+    if not profile:
+        return response.json({"error": "Profile not found"}, status=404)
+
+    output = request.args.get("format", "json")
+    if output == "json":
+        return response.json(profile.to_dict())
+    if output == "collapsed":
+        return response.text(profile.collapsed())
+    if output == "pstats":
+        return response.raw(
+            profile.pstats(),
+            content_type="application/octet-stream",
+            headers={
+                "Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'
+            },
+        )
+    return response.json({"error": "Unknown format"}, status=400)
+
+
+@admin_bp.put("/profiles/settings")
+@require_admin_auth
+@validate(json=ProfilingSettings)
+async def update_profiling_settings(request: Request, body: ProfilingSettings):
+    """Изменение доли профилируемых запросов на этом воркере"""
+    profiler.sample_rate = body.sample_rate
+    return response.json({"sample_rate": profiler.sample_rate})
+
+
+@admin_bp.get("/slow-queries")
+@require_admin_auth
+async def get_slow_queries(request: Request):
+    """Последние медленные SQL-запросы этого воркера"""
+    return response.json(
+        {
+            "threshold_ms": slow_query_log.threshold * 1000,
+            "queries": list(reversed(slow_query_log.entries)),
+        }
+    )
@@ -2,7 +2,7 @@ from sanic import Blueprint, Request, response
 from sanic_ext import validate
 
 from app.auth import AuthService
-from app.database import async_session
+from app.database import admin_session, user_session
 from app.schemas import LoginRequest, TokenResponse
 
 auth_bp = Blueprint("auth", url_prefix="/api/auth")
@@ -12,7 +12,7 @@ auth_bp = Blueprint("auth", url_prefix="/api/auth")
 @validate(json=LoginRequest)
 async def user_login(request: Request, body: LoginRequest):
     """Авторизация пользователя"""
-    async with async_session() as session:
+    async with user_session() as session:
         user = await AuthService.authenticate_user(session, body.email, body.password)
         if not user:
             return response.json({"error": "Invalid credentials"}, status=401)
@@ -25,7 +25,7 @@ async def user_login(request: Request, body: LoginRequest):
 @validate(json=LoginRequest)
 async def admin_login(request: Request, body: LoginRequest):
     """Авторизация администратора"""
-    async with async_session() as session:
+    async with admin_session() as session:
         admin = await AuthService.authenticate_admin(session, body.email, body.password)
         if not admin:
             return response.json({"error": "Invalid credentials"}, status=401)
@@ -1,8 +1,22 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
 from sanic import Blueprint, Request, response
 
-from app.database import async_session
+from app.config import Config
+from app.database import user_session
+from app.events import event_hub
 from app.middleware import require_user_auth
-from app.schemas import UserResponse, AccountResponse, PaymentResponse
+from app.renderers import json_response, render, render_many
+from app.schemas import (
+    UserResponse,
+    AccountResponse,
+    AccountBalanceResponse,
+    PaymentResponse,
+)
 from app.services import AccountService, PaymentService
 from app.utils import custom_json_serializer
 
@@ -14,8 +28,7 @@ users_bp = Blueprint("users", url_prefix="/api/users")
 async def get_current_user(request: Request):
     """Получение данных о текущем пользователе"""
     user = request.ctx.current_user
-    user_data = UserResponse.model_validate(user).model_dump()
-    return response.json(user_data, default=custom_json_serializer)
+    return json_response(render(UserResponse, user))
 
 
 @users_bp.get("/me/accounts")
@@ -23,22 +36,113 @@ async def get_current_user(request: Request):
 async def get_user_accounts(request: Request):
     """Получение счетов пользователя"""
     user = request.ctx.current_user
-    async with async_session() as session:
+    async with user_session() as session:
         accounts = await AccountService.get_user_accounts(session, user.id)
-        accounts_data = [
-            AccountResponse.model_validate(account).model_dump() for account in accounts
-        ]
-        return response.json(accounts_data, default=custom_json_serializer)
+    return json_response(render_many(AccountResponse, accounts))
+
+
+@users_bp.get("/me/accounts/<account_id:int>/balance")
+@require_user_auth
+async def get_user_account_balance(request: Request, account_id: int):
+    """Баланс своего счета на момент ?as_of=<ISO 8601> (по умолчанию сейчас)"""
+    user = request.ctx.current_user
+    try:
+        as_of = parse_moment(request.args.get("as_of")) or datetime.now(timezone.utc)
+    except ValueError:
+        return response.json({"error": "Invalid as_of"}, status=400)
+
+    async with user_session() as session:
+        balance = await AccountService.get_balance_as_of(
+            session, account_id, as_of, user_id=user.id
+        )
+    if balance is None:
+        return response.json({"error": "Account not found"}, status=404)
+    return json_response(render(AccountBalanceResponse, balance))
 
 
 @users_bp.get("/me/payments")
 @require_user_auth
 async def get_user_payments(request: Request):
-    """Получение платежей пользователя"""
+    """Получение платежей пользователя от новых к старым.
+
+    Период задается ?since=<ISO 8601>&until=<ISO 8601> (until не включается,
+    время без часового пояса считается UTC). Поддерживает keyset-пагинацию:
+    ?limit=<n>&cursor=<курсор>. Если страница заполнена, курсор следующей
+    страницы возвращается в X-Next-Cursor. Старые платежи прозрачно
+    читаются из архива.
+    """
+    user = request.ctx.current_user
+    try:
+        since = parse_moment(request.args.get("since"))
+        until = parse_moment(request.args.get("until"))
+    except ValueError:
+        return response.json({"error": "Invalid date range"}, status=400)
+    try:
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+        before = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return response.json({"error": "Invalid pagination parameters"}, status=400)
+    if limit is not None and limit <= 0:
+        return response.json({"error": "Invalid pagination parameters"}, status=400)
+
+    async with user_session() as session:
+        payments, next_cursor = await PaymentService.get_user_payment_page(
+            session, user.id, limit, before, since, until
+        )
+    resp = json_response(render_many(PaymentResponse, payments))
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = encode_cursor(next_cursor)
+    return resp
+
+
+def parse_moment(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def encode_cursor(cursor: Tuple[datetime, int]) -> str:
+    created_at, payment_id = cursor
+    raw = f"{created_at.isoformat()},{payment_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Разбор непрозрачного курсора; ValueError для некорректного"""
+    if value is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        created_at, payment_id = raw.rsplit(",", 1)
+        return parse_moment(created_at), int(payment_id)
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+@users_bp.get("/me/events", ctx_gzip=False)
+@require_user_auth
+async def stream_user_events(request: Request):
+    """Поток событий пользователя (Server-Sent Events)"""
     user = request.ctx.current_user
-    async with async_session() as session:
-        payments = await PaymentService.get_user_payments(session, user.id)
-        payments_data = [
-            PaymentResponse.model_validate(payment).model_dump() for payment in payments
-        ]
-        return response.json(payments_data, default=custom_json_serializer)
+    subscription = event_hub.subscribe(user.id)
+    try:
+        stream = await request.respond(
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        while True:
+            event = await subscription.get(Config.EVENTS_KEEPALIVE)
+            if subscription.evicted:
+                # Клиент не успевает читать: просим переподключиться
+                await stream.send("event: reset\ndata: {}\n\n")
+                break
+            if event is None:
+                await stream.send(": keepalive\n\n")
+                continue
+            data = json.dumps(event, default=custom_json_serializer)
+            await stream.send(f"event: {event['type']}\ndata: {data}\n\n")
+        await stream.eof()
+    finally:
+        event_hub.unsubscribe(subscription)
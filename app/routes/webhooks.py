@@ -1,10 +1,16 @@
+import time
+
 from sanic import Blueprint, Request, response
 from sanic_ext import validate
 
-from app.database import async_session
-from app.schemas import WebhookRequest, PaymentResponse
+from app.admission import Overloaded, webhook_admission
+from app.config import Config
+from app.database import is_overloaded, webhook_session
+from app.logs import logger
+from app.metrics import metrics
+from app.renderers import json_response, render
+from app.schemas import WebhookRequest, WebhookPaymentResponse
 from app.services import PaymentService, WebhookService
-from app.utils import custom_json_serializer
 
 webhooks_bp = Blueprint("webhooks", url_prefix="/api/webhooks")
 
@@ -21,32 +27,82 @@ async def process_payment_webhook(request: Request, body: WebhookRequest):
         body.amount,
         body.signature,
     ):
+        metrics.webhook_outcome("bad_signature")
+        logger.warning(
+            "Webhook signature rejected",
+            extra={"transaction_id": body.transaction_id, "user_id": body.user_id},
+        )
         return response.json({"error": "Invalid signature"}, status=400)
 
-    async with async_session() as session:
+    if webhook_admission is None:
+        return await process_webhook(body)
+
+    # Место занимается только на время работы с базой данных: проверка
+    # подписи выше не ограничена
+    try:
+        waited = await webhook_admission.acquire()
+    except Overloaded as e:
+        metrics.webhook_rejected(e.reason)
+        return busy_response()
+    metrics.observe_webhook_wait(waited)
+    started = time.perf_counter()
+    try:
+        return await process_webhook(body)
+    finally:
+        webhook_admission.release(time.perf_counter() - started)
+
+
+def busy_response():
+    """503: провайдер повторит вебхук через Retry-After секунд"""
+    return response.json(
+        {"error": "Service busy"},
+        status=503,
+        headers={"Retry-After": str(Config.DB_RETRY_AFTER)},
+    )
+
+
+async def process_webhook(body: WebhookRequest):
+    """Зачисление платежа вебхука и ответ провайдеру"""
+    async with webhook_session() as session:
         try:
             payment = await PaymentService.process_payment(
                 session,
                 body.transaction_id,
                 body.user_id,
                 body.account_id,
-                body.amount,
+                body.amount_minor,
             )
 
-            return response.json(
-                {
-                    "status": "success",
-                    "message": "Payment processed successfully",
-                    "payment": PaymentResponse.model_validate(payment).model_dump(),
+            metrics.webhook_outcome("success")
+            # Успешные вебхуки самые частые: пишем в лог только выборку
+            logger.info(
+                "Webhook payment processed",
+                extra={
+                    "transaction_id": body.transaction_id,
+                    "payment_id": payment.id,
+                    "sample_rate": Config.LOG_WEBHOOK_SAMPLE_RATE,
                 },
-                default=custom_json_serializer,
             )
+            return json_response(render(WebhookPaymentResponse, {"payment": payment}))
 
         except ValueError as e:
             if "already processed" in str(e):
+                metrics.webhook_outcome("duplicate")
                 return response.json(
                     {"error": "Transaction already processed"}, status=409
                 )
+            metrics.webhook_outcome("rejected")
             return response.json({"error": str(e)}, status=400)
         except Exception as e:
+            if is_overloaded(e):
+                # Нет свободного соединения полосы вебхуков или истек
+                # statement_timeout: транзакция откатилась, провайдер
+                # повторит вебхук
+                metrics.webhook_outcome("busy")
+                return busy_response()
+            metrics.webhook_outcome("error")
+            logger.exception(
+                "Webhook processing failed",
+                extra={"transaction_id": body.transaction_id},
+            )
             return response.json({"error": "Internal server error"}, status=500)
@@ -0,0 +1,59 @@
+"""Легковесные строки выборок только для чтения.
+
+Строки содержат ровно те колонки, которые отдаются в ответах API, не
+попадают в identity map сессии и не хранят состояние отношений.
+Рендереры из app.renderers принимают их напрямую.
+"""
+
+from datetime import date, datetime
+from typing import List, NamedTuple, Optional
+
+
+class AccountRow(NamedTuple):
+    """Счет пользователя"""
+
+    id: int
+    user_id: int
+    balance: int
+    created_at: datetime
+
+    @classmethod
+    def from_account(cls, account) -> "AccountRow":
+        """Создание строки из ORM-объекта счета"""
+        return cls(account.id, account.user_id, account.balance, account.created_at)
+
+
+class PaymentRow(NamedTuple):
+    """Платеж пользователя"""
+
+    id: int
+    transaction_id: str
+    account_id: int
+    user_id: int
+    amount: int
+    created_at: datetime
+
+
+class BalanceRow(NamedTuple):
+    """Баланс счета на момент времени"""
+
+    account_id: int
+    as_of: datetime
+    balance: int
+    checkpoint: Optional[date]
+    scanned_payments: int
+
+
+class UserRow(NamedTuple):
+    """Пользователь со списком счетов"""
+
+    id: int
+    email: str
+    full_name: str
+    created_at: datetime
+    accounts: List[AccountRow]
+
+
+def columns(entity, row_type) -> tuple:
+    """Колонки модели в порядке полей строки"""
+    return tuple(getattr(entity, field) for field in row_type._fields)
@@ -1,21 +1,44 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator
+from pydantic.functional_serializers import PlainSerializer
+from typing_extensions import Annotated
 
+# Денежные суммы хранятся в БД целым числом минимальных единиц (копеек,
+# BIGINT), в API передаются десятичной строкой. Преобразование выполняется
+# только здесь, на границе API.
+MINOR_UNITS = 100
+MAX_MINOR_UNITS = 2**63 - 1
 
-# Настройка для сериализации datetime
+
+def to_minor_units(amount: Decimal) -> int:
+    """Сумма в минимальных единицах; ValueError для долей копейки"""
+    minor = amount * MINOR_UNITS
+    if minor != minor.to_integral_value():
+        raise ValueError("Amount must have at most 2 decimal places")
+    if abs(minor) > MAX_MINOR_UNITS:
+        raise ValueError("Amount is too large")
+    return int(minor)
+
+
+def format_minor_units(minor: int) -> str:
+    """Десятичная строка суммы в минимальных единицах (10050 -> 100.50)"""
+    units, cents = divmod(abs(minor), MINOR_UNITS)
+    return f"{'-' if minor < 0 else ''}{units}.{cents:02d}"
+
+
+# Сумма в минимальных единицах, в JSON — точная десятичная строка
+Money = Annotated[int, PlainSerializer(format_minor_units, return_type=str)]
+
+
+# Базовая модель ответов: datetime сериализуется в ISO 8601,
+# суммы (Money) - в точную десятичную строку
 class CustomBaseModel(BaseModel):
-    """Базовая модель с настройкой сериализации"""
+    """Базовая модель ответа, создаваемая из атрибутов объекта"""
 
-    model_config = ConfigDict(
-        from_attributes=True,
-        json_encoders={
-            datetime: lambda v: v.isoformat() if v else None,
-            Decimal: lambda v: float(v) if v else None,
-        },
-    )
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для аутентификации
@@ -75,10 +98,21 @@ class AccountResponse(CustomBaseModel):
 
     id: int
     user_id: int
-    balance: Decimal
+    balance: Money
     created_at: datetime
 
 
+class AccountBalanceResponse(CustomBaseModel):
+    """Схема ответа с балансом счета на момент времени"""
+
+    account_id: int
+    as_of: datetime
+    balance: Money
+    # День последнего использованного среза и число платежей после него
+    checkpoint: Optional[date]
+    scanned_payments: int
+
+
 # Схемы для платежа
 class PaymentResponse(CustomBaseModel):
     """Схема ответа с данными платежа"""
@@ -87,7 +121,7 @@ class PaymentResponse(CustomBaseModel):
     transaction_id: str
     account_id: int
     user_id: int
-    amount: Decimal
+    amount: Money
     created_at: datetime
 
 
@@ -101,6 +135,27 @@ class WebhookRequest(BaseModel):
     amount: Decimal = Field(gt=0)
     signature: str
 
+    @field_validator("amount")
+    @classmethod
+    def whole_minor_units(cls, amount: Decimal) -> Decimal:
+        # Сумма остается в виде, пришедшем от провайдера: по ней
+        # проверяется подпись
+        to_minor_units(amount)
+        return amount
+
+    @property
+    def amount_minor(self) -> int:
+        """Сумма в минимальных единицах для зачисления"""
+        return to_minor_units(self.amount)
+
+
+class WebhookPaymentResponse(CustomBaseModel):
+    """Схема ответа на обработанный вебхук"""
+
+    status: str = "success"
+    message: str = "Payment processed successfully"
+    payment: PaymentResponse
+
 
 # Расширенные ответы
 class UserWithAccountsResponse(UserResponse):
@@ -113,3 +168,9 @@ class UserWithPaymentsResponse(UserResponse):
     """Схема пользователя с платежами"""
 
     payments: List[PaymentResponse] = []
+
+
+class ProfilingSettings(BaseModel):
+    """Схема настроек профилирования запросов"""
+
+    sample_rate: float = Field(ge=0, le=1)
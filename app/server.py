@@ -0,0 +1,101 @@
+"""Production-запуск приложения на нескольких воркерах.
+
+    python -m app.server
+
+Настройки берутся из Config. SIGTERM запускает штатную остановку Sanic:
+прием соединений прекращается, активные запросы завершаются в пределах
+GRACEFUL_SHUTDOWN_TIMEOUT.
+"""
+
+import os
+from typing import List
+
+from sanic import Sanic
+from sanic.log import logger
+from sanic.worker.loader import AppLoader
+
+from app.config import Config
+from app.main import create_app
+
+
+def worker_count() -> int:
+    """Число воркеров: из конфигурации или по числу CPU"""
+    return Config.WORKERS or os.cpu_count() or 1
+
+
+def configure_event_bridge(workers: int) -> None:
+    """Без явного EVENTS_PG_NOTIFY события рассылаются через LISTEN/NOTIFY,
+    если воркеров несколько: иначе поток событий клиента не получает
+    платежи, обработанные другими воркерами"""
+    if workers > 1 and "EVENTS_PG_NOTIFY" not in os.environ:
+        # Воркеры — отдельные процессы и читают Config из окружения
+        os.environ["EVENTS_PG_NOTIFY"] = "true"
+        Config.EVENTS_PG_NOTIFY = True
+
+
+def effective_settings(app: Sanic) -> dict:
+    """Фактические настройки, с которыми будет запущен сервер"""
+    return {
+        "host": Config.HOST,
+        "port": Config.PORT,
+        "workers": worker_count(),
+        "cpu_count": os.cpu_count(),
+        "access_log": Config.ACCESS_LOG,
+        "events_pg_notify": Config.EVENTS_PG_NOTIFY,
+        "backlog": Config.BACKLOG,
+        "keep_alive_timeout": app.config.KEEP_ALIVE_TIMEOUT,
+        "request_timeout": app.config.REQUEST_TIMEOUT,
+        "response_timeout": app.config.RESPONSE_TIMEOUT,
+        "request_max_size": app.config.REQUEST_MAX_SIZE,
+        "graceful_shutdown_timeout": app.config.GRACEFUL_SHUTDOWN_TIMEOUT,
+    }
+
+
+def self_check(settings: dict) -> List[str]:
+    """Проверка настроек на типичные ошибки конфигурации"""
+    warnings = []
+    if settings["workers"] > (settings["cpu_count"] or 1):
+        warnings.append("workers exceed CPU count")
+    if settings["workers"] > 1 and not settings["events_pg_notify"]:
+        warnings.append(
+            "EVENTS_PG_NOTIFY is disabled with several workers, "
+            "event streams miss payments handled by other workers"
+        )
+    if Config.EVENTS_KEEPALIVE >= settings["response_timeout"]:
+        warnings.append(
+            "EVENTS_KEEPALIVE must be below RESPONSE_TIMEOUT, "
+            "otherwise idle event streams are closed by the server"
+        )
+    if Config.JWT_SECRET == "your-secret-key-change-in-production":
+        warnings.append("JWT_SECRET uses the default value")
+    return warnings
+
+
+def main() -> None:
+    configure_event_bridge(worker_count())
+    loader = AppLoader(factory=create_app)
+    app = loader.load()
+
+    settings = effective_settings(app)
+    logger.info(
+        "Effective settings: %s",
+        ", ".join(f"{key}={value}" for key, value in settings.items()),
+    )
+    for warning in self_check(settings):
+        logger.warning("Self-check: %s", warning)
+
+    app.prepare(
+        host=Config.HOST,
+        port=Config.PORT,
+        workers=settings["workers"],
+        access_log=Config.ACCESS_LOG,
+        backlog=Config.BACKLOG,
+        debug=False,
+        auto_reload=False,
+        motd=False,
+    )
+    Sanic.serve(primary=app, app_loader=loader)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,83 @@
 import hashlib
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import func, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.archive import MICROSECOND, Cursor, payment_archive
 from app.auth import AuthService
+from app.cache import account_cache
+from app.checkpoints import day_start
 from app.config import Config
-from app.models import User, Account, Payment
+from app.events import event_hub, payment_event
+from app.models import (
+    User,
+    Account,
+    BalanceCheckpoint,
+    Payment,
+    PaymentTransaction,
+)
+from app.rows import AccountRow, BalanceRow, PaymentRow, UserRow, columns
 from app.schemas import UserCreate, UserUpdate
 
 
+def iso_utc(column: str) -> str:
+    """SQL-выражение: время как в ответах pydantic — UTC с суффиксом Z,
+    микросекунды только если они не нулевые. json_build_object выводит
+    timestamptz со смещением часового пояса сессии (+00:00)."""
+    utc = f"({column} AT TIME ZONE 'UTC')"
+    return (
+        f"to_char({utc}, 'YYYY-MM-DD\"T\"HH24:MI:SS' || "
+        f"CASE WHEN date_trunc('second', {utc}) = {utc} THEN '' ELSE '.US' END "
+        "|| '\"Z\"')"
+    )
+
+
+# Пользователи со счетами, собранные в JSON на стороне PostgreSQL.
+# Значения совпадают с UserWithAccountsResponse (баланс из копеек переводится
+# в десятичную строку, как Money; время — через iso_utc), отличаются только
+# пробелы; LIMIT NULL выбирает все строки.
+USERS_WITH_ACCOUNTS_JSON = text(f"""
+    SELECT coalesce(json_agg(page.doc ORDER BY page.id), '[]')::text,
+           count(*),
+           max(page.id)
+    FROM (
+        SELECT u.id,
+               json_build_object(
+                   'id', u.id,
+                   'email', u.email,
+                   'full_name', u.full_name,
+                   'created_at', {iso_utc("u.created_at")},
+                   'accounts', coalesce(
+                       (
+                           SELECT json_agg(
+                               json_build_object(
+                                   'id', a.id,
+                                   'user_id', a.user_id,
+                                   'balance', (a.balance::numeric / 100)::numeric(21, 2)::text,
+                                   'created_at', {iso_utc("a.created_at")}
+                               )
+                               ORDER BY a.id
+                           )
+                           FROM accounts a
+                           WHERE a.user_id = u.id
+                       ),
+                       '[]'::json
+                   )
+               ) AS doc
+        FROM users u
+        WHERE u.id > :after_id
+        ORDER BY u.id
+        LIMIT :limit
+    ) page
+    """)
+
+
 class UserService:
     """Сервис для работы с пользователями"""
 
@@ -25,7 +91,7 @@ class UserService:
             raise ValueError("User with this email already exists")
 
         # Создаем пользователя
-        hashed_password = AuthService.hash_password(user_data.password)
+        hashed_password = await AuthService.hash_password_async(user_data.password)
         user = User(
             email=user_data.email,
             full_name=user_data.full_name,
@@ -50,6 +116,49 @@ class UserService:
         result = await session.execute(stmt)
         return result.scalars().all()
 
+    @staticmethod
+    async def get_user_rows(
+        session: AsyncSession, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[UserRow]:
+        """Получение пользователей со счетами без загрузки ORM-объектов"""
+        user_columns = (User.id, User.email, User.full_name, User.created_at)
+        stmt = (
+            select(*user_columns)
+            .where(User.id > after_id)
+            .order_by(User.id)
+            .limit(limit)
+        )
+        users = [UserRow(*row, []) for row in await session.execute(stmt)]
+        if not users:
+            return users
+
+        by_id = {user.id: user.accounts for user in users}
+        stmt = (
+            select(*columns(Account, AccountRow))
+            .where(Account.user_id.between(users[0].id, users[-1].id))
+            .order_by(Account.id)
+        )
+        for account in map(AccountRow._make, await session.execute(stmt)):
+            accounts = by_id.get(account.user_id)
+            if accounts is not None:
+                accounts.append(account)
+        return users
+
+    @staticmethod
+    async def get_users_json(
+        session: AsyncSession, after_id: int = 0, limit: Optional[int] = None
+    ) -> Tuple[bytes, int, Optional[int]]:
+        """Получение пользователей со счетами в виде готового JSON из PostgreSQL.
+
+        Возвращает тело ответа, число пользователей на странице и id
+        последнего из них для следующей страницы.
+        """
+        result = await session.execute(
+            USERS_WITH_ACCOUNTS_JSON, {"after_id": after_id, "limit": limit}
+        )
+        body, count, last_id = result.one()
+        return body.encode(), count, last_id
+
     @staticmethod
     async def update_user(
         session: AsyncSession, user_id: int, user_data: UserUpdate
@@ -64,7 +173,9 @@ class UserService:
         if user_data.full_name:
             user.full_name = user_data.full_name
         if user_data.password:
-            user.password_hash = AuthService.hash_password(user_data.password)
+            user.password_hash = await AuthService.hash_password_async(
+                user_data.password
+            )
 
         await session.commit()
         await session.refresh(user)
@@ -79,6 +190,7 @@ class UserService:
 
         await session.delete(user)
         await session.commit()
+        account_cache.invalidate(user_id)
         return True
 
 
@@ -86,65 +198,259 @@ class AccountService:
     """Сервис для работы со счетами"""
 
     @staticmethod
-    async def get_user_accounts(session: AsyncSession, user_id: int) -> List[Account]:
+    async def get_user_accounts(
+        session: AsyncSession, user_id: int
+    ) -> List[AccountRow]:
         """Получение счетов пользователя"""
-        stmt = select(Account).where(Account.user_id == user_id)
+        cached = account_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        # Загрузка из БД; токен защищает кеш от записи устаревших данных
+        token = account_cache.begin_load(user_id)
+        accounts = None
+        try:
+            accounts = await AccountService.get_user_account_rows(session, user_id)
+        finally:
+            account_cache.finish_load(user_id, token, accounts)
+        return accounts
+
+    @staticmethod
+    async def get_user_account_rows(
+        session: AsyncSession, user_id: int
+    ) -> List[AccountRow]:
+        """Получение счетов пользователя без загрузки ORM-объектов"""
+        stmt = select(*columns(Account, AccountRow)).where(Account.user_id == user_id)
         result = await session.execute(stmt)
-        return result.scalars().all()
+        return list(map(AccountRow._make, result))
 
     @staticmethod
-    async def get_or_create_account(
-        session: AsyncSession, user_id: int, account_id: int
-    ) -> Account:
-        """Получение или создание счета"""
-        stmt = select(Account).where(
-            Account.id == account_id, Account.user_id == user_id
+    async def credit_account(
+        session: AsyncSession, user_id: int, account_id: int, amount: int
+    ) -> Optional[AccountRow]:
+        """Атомарное зачисление на счет с созданием счета при первом платеже
+
+        amount — сумма в минимальных единицах. Возвращает состояние счета
+        после зачисления или None, если счет принадлежит другому
+        пользователю. Строка счета остается заблокированной до конца
+        транзакции.
+        """
+        credit = (
+            update(Account)
+            .where(Account.id == account_id, Account.user_id == user_id)
+            .values(balance=Account.balance + amount)
+            .returning(*columns(Account, AccountRow))
+            .execution_options(synchronize_session=False)
         )
-        result = await session.execute(stmt)
-        account = result.scalar_one_or_none()
+        row = (await session.execute(credit)).one_or_none()
+        if row is None:
+            # Первый платеж на счет; если счет одновременно создал другой
+            # платеж, вставка пропускается и зачисление повторяется
+            create = (
+                pg_insert(Account)
+                .values(id=account_id, user_id=user_id, balance=amount)
+                .on_conflict_do_nothing(index_elements=[Account.id])
+                .returning(*columns(Account, AccountRow))
+            )
+            row = (await session.execute(create)).one_or_none()
+            if row is None:
+                row = (await session.execute(credit)).one_or_none()
+        return AccountRow._make(row) if row is not None else None
 
-        if not account:
-            account = Account(id=account_id, user_id=user_id, balance=Decimal("0.00"))
-            session.add(account)
-            await session.commit()
-            await session.refresh(account)
+    @staticmethod
+    async def get_balance_as_of(
+        session: AsyncSession,
+        account_id: int,
+        as_of: datetime,
+        user_id: Optional[int] = None,
+    ) -> Optional[BalanceRow]:
+        """Баланс счета на момент as_of (платежи в этот момент учитываются)
+
+        К последнему дневному срезу (app.checkpoints), закрытому не позже
+        as_of, добавляются платежи счета после него: объем чтения зависит от
+        платежей за последние дни, а не от всей истории счета. user_id
+        ограничивает поиск счетами пользователя. None, если счет не найден.
+        """
+        stmt = select(Account.user_id).where(Account.id == account_id)
+        if user_id is not None:
+            stmt = stmt.where(Account.user_id == user_id)
+        owner = (await session.execute(stmt)).scalar_one_or_none()
+        if owner is None:
+            return None
 
-        return account
+        as_of = as_of.astimezone(timezone.utc)
+        stmt = (
+            select(BalanceCheckpoint.day, BalanceCheckpoint.balance)
+            .where(
+                BalanceCheckpoint.account_id == account_id,
+                BalanceCheckpoint.day < as_of.date(),
+            )
+            .order_by(BalanceCheckpoint.day.desc())
+            .limit(1)
+        )
+        checkpoint = (await session.execute(stmt)).one_or_none()
+        day, balance = checkpoint if checkpoint is not None else (None, 0)
+        since = day_start(day + timedelta(days=1)) if day is not None else None
+
+        # Платежи после среза ищутся по индексу (user_id, created_at):
+        # счет принадлежит одному пользователю
+        snapshot = await payment_archive.snapshot_async()
+        boundary = snapshot.boundary
+        archived = boundary is not None and (since is None or since < boundary)
+        stmt = select(func.coalesce(func.sum(Payment.amount), 0), func.count()).where(
+            Payment.user_id == owner,
+            Payment.account_id == account_id,
+            Payment.created_at <= as_of,
+        )
+        lower = boundary if archived else since
+        if lower is not None:
+            stmt = stmt.where(Payment.created_at >= lower)
+        total, scanned = (await session.execute(stmt)).one()
+        balance += int(total)
+
+        if archived:
+            rows = await payment_archive.read_user_async(
+                owner,
+                since=since,
+                until=min(as_of + MICROSECOND, boundary),
+                snapshot=snapshot,
+            )
+            for row in rows:
+                if row.account_id == account_id:
+                    balance += row.amount
+                    scanned += 1
+        return BalanceRow(account_id, as_of, balance, day, scanned)
 
 
 class PaymentService:
     """Сервис для работы с платежами"""
 
     @staticmethod
-    async def get_user_payments(session: AsyncSession, user_id: int) -> List[Payment]:
+    async def get_user_payments(
+        session: AsyncSession,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Payment]:
         """Получение платежей пользователя"""
-        stmt = select(Payment).where(Payment.user_id == user_id)
+        stmt = PaymentService._in_period(
+            select(Payment).where(Payment.user_id == user_id), since, until
+        )
         result = await session.execute(stmt)
         return result.scalars().all()
 
+    @staticmethod
+    async def get_user_payment_rows(
+        session: AsyncSession,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[PaymentRow]:
+        """Получение платежей пользователя без загрузки ORM-объектов"""
+        stmt = PaymentService._in_period(
+            select(*columns(Payment, PaymentRow)).where(Payment.user_id == user_id),
+            since,
+            until,
+        )
+        result = await session.execute(stmt)
+        return list(map(PaymentRow._make, result))
+
+    @staticmethod
+    async def get_user_payment_page(
+        session: AsyncSession,
+        user_id: int,
+        limit: Optional[int] = None,
+        before: Optional[Cursor] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Tuple[List[PaymentRow], Optional[Cursor]]:
+        """Страница платежей пользователя от новых к старым.
+
+        Платежи новее границы архива читаются из PostgreSQL, более старые —
+        из сегментов app.archive. before — (created_at, id) последней строки
+        предыдущей страницы. Возвращает строки и курсор следующей страницы
+        (None, если страница неполная).
+        """
+        # Одна версия архива для обоих чтений: сегмент, опубликованный
+        # между ними, не вернет строки, уже прочитанные из PostgreSQL
+        snapshot = await payment_archive.snapshot_async()
+        boundary = snapshot.boundary
+        rows: List[PaymentRow] = []
+        if boundary is None or before is None or before[0] >= boundary:
+            lower = since
+            if boundary is not None and (since is None or since < boundary):
+                # Строки старше границы уже в архиве (или ждут удаления)
+                lower = boundary
+            stmt = PaymentService._in_period(
+                select(*columns(Payment, PaymentRow)).where(Payment.user_id == user_id),
+                lower,
+                until,
+            )
+            if before is not None:
+                # Отдельное условие на created_at оставляет отсечение секций
+                stmt = stmt.where(
+                    Payment.created_at <= before[0],
+                    tuple_(Payment.created_at, Payment.id) < tuple_(*before),
+                )
+            stmt = stmt.order_by(Payment.created_at.desc(), Payment.id.desc())
+            result = await session.execute(stmt.limit(limit))
+            rows = list(map(PaymentRow._make, result))
+
+        if (
+            boundary is not None
+            and (limit is None or len(rows) < limit)
+            and (since is None or since < boundary)
+        ):
+            rows += await payment_archive.read_user_async(
+                user_id,
+                limit - len(rows) if limit is not None else None,
+                before if before is not None and before[0] < boundary else None,
+                since,
+                until,
+                snapshot,
+            )
+
+        if limit is None or len(rows) < limit:
+            return rows, None
+        return rows, (rows[-1].created_at, rows[-1].id)
+
+    @staticmethod
+    def _in_period(stmt, since: Optional[datetime], until: Optional[datetime]):
+        # Условия прямо на created_at (ключ секционирования): PostgreSQL
+        # читает только секции нужных месяцев
+        if since is not None:
+            stmt = stmt.where(Payment.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(Payment.created_at < until)
+        return stmt
+
     @staticmethod
     async def process_payment(
         session: AsyncSession,
         transaction_id: str,
         user_id: int,
         account_id: int,
-        amount: Decimal,
+        amount: int,
     ) -> Payment:
-        """Обработка платежа"""
+        """Обработка платежа (amount в минимальных единицах)
+
+        Баланс увеличивается одним UPDATE в транзакции вставки платежа, а не
+        чтением и записью из Python: конкурентные вебхуки на один счет
+        выполняются по очереди на блокировке строки счета и не теряют
+        зачислений. Повтор, пришедший одновременно с исходной транзакцией,
+        отклоняется первичным ключом payment_transactions.
+        """
         # Проверяем уникальность транзакции
-        stmt = select(Payment).where(Payment.transaction_id == transaction_id)
-        result = await session.execute(stmt)
-        existing_payment = result.scalar_one_or_none()
-
-        if existing_payment:
+        if await PaymentService._transaction_exists(session, transaction_id):
             raise ValueError("Transaction already processed")
 
-        # Получаем или создаем счет
-        account = await AccountService.get_or_create_account(
-            session, user_id, account_id
+        account = await AccountService.credit_account(
+            session, user_id, account_id, amount
         )
+        if account is None:
+            await session.rollback()
+            raise ValueError("Account belongs to another user")
 
-        # Создаем платеж
         payment = Payment(
             transaction_id=transaction_id,
             account_id=account_id,
@@ -152,14 +458,36 @@ class PaymentService:
             amount=amount,
         )
         session.add(payment)
+        try:
+            # id и created_at платежа нужны записи о транзакции
+            await session.flush()
+            session.add(
+                PaymentTransaction(
+                    transaction_id=transaction_id,
+                    payment_id=payment.id,
+                    created_at=payment.created_at,
+                )
+            )
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            if await PaymentService._transaction_exists(session, transaction_id):
+                raise ValueError("Transaction already processed")
+            raise
 
-        # Обновляем баланс счета
-        account.balance += amount
-
-        await session.commit()
+        account_cache.update_account(account)
         await session.refresh(payment)
+        event_hub.publish(user_id, payment_event(payment, account))
         return payment
 
+    @staticmethod
+    async def _transaction_exists(session: AsyncSession, transaction_id: str) -> bool:
+        stmt = select(PaymentTransaction.payment_id).where(
+            PaymentTransaction.transaction_id == transaction_id
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
 
 class WebhookService:
     """Сервис для работы с вебхуками"""
@@ -0,0 +1,178 @@
+"""Журнал медленных SQL-запросов.
+
+Обработчики событий движка SQLAlchemy замеряют каждый запрос. Запросы
+дольше порога попадают в ограниченное хранилище вместе с параметрами;
+значения параметров с именами, похожими на секреты, заменяются на ***.
+Для выборки SELECT-запросов на отдельном соединении выполняется
+EXPLAIN (ANALYZE, BUFFERS) внутри транзакции, которая откатывается.
+ANALYZE выполняет запрос, поэтому запросы с блокировками строк (FOR
+UPDATE/SHARE) и вызовами функций с побочными эффектами (nextval,
+pg_advisory_* и т. п.) получают только план без выполнения — обычный
+EXPLAIN.
+"""
+
+import asyncio
+import itertools
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+from sqlalchemy import event, text
+
+from app.config import Config
+from app.logs import logger
+
+REDACTED = "***"
+
+# Признаки SELECT, повторное выполнение которого не безопасно: блокировки
+# строк и функции, меняющие состояние вне откатываемой транзакции или
+# удерживающие блокировки
+SIDE_EFFECTS = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b"
+    r"|\b(?:nextval|setval|pg_(?:try_)?advisory\w*|pg_notify|dblink\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def explain_sql(statement: str) -> str:
+    """EXPLAIN для запроса: с ANALYZE, только если выполнение безопасно"""
+    if SIDE_EFFECTS.search(statement):
+        return f"EXPLAIN {statement}"
+    return f"EXPLAIN (ANALYZE, BUFFERS) {statement}"
+
+
+def redact_parameters(names, parameters, secrets: Iterable[str]) -> Optional[dict]:
+    """Параметры запроса по именам с маскировкой секретов.
+
+    Если имена параметров неизвестны (запрос без компиляции SQLAlchemy),
+    маскируются все значения.
+    """
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        items = list(parameters.items())
+    elif names and len(names) == len(parameters):
+        items = list(zip(names, parameters))
+    else:
+        return {f"${i}": REDACTED for i in range(1, len(parameters) + 1)}
+
+    redacted = {}
+    for name, value in items:
+        if any(secret in str(name).lower() for secret in secrets):
+            redacted[name] = REDACTED
+        else:
+            value = repr(value) if not isinstance(value, (int, float, str)) else value
+            redacted[name] = value[:200] if isinstance(value, str) else value
+    return redacted
+
+
+class SlowQueryLog:
+    """Хранилище последних медленных запросов воркера"""
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        keep: int,
+        explain_rate: float,
+        secrets: Iterable[str],
+        explain_interval: float = 60.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self.secrets = tuple(secret.strip().lower() for secret in secrets if secret)
+        self.entries: Deque[dict] = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._random = (rng or random.Random()).random
+        self._explain_engine = None
+        self._explaining = False
+        self._explained_at: Dict[str, float] = {}
+
+    def install(self, engine, explain_engine=None) -> None:
+        """Подключение к движку (повторный вызов не дублирует обработчики)"""
+        if not event.contains(engine, "before_cursor_execute", self._before_execute):
+            event.listen(engine, "before_cursor_execute", self._before_execute)
+            event.listen(engine, "after_cursor_execute", self._after_execute)
+        self._explain_engine = explain_engine
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        context._slow_query_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        started = getattr(context, "_slow_query_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if duration < self.threshold or statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+
+        compiled = getattr(context, "compiled", None)
+        names = getattr(compiled, "positiontup", None) if compiled else None
+        entry = {
+            "id": next(self._ids),
+            "created_at": time.time(),
+            "duration_ms": round(duration * 1000, 3),
+            "statement": statement,
+            "parameters": redact_parameters(
+                names, None if many else parameters, self.secrets
+            ),
+            "executemany": many,
+            "explain": None,
+        }
+        self.entries.append(entry)
+        logger.warning(
+            "Slow query",
+            extra={"duration_ms": entry["duration_ms"], "statement": statement[:500]},
+        )
+
+        if not many and self._should_explain(statement):
+            self._explaining = True
+            asyncio.get_running_loop().create_task(
+                self._explain(entry, statement, parameters)
+            )
+
+    def _should_explain(self, statement: str) -> bool:
+        # EXPLAIN ANALYZE выполняет запрос, поэтому только SELECT (опасные
+        # SELECT отсекает explain_sql), по одному одновременно и не чаще
+        # explain_interval для одного текста запроса
+        if self._explain_engine is None or self._explaining:
+            return False
+        if statement.lstrip()[:6].upper() != "SELECT":
+            return False
+        if self._random() >= self.explain_rate:
+            return False
+        now = time.monotonic()
+        if now - self._explained_at.get(statement, -self.explain_interval) < (
+            self.explain_interval
+        ):
+            return False
+        if len(self._explained_at) > 1000:
+            self._explained_at.clear()
+        self._explained_at[statement] = now
+        return True
+
+    async def _explain(self, entry: dict, statement: str, parameters) -> None:
+        try:
+            async with self._explain_engine.connect() as conn:
+                async with conn.begin() as transaction:
+                    await conn.execute(text("SET LOCAL statement_timeout = '10s'"))
+                    result = await conn.exec_driver_sql(
+                        explain_sql(statement), parameters
+                    )
+                    entry["explain"] = "\n".join(row[0] for row in result)
+                    await transaction.rollback()
+        except Exception as e:
+            entry["explain"] = f"EXPLAIN failed: {e}"
+        finally:
+            self._explaining = False
+
+
+slow_query_log = SlowQueryLog(
+    Config.SLOW_QUERY_THRESHOLD_MS,
+    Config.SLOW_QUERY_KEEP,
+    Config.SLOW_QUERY_EXPLAIN_RATE,
+    Config.SLOW_QUERY_REDACT.split(","),
+)
@@ -9,5 +9,6 @@ def custom_json_serializer(obj):
     if isinstance(obj, datetime):
         return obj.isoformat()
     elif isinstance(obj, Decimal):
-        return float(obj)
+        # Денежные суммы передаются строкой, чтобы не терять точность
+        return str(obj)
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
@@ -0,0 +1,108 @@
+"""Обнаружение блокировок event loop.
+
+Event loop раз в interval обновляет отметку времени (heartbeat) через
+call_later. Поток-наблюдатель проверяет отметку: если она не обновлялась
+дольше threshold, значит, текущий callback блокирует loop. Поток снимает
+стек потока event loop (это и есть блокирующий код), пишет его в лог и
+запоминает выполняющуюся задачу. Когда loop освобождается, heartbeat
+учитывает полную длительность блокировки в метриках.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Callable, Optional
+
+from app.logs import logger
+
+
+class LoopWatchdog:
+    """Наблюдатель за блокировками event loop"""
+
+    def __init__(
+        self,
+        threshold: float,
+        on_block: Optional[Callable[[float], None]] = None,
+        clock=time.monotonic,
+    ):
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.on_block = on_block
+        self._clock = clock
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._heartbeat = 0.0
+        self._reported = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Задача -> отметка heartbeat перед блокировкой, которую она вызвала
+        self._blocked = weakref.WeakKeyDictionary()
+
+        self.blocks = 0
+        self.blocked_seconds = 0.0
+        self.max_block = 0.0
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Запуск heartbeat в loop и потока-наблюдателя"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = self._clock()
+        self._timer = loop.call_later(self.interval, self._tick)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановка наблюдения"""
+        self._stopped.set()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def blocked_for(self, task: Optional[asyncio.Task]) -> Optional[float]:
+        """Длительность блокировки, вызванной задачей, в секундах"""
+        started = self._blocked.pop(task, None) if task is not None else None
+        if started is None:
+            return None
+        # Блокировка могла еще не закончиться, если ответ формируется в том же
+        # шаге задачи
+        return self._clock() - started
+
+    def _tick(self) -> None:
+        now = self._clock()
+        gap = now - self._heartbeat - self.interval
+        if gap >= self.threshold:
+            self.blocks += 1
+            self.blocked_seconds += gap
+            self.max_block = max(self.max_block, gap)
+            if self.on_block is not None:
+                self.on_block(gap)
+        self._heartbeat = now
+        self._timer = self._loop.call_later(self.interval, self._tick)
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = self._clock() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == self._reported:
+                continue
+            # Одна запись на блокировку
+            self._reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            task = asyncio.current_task(self._loop)
+            if task is not None:
+                self._blocked[task] = heartbeat + self.interval
+            logger.warning(
+                "Event loop blocked",
+                extra={
+                    "blocked_ms": round(stalled * 1000, 1),
+                    "task": task.get_name() if task is not None else None,
+                    "stack": "".join(traceback.format_stack(frame)) if frame else None,
+                },
+            )
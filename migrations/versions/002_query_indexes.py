@@ -0,0 +1,71 @@
+"""Индексы под запросы сервисов, удаление дублирующих индексов
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-06-01 12:00:00.000000
+
+"""
+
+from alembic import op
+
+from app.migration_ops import drop_invalid_index
+
+# Идентификаторы ревизии, используемые Alembic
+revision = "002"
+down_revision = "001"
+branch_labels = None
+depends_on = None
+
+# Индексы под запросы app/services.py
+INDEXES = [
+    ("ix_accounts_user_id", "accounts", ["user_id"]),
+    ("ix_payments_user_id_created_at", "payments", ["user_id", "created_at"]),
+    ("ix_payments_account_id", "payments", ["account_id"]),
+]
+
+# Дубли первичных ключей и ограничения unique_transaction: только
+# удорожают вставку платежа
+REDUNDANT_INDEXES = [
+    ("ix_users_id", "users", ["id"]),
+    ("ix_admins_id", "admins", ["id"]),
+    ("ix_accounts_id", "accounts", ["id"]),
+    ("ix_payments_id", "payments", ["id"]),
+    ("ix_payments_transaction_id", "payments", ["transaction_id"]),
+]
+
+
+def upgrade() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY не блокирует запись в таблицы, но не
+    # выполняется внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            drop_invalid_index(name)
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        for name, table, _ in REDUNDANT_INDEXES:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Откат миграции - возврат исходного набора индексов"""
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT_INDEXES:
+            drop_invalid_index(name)
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
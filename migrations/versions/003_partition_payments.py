@@ -0,0 +1,131 @@
+"""Месячное секционирование payments, таблица payment_transactions
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-07-01 12:00:00.000000
+
+"""
+
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.partitions import add_months, create_partition_sql, month_start, months_between
+
+# Идентификаторы ревизии, используемые Alembic
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+# Секции создаются на столько месяцев вперед; дальше их поддерживает
+# utils/partitions.py
+MONTHS_AHEAD = 3
+
+PAYMENT_COLUMNS = "id, transaction_id, account_id, user_id, amount, created_at"
+
+
+def payment_columns():
+    return [
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('payments_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column("transaction_id", sa.String(), nullable=False),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+    ]
+
+
+def set_aside(old_name: str) -> None:
+    """Переименование текущей payments; последовательность id отвязывается,
+    чтобы пережить удаление старой таблицы"""
+    op.execute("LOCK TABLE payments IN ACCESS EXCLUSIVE MODE")
+    op.drop_index("ix_payments_user_id_created_at", table_name="payments")
+    op.drop_index("ix_payments_account_id", table_name="payments")
+    op.execute(f"ALTER TABLE payments RENAME TO {old_name}")
+    op.execute(
+        f"ALTER TABLE {old_name} RENAME CONSTRAINT payments_pkey TO {old_name}_pkey"
+    )
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY NONE")
+
+
+def finish(old_name: str) -> None:
+    op.execute(
+        f"INSERT INTO payments ({PAYMENT_COLUMNS}) "
+        f"SELECT {PAYMENT_COLUMNS} FROM {old_name}"
+    )
+    op.drop_table(old_name)
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY payments.id")
+    op.create_index(
+        "ix_payments_user_id_created_at", "payments", ["user_id", "created_at"]
+    )
+    op.create_index("ix_payments_account_id", "payments", ["account_id"])
+
+
+def upgrade() -> None:
+    # Таблица переписывается под ACCESS EXCLUSIVE: на время миграции прием
+    # вебхуков останавливается
+    set_aside("payments_unpartitioned")
+    op.execute(
+        "UPDATE payments_unpartitioned SET created_at = now() WHERE created_at IS NULL"
+    )
+    op.create_table(
+        "payments",
+        *payment_columns(),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+
+    now = datetime.now(timezone.utc)
+    first = None
+    if not op.get_context().as_sql:
+        first = (
+            op.get_bind()
+            .execute(sa.text("SELECT min(created_at) FROM payments_unpartitioned"))
+            .scalar()
+        )
+    for month in months_between(
+        first or now, add_months(month_start(now), MONTHS_AHEAD)
+    ):
+        op.execute(create_partition_sql(month))
+
+    # Уникальность transaction_id для всех секций
+    op.create_table(
+        "payment_transactions",
+        sa.Column("transaction_id", sa.String(), nullable=False),
+        sa.Column("payment_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("transaction_id"),
+    )
+    op.execute(
+        "INSERT INTO payment_transactions (transaction_id, payment_id, created_at) "
+        "SELECT transaction_id, id, created_at FROM payments_unpartitioned"
+    )
+    finish("payments_unpartitioned")
+
+
+def downgrade() -> None:
+    """Откат миграции - обычная таблица payments (отсоединенные секции не
+    возвращаются)"""
+    set_aside("payments_partitioned")
+    op.create_table(
+        "payments",
+        *payment_columns(),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("transaction_id", name="unique_transaction"),
+    )
+    finish("payments_partitioned")
+    op.drop_table("payment_transactions")
@@ -0,0 +1,47 @@
+"""Денежные суммы в минимальных единицах (BIGINT)
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-08-01 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# Идентификаторы ревизии, используемые Alembic
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+# (таблица, колонка): accounts.balance и payments.amount со всеми секциями
+MONEY_COLUMNS = [("accounts", "balance"), ("payments", "amount")]
+
+
+def upgrade() -> None:
+    # Таблицы переписываются под ACCESS EXCLUSIVE: на время миграции прием
+    # вебхуков останавливается. NUMERIC(10, 2) переводится в BIGINT точно
+    for table, column in MONEY_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.BigInteger(),
+            existing_type=sa.Numeric(precision=10, scale=2),
+            existing_nullable=False,
+            postgresql_using=f"({column} * 100)::bigint",
+        )
+
+
+def downgrade() -> None:
+    """Откат миграции - суммы снова NUMERIC(10, 2); не выполнится, если
+    какой-то баланс превысил 99999999.99"""
+    for table, column in MONEY_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.Numeric(precision=10, scale=2),
+            existing_type=sa.BigInteger(),
+            existing_nullable=False,
+            postgresql_using=f"({column}::numeric / 100)::numeric(10, 2)",
+        )
@@ -0,0 +1,95 @@
+"""Таблицы сверки балансов, индекс платежей по (account_id, id)
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-09-01 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.migration_ops import drop_invalid_index, partitions
+
+# Идентификаторы ревизии, используемые Alembic
+revision = "005"
+down_revision = "004"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_payments_account_id_id"
+
+
+def upgrade() -> None:
+    # Индекс секционированной таблицы нельзя построить CONCURRENTLY: он
+    # создается на самой payments (ON ONLY), индексы секций строятся
+    # конкурентно и присоединяются к нему. Новые секции получают индекс
+    # автоматически
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY payments (account_id, id)"
+        )
+        for name in partitions():
+            drop_invalid_index(f"{name}_account_id_id_idx")
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_account_id_id_idx "
+                f"ON {name} (account_id, id)"
+            )
+            op.execute(f"ALTER INDEX {INDEX} ATTACH PARTITION {name}_account_id_id_idx")
+        # (account_id, id) покрывает и поиск платежей счета
+        op.drop_index("ix_payments_account_id", table_name="payments", if_exists=True)
+
+    op.create_table(
+        "reconciliation_state",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("watermark", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("audit_after", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("seeded", sa.Boolean(), server_default="false", nullable=False),
+        sa.Column("seeded_boundary", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute("INSERT INTO reconciliation_state (id) VALUES (1)")
+    op.create_table(
+        "account_payment_sums",
+        sa.Column("account_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("total", sa.BigInteger(), nullable=False),
+        sa.Column("payments", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("account_id"),
+    )
+    op.create_table(
+        "balance_drifts",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("balance", sa.BigInteger(), nullable=False),
+        sa.Column("expected", sa.BigInteger(), nullable=False),
+        sa.Column("repaired", sa.Boolean(), nullable=False),
+        sa.Column(
+            "detected_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_balance_drifts_account_id", "balance_drifts", ["account_id"])
+
+
+def downgrade() -> None:
+    """Откат миграции - удаление таблиц сверки и возврат индекса account_id"""
+    op.drop_table("balance_drifts")
+    op.drop_table("account_payment_sums")
+    op.drop_table("reconciliation_state")
+    op.create_index("ix_payments_account_id", "payments", ["account_id"])
+    op.drop_index(INDEX, table_name="payments")
@@ -0,0 +1,71 @@
+"""Дневные срезы балансов, BRIN-индекс платежей по created_at
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-09-15 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.migration_ops import drop_invalid_index, partitions
+
+# Идентификаторы ревизии, используемые Alembic
+revision = "006"
+down_revision = "005"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_payments_created_at_brin"
+
+
+def upgrade() -> None:
+    # Как в 005: индекс создается на самой payments (ON ONLY), индексы
+    # секций строятся конкурентно и присоединяются к нему
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY payments "
+            f"USING brin (created_at)"
+        )
+        for name in partitions():
+            drop_invalid_index(f"{name}_created_at_idx")
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_created_at_idx "
+                f"ON {name} USING brin (created_at)"
+            )
+            op.execute(f"ALTER INDEX {INDEX} ATTACH PARTITION {name}_created_at_idx")
+
+    op.create_table(
+        "balance_checkpoints",
+        sa.Column("account_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("balance", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("account_id", "day"),
+    )
+    op.create_table(
+        "balance_checkpoint_state",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("day", sa.Date(), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute("INSERT INTO balance_checkpoint_state (id) VALUES (1)")
+
+
+def downgrade() -> None:
+    """Откат миграции - удаление срезов балансов и BRIN-индекса"""
+    op.drop_table("balance_checkpoint_state")
+    op.drop_table("balance_checkpoints")
+    op.drop_index(INDEX, table_name="payments")
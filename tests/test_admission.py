@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionLimiter, Overloaded
+
+
+@pytest.mark.unit
+class TestAdmissionLimiter:
+    """Unit тесты для контроля допуска вебхуков"""
+
+    async def test_queue_is_fifo_and_bounded(self):
+        """Тест очереди: места передаются по порядку, лишние отклоняются"""
+        limiter = AdmissionLimiter(limit=1, queue_size=2, queue_timeout=1)
+        assert await limiter.acquire() == 0.0
+
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire()
+            order.append(name)
+
+        first = asyncio.create_task(waiter("first"))
+        second = asyncio.create_task(waiter("second"))
+        await asyncio.sleep(0)
+        assert limiter.stats() == {"inflight": 1, "queued": 2, "limit": 1}
+
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_full"
+
+        limiter.release()
+        await first
+        limiter.release()
+        await second
+        assert order == ["first", "second"]
+        limiter.release()
+        assert limiter.stats() == {"inflight": 0, "queued": 0, "limit": 1}
+
+    async def test_queue_timeout_frees_queue_place(self):
+        """Тест: истекшее ожидание отклоняется и не занимает место"""
+        limiter = AdmissionLimiter(limit=1, queue_size=1, queue_timeout=0.01)
+        await limiter.acquire()
+
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+
+        assert rejected.value.reason == "queue_timeout"
+        assert limiter.stats()["queued"] == 0
+        limiter.release()
+        assert limiter.stats()["inflight"] == 0
+        assert await limiter.acquire() == 0.0
+
+    async def test_cancelled_waiter_does_not_leak(self):
+        """Тест: отключившийся клиент в очереди не уносит место"""
+        limiter = AdmissionLimiter(limit=1, queue_size=1, queue_timeout=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+
+        assert limiter.stats() == {"inflight": 0, "queued": 0, "limit": 1}
+
+    async def test_adaptive_limit_aimd(self):
+        """Тест AIMD: медленная база уменьшает limit, быстрая — увеличивает"""
+        limiter = AdmissionLimiter(
+            limit=10,
+            queue_size=10,
+            queue_timeout=1,
+            adaptive=True,
+            min_limit=2,
+            target_latency=0.1,
+            decrease=0.5,
+        )
+
+        await limiter.acquire()
+        limiter.release(0.5)
+        assert limiter.limit == 5
+        # Обработки, начатые до уменьшения, не уменьшают limit повторно
+        await limiter.acquire()
+        limiter.release(0.5)
+        assert limiter.limit == 5
+
+        limiter._decreased_at = float("-inf")
+        for _ in range(3):
+            await limiter.acquire()
+            limiter.release(0.5)
+            limiter._decreased_at = float("-inf")
+        assert limiter.limit == 2
+
+        for _ in range(4):
+            await limiter.acquire()
+            limiter.release(0.01)
+        assert 3 <= limiter.limit < 4
+        assert limiter.stats()["limit"] == 3
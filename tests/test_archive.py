@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.archive import PaymentArchive, SegmentWriter, publish
+from app.rows import PaymentRow
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MIDDLE = datetime(2024, 2, 1, tzinfo=timezone.utc)
+END = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def payments(since, until, users=3, per_user=10):
+    """Платежи пользователей, равномерно распределенные по периоду"""
+    step = (until - since) / per_user
+    rows = []
+    for user_id in range(1, users + 1):
+        for n in range(per_user):
+            payment_id = user_id * 1000 + n + (0 if since == START else 500)
+            rows.append(
+                PaymentRow(
+                    payment_id,
+                    f"tx-{payment_id}",
+                    user_id * 10,
+                    user_id,
+                    n * 100 + 50,
+                    since + step * n,
+                )
+            )
+    return rows
+
+
+def write(directory, since, until, rows, block_rows=4):
+    writer = SegmentWriter(str(directory), f"seg_{until:%Y%m}", block_rows)
+    for row in sorted(rows, key=lambda row: (row.user_id, row.created_at, row.id)):
+        writer.add(row)
+    publish(str(directory), writer.close(), since, until)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    rows = payments(START, MIDDLE) + payments(MIDDLE, END)
+    write(tmp_path, None, MIDDLE, [row for row in rows if row.created_at < MIDDLE])
+    write(tmp_path, MIDDLE, END, [row for row in rows if row.created_at >= MIDDLE])
+    return PaymentArchive(str(tmp_path), cache_blocks=4), rows
+
+
+def newest_first(rows, user_id):
+    own = [row for row in rows if row.user_id == user_id]
+    return sorted(own, key=lambda row: (row.created_at, row.id), reverse=True)
+
+
+@pytest.mark.unit
+class TestPaymentArchive:
+    """Unit тесты для архива платежей"""
+
+    def test_empty_archive(self, tmp_path):
+        """Тест архива без манифеста"""
+        archive = PaymentArchive(str(tmp_path), cache_blocks=4)
+
+        assert archive.boundary() is None
+        assert archive.read_user(1, 10) == []
+
+    def test_read_all_user_payments(self, archive):
+        """Тест чтения всех платежей пользователя через оба сегмента"""
+        archive, rows = archive
+
+        assert archive.boundary() == END
+        assert archive.read_user(2) == newest_first(rows, 2)
+
+    def test_pages_with_cursor(self, archive):
+        """Тест постраничного чтения по курсору (created_at, id)"""
+        archive, rows = archive
+        pages, before = [], None
+        while True:
+            page = archive.read_user(3, 7, before)
+            pages.extend(page)
+            if len(page) < 7:
+                break
+            before = (page[-1].created_at, page[-1].id)
+
+        assert pages == newest_first(rows, 3)
+
+    def test_period_filter(self, archive):
+        """Тест фильтра since/until (until не включается)"""
+        archive, rows = archive
+        since = MIDDLE - timedelta(days=10)
+
+        found = archive.read_user(1, since=since, until=MIDDLE + timedelta(days=1))
+
+        assert found == [
+            row
+            for row in newest_first(rows, 1)
+            if since <= row.created_at < MIDDLE + timedelta(days=1)
+        ]
+
+    def test_block_cache_is_bounded(self, archive):
+        """Тест ограничения кеша распакованных блоков"""
+        archive, _ = archive
+        for user_id in (1, 2, 3):
+            archive.read_user(user_id)
+
+        assert len(archive._cache) == 4
+
+    def test_concurrent_reads_share_cache(self, archive):
+        """Тест чтения из нескольких потоков с общим маленьким кешем"""
+        archive, rows = archive
+        archive.cache_blocks = 1
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            found = list(pool.map(archive.read_user, [1, 2, 3] * 30))
+
+        assert found == [newest_first(rows, user_id) for user_id in [1, 2, 3] * 30]
+        assert len(archive._cache) == 1
+
+    def test_read_pinned_snapshot(self, tmp_path):
+        """Тест: сегмент, опубликованный после снимка, не попадает в чтение"""
+        rows = payments(START, MIDDLE) + payments(MIDDLE, END)
+        write(tmp_path, None, MIDDLE, [row for row in rows if row.created_at < MIDDLE])
+        archive = PaymentArchive(str(tmp_path), cache_blocks=4)
+        snapshot = archive.snapshot()
+
+        write(tmp_path, MIDDLE, END, [row for row in rows if row.created_at >= MIDDLE])
+
+        assert snapshot.boundary == MIDDLE
+        assert archive.read_user(1, snapshot=snapshot) == [
+            row for row in newest_first(rows, 1) if row.created_at < MIDDLE
+        ]
+        assert archive.boundary() == END
+        assert archive.read_user(1) == newest_first(rows, 1)
@@ -0,0 +1,243 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from app.cache import AccountCache, account_cache
+from app.models import Account, Payment, PaymentTransaction
+from app.rows import AccountRow
+from app.services import AccountService, PaymentService
+
+CREATED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def snapshot(account_id, user_id=1, balance=0):
+    return AccountRow(account_id, user_id, balance, CREATED_AT)
+
+
+class FakeClock:
+    """Управляемые часы для проверки TTL"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit
+class TestAccountCache:
+    """Unit тесты для кеша счетов"""
+
+    def test_miss_then_hit(self):
+        """Тест промаха и последующего попадания"""
+        cache = AccountCache(max_users=10, ttl=30)
+        assert cache.get(1) is None
+
+        token = cache.begin_load(1)
+        cache.finish_load(1, token, [snapshot(2), snapshot(1)])
+
+        assert [a.id for a in cache.get(1)] == [1, 2]
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+
+    def test_lru_bound(self):
+        """Тест ограничения размера кеша"""
+        cache = AccountCache(max_users=2, ttl=30)
+        for user_id in (1, 2, 3):
+            token = cache.begin_load(user_id)
+            cache.finish_load(user_id, token, [snapshot(user_id, user_id)])
+
+        assert cache.get(1) is None
+        assert cache.get(3) is not None
+        assert cache.stats()["size"] == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiration(self):
+        """Тест истечения TTL"""
+        clock = FakeClock()
+        cache = AccountCache(max_users=10, ttl=5, clock=clock)
+        token = cache.begin_load(1)
+        cache.finish_load(1, token, [snapshot(1)])
+
+        clock.now = 4.9
+        assert cache.get(1) is not None
+        clock.now = 5.0
+        assert cache.get(1) is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_write_through_update(self):
+        """Тест сквозной записи баланса"""
+        cache = AccountCache(max_users=10, ttl=30)
+        token = cache.begin_load(1)
+        cache.finish_load(1, token, [snapshot(1)])
+
+        cache.update_account(snapshot(1, balance=10000))
+        cache.update_account(snapshot(2, balance=500))
+
+        balances = {a.id: a.balance for a in cache.get(1)}
+        assert balances == {1: 10000, 2: 500}
+
+    def test_stale_fill_is_rejected(self):
+        """Тест отбрасывания данных, прочитанных до записи"""
+        cache = AccountCache(max_users=10, ttl=30)
+        token = cache.begin_load(1)
+        cache.update_account(snapshot(1, balance=10000))
+        cache.finish_load(1, token, [snapshot(1, balance=0)])
+
+        assert cache.get(1) is None
+        assert cache.stats()["stale_fills"] == 1
+
+    def test_failed_load_is_not_cached(self):
+        """Тест загрузки, завершившейся ошибкой"""
+        cache = AccountCache(max_users=10, ttl=30)
+        token = cache.begin_load(1)
+        cache.finish_load(1, token, None)
+        assert cache.get(1) is None
+
+    def test_disabled_cache(self):
+        """Тест отключенного кеша"""
+        cache = AccountCache(max_users=0, ttl=30)
+        token = cache.begin_load(1)
+        cache.finish_load(1, token, [snapshot(1)])
+        assert cache.get(1) is None
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalar_one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+    def one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class FakeDatabase:
+    """Хранилище в памяти со случайными задержками на каждом запросе"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.balances = {}
+        self.transactions = set()
+
+    async def pause(self):
+        for _ in range(self.rng.randint(0, 3)):
+            await asyncio.sleep(0)
+
+
+class FakeSession:
+    """Минимальная замена AsyncSession для проверки порядка операций"""
+
+    def __init__(self, db):
+        self.db = db
+        self.tracked = []
+
+    async def execute(self, stmt):
+        await self.db.pause()
+        if stmt.is_update:
+            return self.credit(stmt.compile().params)
+        description = stmt.column_descriptions[0]
+        params = stmt.compile().params
+        if description["entity"] in (Payment, PaymentTransaction):
+            return FakeResult([])
+
+        rows = []
+        for account_id, (user_id, balance) in self.db.balances.items():
+            if (
+                user_id == params["user_id_1"]
+                and params.get("id_1", account_id) == account_id
+            ):
+                rows.append((account_id, user_id, balance, CREATED_AT))
+        await self.db.pause()
+        if description["expr"] is not Account:
+            # Выборка колонок (проекция)
+            return FakeResult(rows)
+
+        accounts = []
+        for account_id, user_id, balance, created_at in rows:
+            account = Account(id=account_id, user_id=user_id, balance=balance)
+            account.created_at = created_at
+            accounts.append(account)
+        self.tracked.extend(accounts)
+        return FakeResult(accounts)
+
+    def credit(self, params):
+        """UPDATE ... RETURNING баланса; изменение видно после commit"""
+        user_id, balance = self.db.balances[params["id_1"]]
+        if user_id != params["user_id_1"]:
+            return FakeResult([])
+        account = Account(
+            id=params["id_1"], user_id=user_id, balance=balance + params["balance_1"]
+        )
+        self.tracked.append(account)
+        return FakeResult([(account.id, user_id, account.balance, CREATED_AT)])
+
+    def add(self, obj):
+        if isinstance(obj, Payment):
+            self.db.transactions.add(obj.transaction_id)
+        elif not isinstance(obj, PaymentTransaction):
+            self.tracked.append(obj)
+
+    async def flush(self):
+        await self.db.pause()
+
+    async def commit(self):
+        await self.db.pause()
+        for account in self.tracked:
+            self.db.balances[account.id] = (account.user_id, account.balance)
+
+    async def refresh(self, obj):
+        await self.db.pause()
+        if isinstance(obj, Account):
+            obj.created_at = CREATED_AT
+
+
+@pytest.mark.unit
+class TestAccountCacheConsistency:
+    """Проверка согласованности кеша с платежами воркера"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    async def test_reads_never_older_than_last_payment(self, seed):
+        """Чтение не возвращает баланс старше последнего закоммиченного платежа"""
+        rng = random.Random(seed)
+        db = FakeDatabase(rng)
+        db.balances[1] = (1, 0)
+        account_cache.clear()
+
+        committed = {"balance": 0}
+        violations = []
+
+        async def writer():
+            for i in range(50):
+                await PaymentService.process_payment(
+                    FakeSession(db), f"tx-{seed}-{i}", 1, 1, 100
+                )
+                committed["balance"] += 100
+                await db.pause()
+
+        async def reader():
+            for _ in range(50):
+                floor = committed["balance"]
+                accounts = await AccountService.get_user_accounts(FakeSession(db), 1)
+                if accounts[0].balance < floor:
+                    violations.append((floor, accounts[0].balance))
+
+        await asyncio.gather(writer(), *(reader() for _ in range(5)))
+
+        assert violations == []
+        assert account_cache.stats()["hits"] > 0
+        account_cache.clear()
@@ -0,0 +1,182 @@
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app import checkpoints
+from app.archive import PaymentArchive, SegmentWriter, publish
+from app.checkpoints import CheckpointBuilder, day_start, last_closed_day
+from app.rows import PaymentRow
+
+NOW = datetime(2024, 3, 4, 0, 0, 30, tzinfo=timezone.utc)
+BOUNDARY = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def moment(day, hour):
+    return datetime(2024, 3, day, hour, tzinfo=timezone.utc)
+
+
+class FakeResult:
+    def __init__(self, rows, rowcount=0):
+        self._rows = rows
+        self.rowcount = rowcount
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+    def one(self):
+        return self._rows[0]
+
+
+class FakeDatabase:
+    """Платежи и таблицы срезов в памяти"""
+
+    def __init__(self, payments):
+        # (id, account_id, amount, created_at)
+        self.payments = payments
+        self.checkpoints = {}
+        self.built = None
+
+    def connect(self):
+        @asynccontextmanager
+        async def connection():
+            yield FakeConnection(self)
+
+        return connection()
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    async def execute(self, stmt, params=None):
+        db = self.db
+        if stmt is checkpoints.READ_STATE:
+            return FakeResult([(db.built, NOW)])
+        if stmt is checkpoints.FIRST_PAYMENT:
+            rows = sorted(db.payments)
+            return FakeResult([(rows[0][3],)] if rows else [])
+        if stmt is checkpoints.TRY_LOCK:
+            return FakeResult([(True,)])
+        if stmt is checkpoints.LOCK_STATE:
+            return FakeResult([(db.built,)])
+        if stmt is checkpoints.WRITE_STATE:
+            db.built = params["day"]
+            return FakeResult([])
+        if stmt is checkpoints.BUILD_DAY:
+            return self.build_day(params)
+        raise AssertionError(stmt)
+
+    def build_day(self, params):
+        totals = dict(zip(params["accounts"], params["totals"]))
+        for _, account_id, amount, created_at in self.db.payments:
+            if params["start"] <= created_at < params["end"]:
+                totals[account_id] = totals.get(account_id, 0) + amount
+        for account_id, total in totals.items():
+            previous = [
+                (day, balance)
+                for (account, day), balance in self.db.checkpoints.items()
+                if account == account_id and day < params["day"]
+            ]
+            balance = max(previous)[1] if previous else 0
+            self.db.checkpoints[(account_id, params["day"])] = balance + total
+        return FakeResult([], rowcount=len(totals))
+
+
+def archive_with(directory, rows):
+    writer = SegmentWriter(str(directory), "seg_202403", 2)
+    for payment_id, account_id, amount, created_at in rows:
+        writer.add(
+            PaymentRow(
+                payment_id, f"tx-{payment_id}", account_id, 1, amount, created_at
+            )
+        )
+    publish(str(directory), writer.close(), None, BOUNDARY)
+    return PaymentArchive(str(directory), cache_blocks=4)
+
+
+@pytest.mark.unit
+class TestBalanceCheckpoints:
+    """Unit тесты для дневных срезов балансов"""
+
+    def test_closed_day_waits_for_settle(self):
+        """Тест: день закрыт только через settle секунд после полуночи"""
+        assert day_start(date(2024, 3, 3)) == datetime(2024, 3, 3, tzinfo=timezone.utc)
+        assert last_closed_day(NOW, 10) == date(2024, 3, 3)
+        assert last_closed_day(NOW, 60) == date(2024, 3, 2)
+
+    def test_archive_daily_totals(self, tmp_path):
+        """Тест сумм архива по дням и счетам за период"""
+        archive = archive_with(
+            tmp_path,
+            [
+                (1, 10, 100, moment(1, 1)),
+                (2, 10, 50, moment(1, 2)),
+                (3, 20, 7, moment(1, 3)),
+                (4, 10, 1, datetime(2024, 2, 29, 23, tzinfo=timezone.utc)),
+            ],
+        )
+
+        assert archive.daily_totals(moment(1, 0), BOUNDARY) == {
+            date(2024, 3, 1): {10: 150, 20: 7}
+        }
+        assert archive.daily_totals(moment(1, 2), moment(1, 3)) == {
+            date(2024, 3, 1): {10: 50}
+        }
+        assert archive.earliest() == datetime(2024, 2, 29, 23, tzinfo=timezone.utc)
+        assert PaymentArchive(str(tmp_path / "empty"), 4).earliest() is None
+
+    async def test_build_from_archive_and_payments(self, tmp_path):
+        """Тест срезов по дням: архив до границы, payments после нее"""
+        archive = archive_with(
+            tmp_path,
+            [(1, 10, 100, moment(1, 1)), (2, 20, 30, moment(1, 2))],
+        )
+        db = FakeDatabase(
+            [
+                # Строка старше границы еще не удалена архивацией
+                (1, 10, 100, moment(1, 1)),
+                (3, 10, 5, moment(1, 13)),
+                (4, 10, 40, moment(3, 9)),
+                (5, 20, 1, moment(3, 23)),
+                # День еще не закрыт
+                (6, 10, 1000, NOW),
+            ]
+        )
+        builder = CheckpointBuilder(settle=10, chunk_days=2, archive=archive)
+        progress = []
+
+        built = await builder.build(
+            db, progress=lambda day, rows: progress.append((day, rows))
+        )
+
+        assert built == {"days": 3, "checkpoints": 4, "day": date(2024, 3, 3)}
+        assert progress == [
+            (date(2024, 3, 1), 2),
+            (date(2024, 3, 2), 0),
+            (date(2024, 3, 3), 2),
+        ]
+        assert db.checkpoints == {
+            (10, date(2024, 3, 1)): 105,
+            (20, date(2024, 3, 1)): 30,
+            (10, date(2024, 3, 3)): 145,
+            (20, date(2024, 3, 3)): 31,
+        }
+        assert db.built == date(2024, 3, 3)
+
+        # Повторный запуск продолжает с первого непостроенного дня
+        assert await builder.build(db) == {"days": 0, "checkpoints": 0, "day": None}
+
+    async def test_build_without_payments(self, tmp_path):
+        """Тест: без платежей срезы не строятся"""
+        builder = CheckpointBuilder(
+            settle=10, archive=PaymentArchive(str(tmp_path), cache_blocks=4)
+        )
+        db = FakeDatabase([])
+
+        assert await builder.build(db) == {"days": 0, "checkpoints": 0, "day": None}
+        assert db.built is None
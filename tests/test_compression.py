@@ -0,0 +1,90 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+from sanic.response import HTTPResponse
+
+from app.compression import GzipCompressor, accepts_gzip
+
+BODY = b'{"items": [' + b",".join(b'{"id": %d}' % i for i in range(500)) + b"]}"
+
+
+def make_request(accept_encoding="gzip, deflate", route_ctx=None):
+    route = SimpleNamespace(ctx=route_ctx or SimpleNamespace())
+    return SimpleNamespace(headers={"accept-encoding": accept_encoding}, route=route)
+
+
+def make_response(body=BODY, content_type="application/json"):
+    return HTTPResponse(body, content_type=content_type)
+
+
+def make_compressor(**kwargs):
+    options = {"min_size": 100, "thread_threshold": 10**9, "level": 6, "threads": 1}
+    options.update(kwargs)
+    return GzipCompressor(**options)
+
+
+@pytest.mark.unit
+class TestGzipCompression:
+    """Unit тесты для сжатия ответов"""
+
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            ("gzip", True),
+            ("deflate, gzip;q=0.5", True),
+            ("gzip;q=0", False),
+            ("*", True),
+            ("br, deflate", False),
+            (None, False),
+        ],
+    )
+    def test_accepts_gzip(self, header, expected):
+        """Тест разбора Accept-Encoding"""
+        assert accepts_gzip(header) is expected
+
+    async def test_compresses_large_json(self):
+        """Тест сжатия большого JSON"""
+        compressor = make_compressor()
+        response = make_response()
+
+        await compressor.compress(make_request(), response)
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert gzip.decompress(response.body) == BODY
+        stats = compressor.stats()
+        assert stats["compressed"] == 1
+        assert stats["offloaded"] == 0
+        assert 0 < stats["ratio"] < 1
+
+    async def test_offloads_to_thread_pool(self):
+        """Тест сжатия больших тел в пуле потоков"""
+        compressor = make_compressor(thread_threshold=1000)
+        response = make_response()
+
+        await compressor.compress(make_request(), response)
+
+        assert gzip.decompress(response.body) == BODY
+        assert compressor.stats()["offloaded"] == 1
+
+    @pytest.mark.parametrize(
+        "request_kwargs, response_kwargs",
+        [
+            ({}, {"body": b"{}"}),
+            ({"accept_encoding": "identity"}, {}),
+            ({"route_ctx": SimpleNamespace(gzip=False)}, {}),
+            ({}, {"content_type": "image/png"}),
+        ],
+    )
+    async def test_skips(self, request_kwargs, response_kwargs):
+        """Тест пропуска маленьких, несжимаемых и отключенных ответов"""
+        compressor = make_compressor()
+        response = make_response(**response_kwargs)
+        body = response.body
+
+        await compressor.compress(make_request(**request_kwargs), response)
+
+        assert response.body == body
+        assert "content-encoding" not in response.headers
+        assert compressor.stats()["compressed"] == 0
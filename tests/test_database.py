@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+
+from app.config import Config
+from app.database import LANES, all_engines, is_overloaded, lane_engines, lane_options
+from app.metrics import POOL_LANES
+
+
+class CanceledError(Exception):
+    sqlstate = "57014"
+
+
+class UniqueViolation(Exception):
+    sqlstate = "23505"
+
+
+@pytest.mark.unit
+class TestDatabaseLanes:
+    """Unit тесты для полос пулов соединений"""
+
+    def test_lane_options_from_config(self, monkeypatch):
+        """Тест размера пула, ожидания и statement_timeout полосы"""
+        monkeypatch.setattr(Config, "DB_ADMIN_POOL_SIZE", 1)
+        monkeypatch.setattr(Config, "DB_ADMIN_POOL_TIMEOUT", 30.0)
+        monkeypatch.setattr(Config, "DB_ADMIN_STATEMENT_TIMEOUT_MS", 120000)
+
+        options = lane_options("admin")
+
+        assert options["pool_size"] == 1
+        assert options["max_overflow"] == Config.DB_ADMIN_MAX_OVERFLOW
+        assert options["pool_timeout"] == 30.0
+        assert options["connect_args"]["server_settings"] == {
+            "statement_timeout": "120000",
+            "application_name": "paysystem-admin",
+        }
+
+    def test_lanes_have_separate_pools(self):
+        """Тест: у каждой полосы свой пул, метрики знают все полосы"""
+        pools = {lane: lane_engines[lane].sync_engine.pool for lane in LANES}
+
+        assert len({id(pool) for pool in pools.values()}) == len(LANES)
+        assert pools["webhook"].size() == Config.DB_WEBHOOK_POOL_SIZE
+        assert pools["webhook"].timeout() == Config.DB_WEBHOOK_POOL_TIMEOUT
+        assert len(all_engines()) == len(LANES) + 1
+        assert POOL_LANES == ("default", *LANES)
+
+    def test_overload_errors(self):
+        """Тест: ожидание пула и statement_timeout — перегрузка, прочее нет"""
+        assert is_overloaded(PoolTimeoutError("QueuePool limit reached"))
+        assert is_overloaded(DBAPIError("SELECT 1", {}, CanceledError()))
+        assert not is_overloaded(DBAPIError("INSERT", {}, UniqueViolation()))
+        assert not is_overloaded(ValueError("Account belongs to another user"))
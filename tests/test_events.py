@@ -0,0 +1,157 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app.events import EventHub, PgNotifyBridge, payment_event
+from app.models import Account, Payment
+
+
+@pytest.mark.unit
+class TestEventHub:
+    """Unit тесты для шины событий"""
+
+    async def test_dispatch_to_user_subscribers_only(self):
+        """Тест доставки событий только подписчикам пользователя"""
+        hub = EventHub(queue_size=10)
+        first = hub.subscribe(1)
+        other = hub.subscribe(2)
+
+        hub.publish(1, {"type": "payment"})
+
+        assert await first.get(timeout=0.1) == {"type": "payment"}
+        assert await other.get(timeout=0.01) is None
+        assert hub.stats()["delivered"] == 1
+
+    async def test_slow_consumer_is_evicted(self):
+        """Тест вытеснения медленного подписчика"""
+        hub = EventHub(queue_size=2)
+        slow = hub.subscribe(1)
+
+        for i in range(3):
+            hub.publish(1, {"type": "payment", "n": i})
+
+        assert slow.evicted
+        assert await slow.get(timeout=0.1) is None
+        assert hub.stats() == {
+            "subscribers": 0,
+            "published": 3,
+            "delivered": 2,
+            "evictions": 1,
+        }
+
+    async def test_unsubscribe(self):
+        """Тест отписки"""
+        hub = EventHub(queue_size=10)
+        subscription = hub.subscribe(1)
+        hub.unsubscribe(subscription)
+        hub.unsubscribe(subscription)
+
+        hub.publish(1, {"type": "payment"})
+        assert hub.stats()["subscribers"] == 0
+        assert hub.stats()["delivered"] == 0
+
+    async def test_bridge_skips_own_notifications(self):
+        """Тест пропуска собственных уведомлений воркера"""
+        hub = EventHub(queue_size=10)
+        bridge = PgNotifyBridge(hub, "postgresql+asyncpg://u:p@db/paysystem", "ch")
+        subscription = hub.subscribe(1)
+
+        own = {"origin": bridge.origin, "user_id": 1, "event": {"n": 1}}
+        foreign = {"origin": "other-worker", "user_id": 1, "event": {"n": 2}}
+        bridge._on_notification(None, 0, "ch", json.dumps(own))
+        bridge._on_notification(None, 0, "ch", json.dumps(foreign))
+
+        assert await subscription.get(timeout=0.1) == {"n": 2}
+        assert await subscription.get(timeout=0.01) is None
+
+    def test_payment_event(self):
+        """Тест формирования события о платеже"""
+        created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        payment = Payment(
+            id=5,
+            transaction_id="tx",
+            account_id=1,
+            user_id=1,
+            amount=1000,
+            created_at=created_at,
+        )
+        account = Account(id=1, user_id=1, balance=11000)
+
+        event = payment_event(payment, account)
+
+        assert event["type"] == "payment"
+        assert event["payment"]["amount"] == "10.00"
+        assert event["account"] == {"id": 1, "balance": "110.00"}
+
+
+class FakeConnection:
+    """Соединение asyncpg с LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.on_terminate = None
+
+    async def add_listener(self, channel, callback):
+        pass
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def execute(self, query, channel, payload):
+        if self.closed:
+            raise ConnectionError("connection is closed")
+        self.sent.append(json.loads(payload)["event"])
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.terminate()
+
+    def terminate(self):
+        self.closed = True
+        self.on_terminate(self)
+
+
+@pytest.mark.unit
+class TestPgNotifyBridge:
+    """Unit тесты для переподключения моста событий"""
+
+    async def test_reconnect_after_connection_loss(self, monkeypatch):
+        """Тест: после разрыва соединение открывается заново с задержкой"""
+        connections, failures = [], []
+
+        async def connect(dsn):
+            if failures:
+                raise failures.pop()
+            connections.append(FakeConnection())
+            return connections[-1]
+
+        monkeypatch.setattr("asyncpg.connect", connect)
+        hub = EventHub(queue_size=10)
+        bridge = PgNotifyBridge(
+            hub, "postgresql+asyncpg://u:p@db/paysystem", "ch", reconnect_delay=0.01
+        )
+        await bridge.start()
+        subscription = hub.subscribe(1)
+
+        failures.append(ConnectionError("refused"))
+        connections[0].terminate()
+        hub.publish(1, {"n": 1})
+        assert bridge.stats()["connected"] == 0
+
+        await asyncio.wait_for(bridge._reconnector, 1)
+        await asyncio.sleep(0.01)
+
+        assert len(connections) == 2
+        assert connections[1].sent == [{"n": 1}]
+        assert bridge.stats() == {"connected": 1, "dropped": 0, "reconnects": 1}
+        # Уведомления за время разрыва потеряны: подписчик перечитывает состояние
+        assert subscription.evicted
+
+        await bridge.stop()
+        assert hub.bridge is None
+        assert bridge._reconnector.done()
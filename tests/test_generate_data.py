@@ -0,0 +1,59 @@
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.archive import SegmentWriter, publish
+from app.auth import AuthService
+from app.config import Config
+
+# Утилиты импортируют друг друга как скрипты из каталога utils
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "utils"))
+
+import generate_data  # noqa: E402
+
+BOUNDARY = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.unit
+class TestGenerateData:
+    """Unit тесты для генератора тестовых данных"""
+
+    def test_password_hash_depends_on_seed(self):
+        """Тест: один seed — один хеш пароля, и пароль проверяется"""
+        args = SimpleNamespace(
+            seed=1,
+            end=BOUNDARY,
+            days=10,
+            password="userpassword",
+            users=2,
+            accounts_per_user=1.5,
+            alpha=1.1,
+            hot_accounts=1,
+        )
+
+        first = generate_data.Dataset(args, 1, 1, 1).password_hash
+        assert generate_data.Dataset(args, 1, 1, 1).password_hash == first
+        assert AuthService.verify_password("userpassword", first)
+        assert generate_data.seeded_salt(random.Random(2)) != first[:29].encode()
+
+    def test_refuses_period_before_archive_boundary(self, tmp_path, monkeypatch):
+        """Тест: платежи старше границы архива не генерируются"""
+        monkeypatch.setattr(Config, "ARCHIVE_DIR", str(tmp_path))
+        generate_data.check_archive_boundary(datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+        publish(
+            str(tmp_path),
+            SegmentWriter(str(tmp_path), "seg", 4).close(),
+            None,
+            BOUNDARY,
+        )
+
+        generate_data.check_archive_boundary(BOUNDARY)
+        with pytest.raises(SystemExit, match="archive boundary"):
+            generate_data.check_archive_boundary(
+                datetime(2024, 5, 31, tzinfo=timezone.utc)
+            )
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Утилиты импортируют друг друга как скрипты из каталога utils
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "utils"))
+
+import hot_account  # noqa: E402
+
+BUSY = ("503 Service Unavailable", "Retry-After: 0\r\n")
+
+
+async def start_stub(respond):
+    """HTTP-сервер вебхуков: respond(тело) -> (статус, заголовки)"""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in request.decode().split("\r\n"):
+                    name, _, value = line.partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length))
+                status, headers = respond(body)
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n{headers}"
+                    f"Content-Length: 2\r\n\r\n{{}}".encode()
+                )
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+def make_args(url, **overrides):
+    args = dict(
+        url=url,
+        payments=30,
+        accounts=2,
+        account_offset=900000,
+        user_id=1,
+        duplicate_ratio=0.3,
+        concurrency=5,
+        max_retries=3,
+    )
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+@pytest.mark.unit
+class TestHotAccountClient:
+    """Unit тесты для клиента проверки «горячих» счетов"""
+
+    async def test_retries_after_503(self):
+        """Тест: вебхук после 503 повторяется, прогон проходит проверку"""
+        attempts, accepted = Counter(), set()
+
+        def busy_then_accept(body):
+            tx = body["transaction_id"]
+            attempts[tx] += 1
+            if attempts[tx] == 1:
+                return BUSY
+            if tx in accepted:
+                return "409 Conflict", ""
+            accepted.add(tx)
+            return "200 OK", ""
+
+        server, url = await start_stub(busy_then_accept)
+        args = make_args(url)
+        _, payments, stream = hot_account.make_webhooks(args, random.Random(1))
+        try:
+            _, statuses, ok, retries, _ = await hot_account.fire(args, stream)
+        finally:
+            server.close()
+
+        assert retries == len(attempts)
+        assert set(statuses) <= {200, 409}
+        assert sum(statuses.values()) == len(stream)
+        assert hot_account.check_responses(payments, statuses, ok) == []
+
+    async def test_retries_are_limited(self):
+        """Тест: после --max-retries ответ 503 считается неожиданным"""
+        server, url = await start_stub(lambda body: BUSY)
+        args = make_args(url, payments=2, duplicate_ratio=0, max_retries=2)
+        _, payments, stream = hot_account.make_webhooks(args, random.Random(1))
+        try:
+            _, statuses, ok, retries, _ = await hot_account.fire(args, stream)
+        finally:
+            server.close()
+
+        assert retries == 4
+        assert statuses == {503: 2}
+        problems = hot_account.check_responses(payments, statuses, ok)
+        assert problems[0] == "unexpected statuses: {503: 2}"
@@ -0,0 +1,106 @@
+import json
+import logging
+import queue
+import random
+import sys
+
+import pytest
+
+from app.logs import (
+    ContextFilter,
+    DroppingQueueHandler,
+    JsonFormatter,
+    RateLimitFilter,
+    SamplingFilter,
+    request_id_var,
+)
+
+
+def make_record(msg="message %s", args=("arg",), level=logging.INFO, **extra):
+    record = logging.LogRecord("paysystem", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit
+class TestLogging:
+    """Unit тесты для структурированного логирования"""
+
+    def test_json_formatter_includes_context_and_extra(self):
+        """Тест JSON-записи с request_id и дополнительными полями"""
+        token = request_id_var.set("req-1")
+        try:
+            record = make_record(transaction_id="tx-1")
+            ContextFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+
+        data = json.loads(JsonFormatter().format(record))
+
+        assert data["message"] == "message arg"
+        assert data["level"] == "INFO"
+        assert data["request_id"] == "req-1"
+        assert data["transaction_id"] == "tx-1"
+
+    def test_json_formatter_includes_exception(self):
+        """Тест записи traceback исключения"""
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            record = logging.LogRecord(
+                "paysystem", logging.ERROR, __file__, 1, "failed", None, None
+            )
+            record.exc_info = sys.exc_info()
+
+        data = json.loads(JsonFormatter().format(record))
+
+        assert "RuntimeError: boom" in data["exception"]
+
+    def test_sampling_filter(self):
+        """Тест сэмплирования записей с sample_rate"""
+        sampling = SamplingFilter(random.Random(42))
+
+        passed = sum(
+            sampling.filter(make_record(sample_rate=0.1)) for _ in range(10000)
+        )
+
+        assert 800 < passed < 1200
+        assert sampling.filter(make_record())
+
+    def test_rate_limit_filter(self):
+        """Тест ограничения повторяющихся ошибок и счетчика подавленных"""
+        clock = FakeClock()
+        limiter = RateLimitFilter(interval=60, burst=2, clock=clock)
+
+        results = [
+            limiter.filter(make_record("db error", (), logging.ERROR)) for _ in range(5)
+        ]
+        assert results == [True, True, False, False, False]
+        assert limiter.filter(make_record("other error", (), logging.ERROR))
+        assert limiter.filter(make_record("db error", (), logging.WARNING))
+
+        clock.now = 61
+        record = make_record("db error", (), logging.ERROR)
+        assert limiter.filter(record)
+        assert record.suppressed == 3
+
+    def test_full_queue_drops_records(self):
+        """Тест отбрасывания записей при переполненной очереди"""
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+
+        for _ in range(5):
+            handler.handle(make_record())
+
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
+        queued = handler.queue.get_nowait()
+        assert queued.getMessage() == "message arg"
+        assert queued.args is None
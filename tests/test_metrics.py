@@ -0,0 +1,206 @@
+import os
+
+import pytest
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import Metrics, collect, read_metrics_file, render, sample_key
+
+ROUTES = [("paysystem.users.get_me", "GET", "/api/users/me")]
+ROUTE_LABELS = {"route": "/api/users/me", "method": "GET"}
+
+
+def bucket(le):
+    return sample_key(
+        "paysystem_http_request_duration_seconds_bucket", **ROUTE_LABELS, le=le
+    )
+
+
+@pytest.mark.unit
+class TestMetrics:
+    """Unit тесты для метрик воркеров"""
+
+    def test_request_counter_and_histogram(self):
+        """Тест счетчика по классу статуса и кумулятивных корзин"""
+        metrics = Metrics(ROUTES)
+
+        metrics.observe_request("paysystem.users.get_me", "GET", 200, 0.02)
+        metrics.observe_request("paysystem.users.get_me", "GET", 404, 3.0)
+        metrics.observe_request(None, "GET", 404, 0.001)
+
+        values = metrics.values()
+        requests = "paysystem_http_requests_total"
+        assert values[sample_key(requests, **ROUTE_LABELS, status="2xx")] == 1
+        assert values[sample_key(requests, **ROUTE_LABELS, status="4xx")] == 1
+        assert values[bucket("0.01")] == 0
+        assert values[bucket("0.025")] == 1
+        assert values[bucket("5.0")] == 2
+        assert values[bucket("+Inf")] == 2
+        assert values[
+            sample_key("paysystem_http_request_duration_seconds_sum", **ROUTE_LABELS)
+        ] == pytest.approx(3.02)
+        unmatched = sample_key(requests, route="<unmatched>", method="*", status="4xx")
+        assert values[unmatched] == 1
+
+    def test_collect_sums_workers(self, tmp_path):
+        """Тест суммирования файлов воркеров и отбрасывания gauge мертвых воркеров"""
+        directory = str(tmp_path)
+        metrics = Metrics()
+        metrics.start(directory, ROUTES)
+        metrics.webhook_outcome("success")
+        metrics.set("paysystem_event_loop_lag_seconds", 0.5)
+        # Файл завершившегося воркера (pid заведомо не существует)
+        os.rename(metrics.path, os.path.join(directory, "worker-999999999.bin"))
+
+        metrics.start(directory, ROUTES)
+        metrics.webhook_outcome("success")
+        metrics.webhook_outcome("duplicate")
+        metrics.set("paysystem_event_loop_lag_seconds", 0.1)
+
+        assert (
+            read_metrics_file(metrics.path)["paysystem_event_loop_lag_seconds"] == 0.1
+        )
+        totals = collect(directory)
+        outcome = "paysystem_webhook_outcomes_total"
+        assert totals[sample_key(outcome, outcome="success")] == 2
+        assert totals[sample_key(outcome, outcome="duplicate")] == 1
+        assert totals["paysystem_event_loop_lag_seconds"] == 0.1
+
+    def test_render_prometheus_text(self):
+        """Тест текстового формата Prometheus"""
+        metrics = Metrics(ROUTES)
+        metrics.webhook_outcome("bad_signature")
+
+        text = render(metrics.values())
+
+        assert "# TYPE paysystem_webhook_outcomes_total counter" in text
+        assert "# TYPE paysystem_http_request_duration_seconds histogram" in text
+        assert 'paysystem_webhook_outcomes_total{outcome="bad_signature"} 1\n' in text
+        assert text.count("# TYPE paysystem_http_requests_total") == 1
+
+    def test_pool_sample_by_lane(self):
+        """Тест снимка пулов соединений с меткой полосы"""
+        metrics = Metrics(ROUTES)
+        pool = QueuePool(lambda: None, pool_size=3, max_overflow=1)
+
+        metrics.sample(
+            {"webhook": pool, "admin": object()},
+            {
+                "size": 0,
+                "hits": 0,
+                "misses": 0,
+                "evictions": 0,
+                "expirations": 0,
+                "stale_fills": 0,
+            },
+            None,
+            {"subscribers": 0, "published": 0, "delivered": 0, "evictions": 0},
+        )
+
+        values = metrics.values()
+        pools = "paysystem_db_pool_connections"
+        assert values[sample_key(pools, lane="webhook", state="size")] == 3
+        assert values[sample_key(pools, lane="admin", state="size")] == 0
+        assert sample_key(pools, lane="default", state="checked_out") in values
+
+    def test_webhook_admission(self):
+        """Тест метрик отказов, времени ожидания и состояния очереди"""
+        metrics = Metrics(ROUTES)
+
+        metrics.webhook_rejected("queue_full")
+        metrics.observe_webhook_wait(0.02)
+        metrics.observe_webhook_wait(0.0)
+        metrics.sample(
+            {},
+            {
+                "size": 0,
+                "hits": 0,
+                "misses": 0,
+                "evictions": 0,
+                "expirations": 0,
+                "stale_fills": 0,
+            },
+            None,
+            {"subscribers": 0, "published": 0, "delivered": 0, "evictions": 0},
+            {"inflight": 4, "queued": 2, "limit": 10},
+        )
+
+        values = metrics.values()
+        rejections = "paysystem_webhook_admission_rejections_total"
+        assert values[sample_key(rejections, reason="queue_full")] == 1
+        assert values[sample_key(rejections, reason="queue_timeout")] == 0
+        wait = "paysystem_webhook_queue_wait_seconds"
+        assert values[sample_key(f"{wait}_bucket", le="0.005")] == 1
+        assert values[sample_key(f"{wait}_bucket", le="+Inf")] == 2
+        assert values[f"{wait}_count"] == 2
+        assert values["paysystem_webhook_queued"] == 2
+        assert values["paysystem_webhook_concurrency_limit"] == 10
+
+    def test_event_bridge_sample(self):
+        """Тест метрик моста событий между воркерами"""
+        metrics = Metrics(ROUTES)
+
+        metrics.sample(
+            {},
+            {
+                "size": 0,
+                "hits": 0,
+                "misses": 0,
+                "evictions": 0,
+                "expirations": 0,
+                "stale_fills": 0,
+            },
+            None,
+            {"subscribers": 0, "published": 0, "delivered": 0, "evictions": 0},
+            bridge_stats={"connected": 1, "dropped": 3, "reconnects": 2},
+        )
+
+        values = metrics.values()
+        assert values["paysystem_event_bridge_connected"] == 1
+        assert values["paysystem_event_bridge_dropped_total"] == 3
+        assert values["paysystem_event_bridge_reconnects_total"] == 2
+
+    def test_gzip_sample(self):
+        """Тест метрик сжатия: байты, ответы из пула потоков и время CPU"""
+        metrics = Metrics(ROUTES)
+
+        metrics.sample(
+            {},
+            {
+                "size": 0,
+                "hits": 0,
+                "misses": 0,
+                "evictions": 0,
+                "expirations": 0,
+                "stale_fills": 0,
+            },
+            {
+                "compressed": 5,
+                "offloaded": 2,
+                "bytes_in": 1000,
+                "bytes_out": 200,
+                "ratio": 0.2,
+                "cpu_seconds": 0.25,
+            },
+            {"subscribers": 0, "published": 0, "delivered": 0, "evictions": 0},
+        )
+
+        values = metrics.values()
+        assert values["paysystem_gzip_responses_total"] == 5
+        assert values[sample_key("paysystem_gzip_bytes_total", direction="out")] == 200
+        assert values["paysystem_gzip_offloaded_total"] == 2
+        assert values["paysystem_gzip_cpu_seconds_total"] == 0.25
+
+    def test_loop_block_and_reconciliation_counters(self):
+        """Тест счетчиков блокировок event loop и сверки балансов"""
+        metrics = Metrics(ROUTES)
+
+        metrics.loop_blocked(0.5)
+        metrics.reconciled(payments=10, drifts=2, repaired=1)
+
+        values = metrics.values()
+        assert values["paysystem_event_loop_blocks_total"] == 1
+        assert values["paysystem_event_loop_blocked_seconds_total"] == 0.5
+        assert values["paysystem_reconciled_payments_total"] == 10
+        drifts = "paysystem_balance_drifts_total"
+        assert values[sample_key(drifts, outcome="detected")] == 2
+        assert values[sample_key(drifts, outcome="repaired")] == 1
@@ -1,6 +1,5 @@
-from decimal import Decimal
-
 import pytest
+from sqlalchemy import BigInteger
 
 from app.models import User, Admin, Account, Payment
 
@@ -35,10 +34,10 @@ class TestModels:
         """Тест создания модели счета"""
         account = Account(
             user_id=1,
-            balance=Decimal("1000.50"),
+            balance=100050,
         )
         assert account.user_id == 1
-        assert account.balance == Decimal("1000.50")
+        assert account.balance == 100050
 
     def test_payment_model_creation(self):
         """Тест создания модели платежа"""
@@ -46,22 +45,17 @@ class TestModels:
             transaction_id="test-transaction-123",
             user_id=1,
             account_id=1,
-            amount=Decimal("100.00"),
+            amount=10000,
         )
         assert payment.transaction_id == "test-transaction-123"
         assert payment.user_id == 1
         assert payment.account_id == 1
-        assert payment.amount == Decimal("100.00")
+        assert payment.amount == 10000
 
-    def test_account_balance_precision(self):
-        """Тест точности баланса счета"""
-        # Проверяем что Decimal правильно обрабатывает десятичные дроби
-        account = Account(
-            user_id=1,
-            balance=Decimal("123.456789"),
-        )
-        assert account.balance == Decimal("123.456789")
-        assert str(account.balance) == "123.456789"
+    def test_money_columns_are_bigint(self):
+        """Тест хранения сумм целыми минимальными единицами (BIGINT)"""
+        assert isinstance(Account.__table__.c.balance.type, BigInteger)
+        assert isinstance(Payment.__table__.c.amount.type, BigInteger)
 
     def test_payment_amount_precision(self):
         """Тест точности суммы платежа"""
@@ -69,9 +63,9 @@ class TestModels:
             transaction_id="test-precision",
             user_id=1,
             account_id=1,
-            amount=Decimal("0.01"),
+            amount=1,
         )
-        assert payment.amount == Decimal("0.01")
+        assert payment.amount == 1
 
     def test_user_string_representation(self):
         """Тест строкового представления пользователя"""
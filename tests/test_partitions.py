@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.partitions import (
+    add_months,
+    create_partition_sql,
+    detach_partitions,
+    ensure_partitions,
+    month_start,
+    partition_month,
+)
+
+NOW = datetime(2024, 12, 15, 10, 30, tzinfo=timezone.utc)
+
+
+class FakeConnection:
+    """Соединение asyncpg со списком секций в памяти"""
+
+    def __init__(self, partitions, pending=()):
+        self.partitions = partitions
+        self.pending = set(pending)
+        self.statements = []
+
+    async def fetch(self, query):
+        return [(name, name in self.pending) for name in sorted(self.partitions)]
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+
+@pytest.mark.unit
+class TestPartitions:
+    """Unit тесты для месячных секций payments"""
+
+    def test_month_arithmetic(self):
+        """Тест границ месяцев и перехода через год"""
+        assert month_start(NOW) == datetime(2024, 12, 1, tzinfo=timezone.utc)
+        assert add_months(month_start(NOW), 1) == datetime(
+            2025, 1, 1, tzinfo=timezone.utc
+        )
+        assert add_months(month_start(NOW), -12) == datetime(
+            2023, 12, 1, tzinfo=timezone.utc
+        )
+
+    def test_partition_sql_and_name(self):
+        """Тест DDL секции и разбора имени"""
+        sql = create_partition_sql(month_start(NOW))
+        assert "payments_2024_12 PARTITION OF payments" in sql
+        assert "FROM ('2024-12-01T00:00:00+00:00') TO ('2025-01-01" in sql
+        assert partition_month("payments_2024_12") == month_start(NOW)
+        assert partition_month("payment_transactions") is None
+
+    async def test_ensure_creates_missing_months(self):
+        """Тест создания только недостающих секций вперед"""
+        conn = FakeConnection({"payments_2024_12", "payments_2025_01"})
+
+        created = await ensure_partitions(conn, NOW, ahead=3)
+
+        assert created == ["payments_2025_02", "payments_2025_03"]
+        assert len(conn.statements) == 2
+
+    async def test_detach_old_partitions(self):
+        """Тест отсоединения старых секций и завершения прерванного"""
+        conn = FakeConnection(
+            {"payments_2023_10", "payments_2023_11", "payments_2023_12"},
+            pending={"payments_2023_10"},
+        )
+
+        detached = await detach_partitions(conn, NOW, retain=12)
+
+        assert detached == ["payments_2023_10", "payments_2023_11"]
+        assert conn.statements == [
+            "ALTER TABLE payments DETACH PARTITION payments_2023_10 FINALIZE",
+            "ALTER TABLE payments DETACH PARTITION payments_2023_11 CONCURRENTLY",
+        ]
@@ -0,0 +1,103 @@
+import asyncio
+import pstats
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.auth import AuthService
+from app.profiling import WAITING, Profile, RequestProfiler
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.mark.unit
+class TestProfiling:
+    """Unit тесты для профилирования запросов"""
+
+    async def test_should_profile(self, monkeypatch):
+        """Тест запуска профилирования по токену администратора и выборке"""
+        profiler = RequestProfiler(interval=0.001, keep=5)
+        admins = {1}
+
+        @asynccontextmanager
+        async def admin_session():
+            yield None
+
+        async def get_current_user(session, user_id, role):
+            return SimpleNamespace(id=user_id) if user_id in admins else None
+
+        monkeypatch.setattr("app.database.admin_session", admin_session)
+        monkeypatch.setattr(AuthService, "get_current_user", get_current_user)
+
+        def request(token=None):
+            headers = {"x-profile": token} if token else {}
+            return SimpleNamespace(headers=headers)
+
+        admin_token = AuthService.create_token(1, "admin")
+        assert await profiler.should_profile(request(admin_token))
+        # Токен подписан, но администратора в базе нет
+        deleted = AuthService.create_token(2, "admin")
+        assert not await profiler.should_profile(request(deleted))
+        user_token = AuthService.create_token(1, "user")
+        assert not await profiler.should_profile(request(user_token))
+        assert not await profiler.should_profile(request("garbage"))
+        assert not await profiler.should_profile(request())
+        profiler.sample_rate = 1.0
+        assert await profiler.should_profile(request())
+
+    async def test_profiles_request_task(self):
+        """Тест сэмплов выполнения и ожидания, SQL и кольцевого буфера"""
+        profiler = RequestProfiler(interval=0.001, keep=2)
+        engine = create_engine("sqlite://")
+
+        profile = profiler.begin("GET", "/slow", [engine])
+        busy(0.05)
+        await asyncio.sleep(0.03)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        profiler.end(profile, "paysystem.slow", 200)
+
+        names = {frame[2] for stack in profile.samples for frame in stack}
+        assert "busy" in names
+        assert WAITING[2] in names
+        assert [item["statement"] for item in profile.sql] == ["SELECT 1"]
+        assert profile.summary()["status"] == 200
+        assert profiler.get(profile.id) is profile
+
+        # После завершения обработчики SQL сняты
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 2"))
+        assert len(profile.sql) == 1
+
+        for _ in range(2):
+            profiler.end(profiler.begin("GET", "/", []), None, 200)
+        assert profiler.get(profile.id) is None
+
+    def test_export_formats(self, tmp_path):
+        """Тест выгрузки в collapsed и pstats"""
+        profile = Profile(1, "GET", "/", interval=0.01)
+        handler = ("app.py", 10, "handler")
+        query = ("db.py", 5, "query")
+        profile.samples[(handler, query)] = 3
+        profile.samples[(handler,)] = 1
+
+        assert profile.collapsed().splitlines() == [
+            "handler (app.py:10);query (db.py:5) 3",
+            "handler (app.py:10) 1",
+        ]
+
+        path = tmp_path / "profile.pstats"
+        path.write_bytes(profile.pstats())
+        stats = pstats.Stats(str(path)).stats
+        cc, nc, tt, ct, callers = stats[handler]
+        assert (nc, tt, ct) == (4, pytest.approx(0.01), pytest.approx(0.04))
+        cc, nc, tt, ct, callers = stats[query]
+        assert tt == pytest.approx(0.03)
+        assert handler in callers
@@ -0,0 +1,302 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config import Config
+from app.models import (
+    Account,
+    BalanceCheckpoint,
+    Payment,
+    PaymentTransaction,
+    User,
+)
+from app.partitions import add_months, month_start, partition_name
+from app.renderers import render_many
+from app.schemas import UserCreate, UserUpdate, UserWithAccountsResponse
+from app.services import AccountService, PaymentService, UserService
+
+pytestmark = pytest.mark.plans
+
+USER_ID = 900001
+ACCOUNT_ID = 900001
+
+
+@pytest.fixture
+async def session():
+    """Сессия во внешней транзакции, которая откатывается после теста.
+
+    Схема должна быть создана миграциями; без PostgreSQL из DATABASE_URL
+    тест пропускается.
+    """
+    engine = create_async_engine(Config.DATABASE_URL, poolclass=NullPool)
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"PostgreSQL is not available: {e}")
+
+    transaction = await conn.begin()
+    # На маленьких таблицах планировщик выбирает Seq Scan даже при наличии
+    # индекса; с выключенным seqscan Seq Scan остается только без индекса
+    await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    await conn.execute(
+        insert(User).values(
+            id=USER_ID, email="plans@example.com", full_name="Plans", password_hash="-"
+        )
+    )
+    await conn.execute(
+        insert(Account).values(id=ACCOUNT_ID, user_id=USER_ID, balance=100)
+    )
+    await conn.execute(
+        insert(Payment).values(
+            transaction_id="plans-1",
+            account_id=ACCOUNT_ID,
+            user_id=USER_ID,
+            amount=100,
+        )
+    )
+    await conn.execute(
+        insert(PaymentTransaction).from_select(
+            ["transaction_id", "payment_id", "created_at"],
+            select(Payment.transaction_id, Payment.id, Payment.created_at).where(
+                Payment.transaction_id == "plans-1"
+            ),
+        )
+    )
+    session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        await session.close()
+        await transaction.rollback()
+        await conn.close()
+        await engine.dispose()
+
+
+async def captured_plans(session, call) -> list:
+    """Планы всех запросов, выполненных вызовом сервиса"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, many):
+        keyword = statement.split(None, 1)[0].upper()
+        if not many and keyword not in ("SAVEPOINT", "RELEASE", "ROLLBACK"):
+            statements.append((statement, parameters))
+
+    sync_engine = session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", capture)
+    try:
+        await call()
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", capture)
+
+    plans = []
+    conn = session.bind
+    for statement, parameters in statements:
+        result = await conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        )
+        plan = result.scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        plans.append((statement, scans(plan[0]["Plan"])))
+    return plans
+
+
+def scans(node) -> list:
+    """Узлы чтения таблиц: (тип узла, таблица, индекс)"""
+    found = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if "Relation Name" in node or "Index Name" in node:
+            found.append(
+                (node["Node Type"], node.get("Relation Name"), node.get("Index Name"))
+            )
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+def assert_indexed(plans, *indexes) -> None:
+    """Ни одного Seq Scan, все ожидаемые индексы использованы.
+
+    Индексы секций payments называются по секции, поэтому ожидаемое имя
+    ищется как подстрока.
+    """
+    used = set()
+    for statement, nodes in plans:
+        for node_type, relation, index in nodes:
+            assert node_type != "Seq Scan", f"Seq Scan on {relation}: {statement}"
+            used.add(index or "")
+    for expected in indexes:
+        assert any(expected in index for index in used), f"{expected} not in {used}"
+
+
+class TestQueryPlans:
+    """Использование индексов запросами app/services.py (нужен PostgreSQL)"""
+
+    async def test_user_by_id(self, session):
+        """Тест поиска пользователя по id"""
+        plans = await captured_plans(
+            session, lambda: UserService.get_user_by_id(session, USER_ID)
+        )
+        assert_indexed(plans, "users_pkey")
+
+    async def test_create_and_update_user(self, session):
+        """Тест проверки email при создании и обновления пользователя"""
+        plans = await captured_plans(
+            session,
+            lambda: UserService.create_user(
+                session,
+                UserCreate(
+                    email="plans-new@example.com",
+                    full_name="Plans New",
+                    password="password123",
+                ),
+            ),
+        )
+        assert_indexed(plans, "ix_users_email")
+
+        plans = await captured_plans(
+            session,
+            lambda: UserService.update_user(
+                session, USER_ID, UserUpdate(full_name="Plans Renamed")
+            ),
+        )
+        assert_indexed(plans, "users_pkey")
+
+    async def test_user_rows_page(self, session):
+        """Тест страницы пользователей со счетами"""
+        plans = await captured_plans(
+            session, lambda: UserService.get_user_rows(session, USER_ID - 1, 100)
+        )
+        assert_indexed(plans, "users_pkey", "ix_accounts_user_id")
+
+    async def test_users_json_page(self, session):
+        """Тест страницы пользователей в JSON из PostgreSQL"""
+        plans = await captured_plans(
+            session, lambda: UserService.get_users_json(session, USER_ID - 1, 100)
+        )
+        assert_indexed(plans, "users_pkey", "ix_accounts_user_id")
+
+    async def test_users_json_matches_schema(self, session):
+        """Тест: JSON из PostgreSQL совпадает с ответом по схеме pydantic"""
+        await session.execute(
+            update(User)
+            .where(User.id == USER_ID)
+            .values(created_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        )
+        await session.execute(
+            update(Account)
+            .where(Account.id == ACCOUNT_ID)
+            .values(
+                created_at=datetime(2024, 1, 1, 1, 2, 3, 450000, tzinfo=timezone.utc)
+            )
+        )
+        # Время сессии не в UTC: ответ от него не зависит
+        await session.execute(text("SET LOCAL TIME ZONE 'Europe/Moscow'"))
+
+        body, _, _ = await UserService.get_users_json(session, USER_ID - 1, 1)
+        rows = await UserService.get_user_rows(session, USER_ID - 1, 1)
+
+        assert json.loads(body) == json.loads(
+            render_many(UserWithAccountsResponse, rows)
+        )
+        assert json.loads(body)[0]["created_at"] == "2024-01-01T00:00:00Z"
+
+    async def test_users_with_accounts_relationship(self, session):
+        """Тест загрузки счетов пользователей через selectinload"""
+        plans = await captured_plans(session, lambda: UserService.get_users(session))
+        # Полный список пользователей читается целиком, счета — по индексу
+        accounts = [plan for plan in plans if "FROM accounts" in plan[0]]
+        assert_indexed(accounts, "ix_accounts_user_id")
+
+    async def test_user_accounts(self, session):
+        """Тест счетов пользователя"""
+        plans = await captured_plans(
+            session, lambda: AccountService.get_user_account_rows(session, USER_ID)
+        )
+        assert_indexed(plans, "ix_accounts_user_id")
+
+    async def test_user_payments(self, session):
+        """Тест платежей пользователя (ORM и проекция)"""
+        for call in (
+            PaymentService.get_user_payments,
+            PaymentService.get_user_payment_rows,
+        ):
+            plans = await captured_plans(session, lambda: call(session, USER_ID))
+            assert_indexed(plans, "user_id_created_at")
+
+    async def test_user_payments_period_pruned(self, session):
+        """Тест чтения только секции месяца при фильтре по дате"""
+        since = month_start(datetime.now(timezone.utc))
+        plans = await captured_plans(
+            session,
+            lambda: PaymentService.get_user_payment_rows(
+                session, USER_ID, since, add_months(since, 1)
+            ),
+        )
+        assert_indexed(plans, "user_id_created_at")
+        relations = {relation for _, nodes in plans for _, relation, _ in nodes}
+        assert relations == {partition_name(since)}
+
+    async def test_user_payment_page_cursor_pruned(self, session):
+        """Тест страницы платежей по курсору: секции новее курсора не читаются"""
+        month = month_start(datetime.now(timezone.utc))
+        plans = await captured_plans(
+            session,
+            lambda: PaymentService.get_user_payment_page(
+                session, USER_ID, 50, before=(month, 0)
+            ),
+        )
+        assert_indexed(plans, "user_id_created_at")
+        relations = {relation for _, nodes in plans for _, relation, _ in nodes}
+        assert partition_name(month) not in relations
+
+    async def test_balance_as_of_from_checkpoint(self, session):
+        """Тест баланса на момент: срез по ключу, платежи после него по
+        индексу пользователя только из секции текущего месяца"""
+        now = datetime.now(timezone.utc)
+        await session.execute(
+            insert(BalanceCheckpoint).values(
+                account_id=ACCOUNT_ID, day=now.date() - timedelta(days=1), balance=0
+            )
+        )
+        plans = await captured_plans(
+            session,
+            lambda: AccountService.get_balance_as_of(
+                session, ACCOUNT_ID, now, user_id=USER_ID
+            ),
+        )
+        assert_indexed(
+            plans, "accounts_pkey", "balance_checkpoints_pkey", "user_id_created_at"
+        )
+        payments = {
+            relation
+            for _, nodes in plans
+            for _, relation, _ in nodes
+            if relation and relation.startswith("payments")
+        }
+        assert payments == {partition_name(month_start(now))}
+
+    async def test_process_payment(self, session):
+        """Тест проверки повтора и зачисления на счет"""
+        plans = await captured_plans(
+            session,
+            lambda: PaymentService.process_payment(
+                session, "plans-2", USER_ID, ACCOUNT_ID, 200
+            ),
+        )
+        assert_indexed(plans, "payment_transactions_pkey", "accounts_pkey")
+
+    async def test_delete_user(self, session):
+        """Тест удаления пользователя вместе со счетами"""
+        await session.execute(
+            Payment.__table__.delete().where(Payment.user_id == USER_ID)
+        )
+        plans = await captured_plans(
+            session, lambda: UserService.delete_user(session, USER_ID)
+        )
+        assert_indexed(plans, "users_pkey", "ix_accounts_user_id")
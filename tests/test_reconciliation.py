@@ -0,0 +1,231 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import reconciliation
+from app.archive import PaymentArchive, SegmentWriter, publish
+from app.metrics import Metrics, sample_key
+from app.reconciliation import Reconciler, aggregate
+from app.rows import PaymentRow
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+OLD = NOW - timedelta(hours=1)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def scalar(self):
+        return self._rows[0][0]
+
+    def one(self):
+        return self._rows[0]
+
+    def all(self):
+        return self._rows
+
+    def scalars(self):
+        return FakeResult([row[0] for row in self._rows])
+
+
+class FakeConnection:
+    """Соединение с таблицами сверки в памяти"""
+
+    def __init__(self, payments, balances, locked=False):
+        self.payments = payments
+        self.balances = balances
+        self.locked = locked
+        self.sums = {}
+        self.drifts = []
+        self.state = [0, 0, True, None]
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    begin_nested = begin
+
+    async def exec_driver_sql(self, sql):
+        pass
+
+    async def execute(self, stmt, params=None):
+        params = params or {}
+        if stmt is reconciliation.TRY_LOCK:
+            return FakeResult([(not self.locked,)])
+        if stmt is reconciliation.READ_STATE:
+            return FakeResult([(*self.state, NOW)])
+        if stmt is reconciliation.NEXT_PAYMENTS:
+            rows = [row for row in self.payments if row[0] > params["watermark"]]
+            return FakeResult(rows[: params["limit"]])
+        if stmt is reconciliation.ADD_SUMS:
+            for account, total, count in zip(
+                params["accounts"], params["totals"], params["counts"]
+            ):
+                current = self.sums.setdefault(account, [0, 0])
+                current[0] += total
+                current[1] += count
+            return FakeResult([])
+        if stmt is reconciliation.AUDIT_ACCOUNTS:
+            ids = sorted(
+                account for account in self.balances if account > params["after"]
+            )
+            return FakeResult([(account,) for account in ids[: params["limit"]]])
+        if stmt is reconciliation.CHECK_ACCOUNTS:
+            return FakeResult(
+                [self.check(account, params) for account in params["accounts"]]
+            )
+        if stmt is reconciliation.REPAIR:
+            self.balances[params["id"]] -= params["drift"]
+            return FakeResult([])
+        if stmt is reconciliation.RECORD_DRIFT:
+            self.drifts.append(dict(params))
+            return FakeResult([])
+        if stmt is reconciliation.WRITE_STATE:
+            self.state = [params["watermark"], params["audit_after"], True, None]
+            return FakeResult([])
+        raise AssertionError(stmt)
+
+    def check(self, account, params):
+        pending = sum(
+            amount
+            for payment_id, account_id, amount, _ in self.payments
+            if account_id == account and payment_id > params["watermark"]
+        )
+        return account, self.balances[account], self.sums.get(account, [0])[0] + pending
+
+
+def reconciler(**overrides):
+    options = dict(
+        batch_size=10,
+        audit_accounts=100,
+        settle=60,
+        repair=False,
+        max_rows_per_second=1000,
+        interval=1,
+        statement_timeout_ms=1000,
+    )
+    options.update(overrides)
+    return Reconciler(**options)
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = Metrics([])
+    monkeypatch.setattr(reconciliation, "metrics", metrics)
+    return metrics
+
+
+@pytest.mark.unit
+class TestReconciliation:
+    """Unit тесты для сверки балансов"""
+
+    def test_aggregate_stops_at_settle_horizon(self):
+        """Тест сумм по счетам до первого свежего платежа"""
+        rows = [
+            (1, 10, 500, OLD),
+            (2, 20, 300, OLD),
+            (3, 10, 200, OLD),
+            (4, 20, 100, NOW),
+            (5, 10, 900, OLD),
+        ]
+
+        totals, last_id = aggregate(rows, NOW - timedelta(seconds=60))
+
+        assert totals == {10: [700, 2], 20: [300, 1]}
+        assert last_id == 3
+        assert aggregate(rows[3:], NOW) == ({}, None)
+
+    def test_archive_account_totals(self, tmp_path):
+        """Тест сумм архива по счетам для первого запуска сверки"""
+        boundary = datetime(2024, 2, 1, tzinfo=timezone.utc)
+        writer = SegmentWriter(str(tmp_path), "seg_202402", 2)
+        for payment_id, account_id, amount in [(1, 10, 150), (2, 10, 50), (3, 20, 7)]:
+            writer.add(
+                PaymentRow(payment_id, f"tx-{payment_id}", account_id, 1, amount, OLD)
+            )
+        publish(str(tmp_path), writer.close(), None, boundary)
+
+        archive = PaymentArchive(str(tmp_path), cache_blocks=4)
+
+        assert archive.account_totals() == (boundary, {10: [200, 2], 20: [7, 1]})
+        assert PaymentArchive(str(tmp_path / "empty"), 4).account_totals() == (
+            None,
+            {},
+        )
+
+    async def test_step_advances_watermark_and_finds_drift(self, metrics):
+        """Тест шага: watermark не переходит свежий платеж, расхождение найдено"""
+        payments = [
+            (1, 10, 500, OLD),
+            (2, 20, 300, OLD),
+            (3, 20, 100, NOW),
+        ]
+        conn = FakeConnection(payments, {10: 500, 20: 450, 30: 0})
+
+        result = await reconciler().step(conn)
+
+        assert result["payments"] == 2
+        assert result["watermark"] == 2
+        assert result["caught_up"]
+        assert result["audit_wrapped"]
+        assert conn.sums == {10: [500, 1], 20: [300, 1]}
+        # Свежий платеж учитывается в ожидаемой сумме, но не в сверенной
+        assert result["drifts"] == [
+            {"account_id": 20, "balance": 450, "expected": 400, "repaired": False}
+        ]
+        assert conn.balances[20] == 450
+        assert conn.state[0] == 2
+
+        values = metrics.values()
+        assert values["paysystem_reconciled_payments_total"] == 2
+        drifts = "paysystem_balance_drifts_total"
+        assert values[sample_key(drifts, outcome="detected")] == 1
+        assert values[sample_key(drifts, outcome="repaired")] == 0
+
+    async def test_step_repairs_drift_relative(self, metrics):
+        """Тест исправления расхождения относительным UPDATE"""
+        conn = FakeConnection([(1, 10, 500, OLD)], {10: 650})
+
+        result = await reconciler(repair=True).step(conn)
+
+        assert result["drifts"][0]["repaired"]
+        assert conn.balances[10] == 500
+        assert conn.drifts[0]["expected"] == 500
+
+    async def test_step_in_batches_and_audit_circle(self, metrics):
+        """Тест пакетов платежей и аудита счетов по кругу"""
+        payments = [(n, 10 + n % 3, 100, OLD) for n in range(1, 8)]
+        conn = FakeConnection(payments, {10: 200, 11: 300, 12: 200, 13: 0})
+        worker = reconciler(batch_size=3, audit_accounts=2)
+
+        first = await worker.step(conn)
+        second = await worker.step(conn)
+        third = await worker.step(conn)
+
+        assert [first["watermark"], second["watermark"], third["watermark"]] == [
+            3,
+            6,
+            7,
+        ]
+        assert not first["caught_up"] and not second["caught_up"]
+        assert third["caught_up"]
+        # Полная последняя страница аудита: круг замыкается на следующем шаге
+        assert [step["audit_wrapped"] for step in (first, second, third)] == [
+            False,
+            False,
+            True,
+        ]
+        assert conn.sums == {10: [200, 2], 11: [300, 3], 12: [200, 2]}
+        assert all(not step["drifts"] for step in (first, second, third))
+
+    async def test_step_skipped_when_locked(self, metrics):
+        """Тест пропуска шага, если сверку выполняет другой процесс"""
+        conn = FakeConnection([(1, 10, 500, OLD)], {10: 500}, locked=True)
+
+        assert await reconciler().step(conn) is None
+        assert conn.sums == {}
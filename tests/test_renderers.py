@@ -0,0 +1,97 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.models import Account, Payment, User
+from app.renderers import json_response, render, render_many
+from app.rows import AccountRow, PaymentRow, UserRow, columns
+from app.schemas import (
+    AccountResponse,
+    PaymentResponse,
+    UserWithAccountsResponse,
+    WebhookPaymentResponse,
+)
+from app.utils import custom_json_serializer
+
+CREATED_AT = datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def make_payment(amount=10010):
+    return Payment(
+        id=1,
+        transaction_id="tx-1",
+        account_id=2,
+        user_id=3,
+        amount=amount,
+        created_at=CREATED_AT,
+    )
+
+
+@pytest.mark.unit
+class TestRenderers:
+    """Unit тесты для рендеринга ответов"""
+
+    def test_money_is_exact_string(self):
+        """Тест точного представления денежных сумм из минимальных единиц"""
+        body = render(PaymentResponse, make_payment(999_999_999_999))
+        data = json.loads(body)
+        assert data["amount"] == "9999999999.99"
+        assert data["created_at"].startswith("2024-01-01T12:30:00")
+
+    def test_render_many(self):
+        """Тест рендеринга списка"""
+        accounts = [
+            Account(id=i, user_id=1, balance=10, created_at=CREATED_AT)
+            for i in range(3)
+        ]
+        data = json.loads(render_many(AccountResponse, accounts))
+        assert [a["id"] for a in data] == [0, 1, 2]
+        assert {a["balance"] for a in data} == {"0.10"}
+
+    def test_render_empty_list(self):
+        """Тест рендеринга пустого списка"""
+        assert render_many(PaymentResponse, []) == b"[]"
+
+    def test_nested_relationships(self):
+        """Тест вложенных счетов пользователя"""
+        user = User(id=1, email="u@example.com", full_name="U", created_at=CREATED_AT)
+        user.accounts = [Account(id=7, user_id=1, balance=500, created_at=CREATED_AT)]
+        data = json.loads(render(UserWithAccountsResponse, user))
+        assert data["accounts"][0]["balance"] == "5.00"
+        assert "password_hash" not in data
+
+    def test_webhook_response(self):
+        """Тест ответа на вебхук"""
+        data = json.loads(render(WebhookPaymentResponse, {"payment": make_payment()}))
+        assert data["status"] == "success"
+        assert data["payment"]["amount"] == "100.10"
+
+    def test_json_response(self):
+        """Тест HTTP-ответа с готовым телом"""
+        resp = json_response(b"[]", status=201)
+        assert resp.status == 201
+        assert resp.body == b"[]"
+        assert resp.content_type == "application/json"
+
+    def test_custom_serializer_keeps_decimal_exact(self):
+        """Тест сериализации Decimal без потери точности"""
+        assert custom_json_serializer(Decimal("0.10")) == "0.10"
+
+    def test_render_rows(self):
+        """Тест рендеринга легковесных строк выборки"""
+        account = AccountRow(7, 1, 500, CREATED_AT)
+        user = UserRow(1, "u@example.com", "U", CREATED_AT, [account])
+        payment = PaymentRow(1, "tx-1", 7, 1, 1, CREATED_AT)
+
+        users = json.loads(render_many(UserWithAccountsResponse, [user]))
+        payments = json.loads(render_many(PaymentResponse, [payment]))
+
+        assert users[0]["accounts"][0]["balance"] == "5.00"
+        assert payments[0]["amount"] == "0.01"
+
+    def test_row_columns_match_fields(self):
+        """Тест соответствия колонок выборки полям строки"""
+        selected = [column.key for column in columns(Payment, PaymentRow)]
+        assert selected == list(PaymentRow._fields)
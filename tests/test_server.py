@@ -0,0 +1,78 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import Config
+from app.server import (
+    configure_event_bridge,
+    effective_settings,
+    self_check,
+    worker_count,
+)
+
+
+def make_app(response_timeout=60.0):
+    config = SimpleNamespace(
+        KEEP_ALIVE_TIMEOUT=5.0,
+        REQUEST_TIMEOUT=60.0,
+        RESPONSE_TIMEOUT=response_timeout,
+        REQUEST_MAX_SIZE=1024,
+        GRACEFUL_SHUTDOWN_TIMEOUT=15.0,
+    )
+    return SimpleNamespace(config=config)
+
+
+@pytest.mark.unit
+class TestServerSettings:
+    """Unit тесты для настроек production-запуска"""
+
+    def test_worker_count_defaults_to_cpu_count(self, monkeypatch):
+        """Тест числа воркеров по умолчанию"""
+        monkeypatch.setattr(Config, "WORKERS", 0)
+        monkeypatch.setattr("os.cpu_count", lambda: 16)
+        assert worker_count() == 16
+
+    def test_worker_count_from_config(self, monkeypatch):
+        """Тест явно заданного числа воркеров"""
+        monkeypatch.setattr(Config, "WORKERS", 4)
+        assert worker_count() == 4
+
+    def test_effective_settings(self, monkeypatch):
+        """Тест отчета о фактических настройках"""
+        monkeypatch.setattr(Config, "WORKERS", 2)
+        settings = effective_settings(make_app())
+        assert settings["workers"] == 2
+        assert settings["access_log"] is Config.ACCESS_LOG
+        assert settings["request_max_size"] == 1024
+
+    def test_self_check_keepalive_vs_response_timeout(self, monkeypatch):
+        """Тест предупреждения о закрытии потоков событий по таймауту"""
+        monkeypatch.setattr(Config, "WORKERS", 1)
+        settings = effective_settings(make_app(response_timeout=10.0))
+        assert any("EVENTS_KEEPALIVE" in w for w in self_check(settings))
+
+    def test_event_bridge_enabled_for_several_workers(self, monkeypatch):
+        """Тест: без явного EVENTS_PG_NOTIFY мост включается для воркеров"""
+        # setenv запоминает исходное окружение для восстановления
+        monkeypatch.setenv("EVENTS_PG_NOTIFY", "")
+        monkeypatch.delenv("EVENTS_PG_NOTIFY")
+        monkeypatch.setattr(Config, "EVENTS_PG_NOTIFY", False)
+
+        configure_event_bridge(1)
+        assert Config.EVENTS_PG_NOTIFY is False
+
+        configure_event_bridge(4)
+        assert Config.EVENTS_PG_NOTIFY is True
+        assert os.environ["EVENTS_PG_NOTIFY"] == "true"
+
+    def test_self_check_events_without_bridge(self, monkeypatch):
+        """Тест предупреждения о явно выключенном мосте при нескольких воркерах"""
+        monkeypatch.setenv("EVENTS_PG_NOTIFY", "false")
+        monkeypatch.setattr(Config, "EVENTS_PG_NOTIFY", False)
+        monkeypatch.setattr(Config, "WORKERS", 4)
+
+        configure_event_bridge(4)
+        settings = effective_settings(make_app())
+
+        assert any("EVENTS_PG_NOTIFY" in w for w in self_check(settings))
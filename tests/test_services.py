@@ -2,14 +2,57 @@ import hashlib
 from decimal import Decimal
 
 import pytest
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
 
 from app.config import Config
+from app.schemas import WebhookRequest, format_minor_units, to_minor_units
 from app.services import (
+    PaymentService,
     UserService,
     WebhookService,
 )
 
 
+class RacingDuplicateSession:
+    """Сессия, в которой одновременный повтор транзакции коммитится первым"""
+
+    def __init__(self):
+        self.statements = []
+        self.rolled_back = False
+
+    async def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        if stmt.is_update:
+            rows = [(1, 1, 1000, None)]
+        else:
+            rows = [1] if self.rolled_back else []
+        return FakeResult(rows)
+
+    def add(self, obj):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        raise IntegrityError("INSERT INTO payments", {}, Exception("duplicate key"))
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalar_one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+    one_or_none = scalar_one_or_none
+
+
 @pytest.mark.unit
 class TestAuthServices:
     """Unit тесты для сервисов авторизации"""
@@ -156,3 +199,54 @@ class TestPaymentServices:
 
         for amount in invalid_amounts:
             assert amount <= 0
+
+    def test_minor_units_conversion(self):
+        """Тест перевода сумм в минимальные единицы и обратно"""
+        assert to_minor_units(Decimal("100.5")) == 10050
+        assert to_minor_units(Decimal("0.01")) == 1
+        assert to_minor_units(Decimal("99999999999.99")) == 9999999999999
+        assert format_minor_units(10050) == "100.50"
+        assert format_minor_units(1) == "0.01"
+        assert format_minor_units(-205) == "-2.05"
+
+        with pytest.raises(ValueError):
+            to_minor_units(Decimal("1.005"))
+
+    def test_webhook_amount_keeps_signed_form(self):
+        """Тест суммы вебхука: подпись по исходному виду, зачисление в копейках"""
+        amount = Decimal("150.5")
+        signature = hashlib.sha256(
+            f"1{amount}tx-1{1}{Config.WEBHOOK_SECRET_KEY}".encode()
+        ).hexdigest()
+        body = WebhookRequest(
+            transaction_id="tx-1",
+            user_id=1,
+            account_id=1,
+            amount=150.5,
+            signature=signature,
+        )
+
+        assert WebhookService.verify_signature(
+            body.transaction_id, body.user_id, body.account_id, body.amount, signature
+        )
+        assert body.amount_minor == 15050
+
+        with pytest.raises(ValidationError):
+            WebhookRequest(
+                transaction_id="tx-2",
+                user_id=1,
+                account_id=1,
+                amount="0.001",
+                signature=signature,
+            )
+
+    async def test_concurrent_duplicate_is_rejected(self):
+        """Тест отклонения повтора, зафиксированного конкурентной транзакцией"""
+        session = RacingDuplicateSession()
+
+        with pytest.raises(ValueError, match="already processed"):
+            await PaymentService.process_payment(session, "tx-1", 1, 1, 1000)
+
+        assert session.rolled_back
+        # Баланс увеличивается в SQL, а не записывается из Python
+        assert "SET balance=(accounts.balance + " in session.statements[1]
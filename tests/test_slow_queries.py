@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from app.models import User
+from app.slow_queries import REDACTED, SlowQueryLog, explain_sql, redact_parameters
+
+SECRETS = ("password", "token")
+
+
+def make_log(**kwargs):
+    options = {"threshold_ms": 0, "keep": 3, "explain_rate": 0, "secrets": SECRETS}
+    options.update(kwargs)
+    return SlowQueryLog(**options)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    return engine
+
+
+@pytest.mark.unit
+class TestSlowQueryLog:
+    """Unit тесты для журнала медленных запросов"""
+
+    def test_records_with_redacted_parameters(self, engine):
+        """Тест записи запроса с маскировкой секретных параметров"""
+        log = make_log()
+        log.install(engine)
+        log.install(engine)
+
+        with engine.connect() as connection:
+            connection.execute(
+                select(User.id).where(
+                    User.email == "user@example.com",
+                    User.password_hash == "secret-hash",
+                )
+            )
+
+        assert len(log.entries) == 1
+        entry = log.entries[0]
+        assert entry["statement"].startswith("SELECT users.id")
+        assert entry["parameters"] == {
+            "email_1": "user@example.com",
+            "password_hash_1": REDACTED,
+        }
+
+    def test_threshold_and_bounded_store(self, engine):
+        """Тест порога длительности и ограничения размера хранилища"""
+        fast = make_log(threshold_ms=10_000)
+        slow = make_log()
+        fast.install(engine)
+        slow.install(engine)
+
+        with engine.connect() as connection:
+            for i in range(5):
+                connection.execute(text(f"SELECT {i}"))
+
+        assert not fast.entries
+        assert [entry["statement"] for entry in slow.entries] == [
+            "SELECT 2",
+            "SELECT 3",
+            "SELECT 4",
+        ]
+
+    def test_redact_unknown_names(self):
+        """Тест маскировки всех значений, если имена параметров неизвестны"""
+        assert redact_parameters(None, ("a", 1), SECRETS) == {
+            "$1": REDACTED,
+            "$2": REDACTED,
+        }
+        assert redact_parameters(None, {"token": "t", "id": 5}, SECRETS) == {
+            "token": REDACTED,
+            "id": 5,
+        }
+
+    def test_explain_sampling(self):
+        """Тест выбора запросов для EXPLAIN: только SELECT и без повторов"""
+        log = make_log(explain_rate=1)
+        log._explain_engine = object()
+
+        assert not log._should_explain("UPDATE accounts SET balance = 1")
+        assert log._should_explain("SELECT 1")
+        assert not log._should_explain("SELECT 1")
+        assert log._should_explain("SELECT 2")
+
+    def test_explain_analyze_only_without_side_effects(self):
+        """Тест: запросы с блокировками и побочными эффектами не выполняются"""
+        select_sql = "SELECT * FROM accounts WHERE id = $1"
+        assert explain_sql(select_sql).startswith("EXPLAIN (ANALYZE, BUFFERS) ")
+
+        for statement in (
+            "SELECT * FROM accounts WHERE id = $1 FOR UPDATE",
+            "SELECT * FROM accounts WHERE id = $1 for no key update",
+            "SELECT * FROM accounts FOR SHARE SKIP LOCKED",
+            "SELECT nextval('payments_id_seq')",
+            "SELECT pg_advisory_xact_lock($1)",
+            "SELECT pg_try_advisory_lock(1)",
+            "SELECT pg_notify('events', $1)",
+        ):
+            assert explain_sql(statement) == f"EXPLAIN {statement}"
+
+    async def test_explain_runs_in_background(self, engine):
+        """Тест выполнения EXPLAIN в фоновой задаче"""
+        log = make_log(explain_rate=1)
+        log.install(engine, explain_engine=object())
+        explained = asyncio.Event()
+
+        async def fake_explain(entry, statement, parameters):
+            entry["explain"] = f"plan for {statement}"
+            log._explaining = False
+            explained.set()
+
+        log._explain = fake_explain
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        await asyncio.wait_for(explained.wait(), 1)
+
+        assert log.entries[0]["explain"] == "plan for SELECT 1"
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.config import Config
+
+STARTUP_SCRIPT = """
+import sys
+import time
+started = time.perf_counter()
+from app.main import create_app
+create_app()
+print((time.perf_counter() - started) * 1000)
+print(",".join(name for name in ("bcrypt",) if name in sys.modules))
+"""
+
+
+@pytest.mark.startup
+class TestStartup:
+    """Проверка бюджета холодного старта воркера"""
+
+    def test_startup_within_budget(self):
+        """Тест времени импорта и create_app в чистом интерпретаторе"""
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed_ms, eager_modules = result.stdout.splitlines()
+
+        assert float(elapsed_ms) <= Config.STARTUP_BUDGET_MS
+        # Тяжелые модули путей входа не должны загружаться при старте
+        assert eager_modules == ""
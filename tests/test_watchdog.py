@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.logs import logger
+from app.watchdog import LoopWatchdog
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def blocking_handler():
+    time.sleep(0.15)
+
+
+@pytest.fixture
+def log_records():
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler.records
+    logger.removeHandler(handler)
+
+
+@pytest.mark.unit
+class TestLoopWatchdog:
+    """Unit тесты для обнаружения блокировок event loop"""
+
+    async def test_detects_blocking_call(self, log_records):
+        """Тест обнаружения блокировки со стеком и привязкой к задаче"""
+        blocks = []
+        watchdog = LoopWatchdog(threshold=0.05, on_block=blocks.append)
+        watchdog.start(asyncio.get_running_loop())
+        try:
+            await asyncio.sleep(0.05)
+
+            async def request():
+                blocking_handler()
+                return watchdog.blocked_for(asyncio.current_task())
+
+            blocked = await asyncio.create_task(request())
+            await asyncio.sleep(0.05)
+        finally:
+            watchdog.stop()
+
+        assert blocked is not None and blocked >= 0.05
+        assert watchdog.blocks == 1
+        assert blocks and blocks[0] >= 0.1
+        warnings = [r for r in log_records if r.getMessage() == "Event loop blocked"]
+        assert len(warnings) == 1
+        assert "blocking_handler" in warnings[0].stack
+
+    async def test_ignores_cooperative_code(self, log_records):
+        """Тест отсутствия срабатываний без блокировок"""
+        watchdog = LoopWatchdog(threshold=0.05)
+        watchdog.start(asyncio.get_running_loop())
+        try:
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+            assert watchdog.blocked_for(asyncio.current_task()) is None
+        finally:
+            watchdog.stop()
+
+        assert watchdog.blocks == 0
+        assert not log_records
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Архивация старых платежей в сегменты на локальном диске
+
+Платежи старше --older-than-days дней (граница — полночь UTC) выгружаются
+из PostgreSQL в новый сегмент ARCHIVE_DIR (см. app/archive.py), граница
+архива в manifest.json сдвигается, после чего архивированные строки
+удаляются из payments пачками по --batch-size с паузой --pause секунд.
+Записи payment_transactions остаются: повтор старой транзакции
+по-прежнему отклоняется. Платежи, еще не учтенные сверкой балансов,
+удаляются при следующих запусках.
+
+Сегмент публикуется до удаления строк, поэтому прерванное задание
+безопасно перезапустить: оно дочистит строки старше границы. Запускается
+по расписанию (например, ежедневно из cron) на одной машине с сервером:
+
+    python utils/archive_payments.py --older-than-days 90
+    python utils/archive_payments.py --older-than-days 90 --dry-run
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy.engine import make_url
+
+from app.archive import PaymentArchive, SegmentWriter, archive_stats, publish
+from app.config import Config
+from app.rows import PaymentRow
+
+SELECT_ROWS = """
+    SELECT id, transaction_id, account_id, user_id, amount, created_at
+    FROM payments
+    WHERE created_at >= $1 AND created_at < $2
+    ORDER BY user_id, created_at, id
+"""
+
+COUNT_ROWS = """
+    SELECT count(*) FROM payments WHERE created_at >= $1 AND created_at < $2
+"""
+
+# После первого запуска сверки балансов (app.reconciliation) удаляются
+# только сверенные платежи: несверенные иначе выпали бы из сумм
+RECONCILED_UP_TO = """
+    SELECT coalesce(
+        (SELECT CASE WHEN seeded THEN watermark END
+         FROM reconciliation_state WHERE id = 1),
+        9223372036854775807
+    )
+"""
+
+# Пачка по первичному ключу: короткие транзакции не держат блокировки
+# и не раздувают WAL одним большим DELETE
+DELETE_BATCH = f"""
+    DELETE FROM payments
+    WHERE (id, created_at) IN (
+        SELECT id, created_at FROM payments
+        WHERE created_at < $1 AND id <= ({RECONCILED_UP_TO})
+        LIMIT $2
+    )
+"""
+
+REMAINING = "SELECT count(*) FROM payments WHERE created_at < $1"
+
+EARLIEST = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def cutoff_for(now: datetime, days: int) -> datetime:
+    day = now.astimezone(timezone.utc) - timedelta(days=days)
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def segment_name(since: Optional[datetime], until: datetime) -> str:
+    first = f"{since:%Y%m%d}" if since is not None else "00000000"
+    return f"payments_{first}_{until:%Y%m%d}"
+
+
+async def write_segment(conn, since: Optional[datetime], until: datetime) -> dict:
+    """Выгрузка платежей [since, until) в новый сегмент"""
+    writer = SegmentWriter(
+        Config.ARCHIVE_DIR, segment_name(since, until), Config.ARCHIVE_BLOCK_ROWS
+    )
+    try:
+        # Снимок на время выгрузки; курсор не держит все строки в памяти
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            async for record in conn.cursor(
+                SELECT_ROWS, since or EARLIEST, until, prefetch=10000
+            ):
+                writer.add(PaymentRow(*record))
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+async def delete_archived(conn, boundary: datetime, batch_size: int, pause: float):
+    deleted = 0
+    while True:
+        status = await conn.execute(DELETE_BATCH, boundary, batch_size)
+        count = int(status.split()[-1])
+        deleted += count
+        if count < batch_size:
+            return deleted
+        await asyncio.sleep(pause)
+
+
+async def run(args) -> None:
+    import asyncpg
+
+    archive = PaymentArchive(Config.ARCHIVE_DIR, 0)
+    boundary = archive.boundary()
+    cutoff = cutoff_for(datetime.now(timezone.utc), args.older_than_days)
+
+    dsn = make_url(Config.DATABASE_URL).set(drivername="postgresql")
+    conn = await asyncpg.connect(dsn.render_as_string(hide_password=False))
+    try:
+        if boundary is not None and cutoff <= boundary:
+            print(f"archive boundary {boundary.isoformat()} is already past cutoff")
+        elif args.dry_run:
+            count = await conn.fetchval(COUNT_ROWS, boundary or EARLIEST, cutoff)
+            print(f"would archive {count} payments before {cutoff.isoformat()}")
+            return
+        else:
+            started = time.perf_counter()
+            segment = await write_segment(conn, boundary, cutoff)
+            publish(Config.ARCHIVE_DIR, segment, boundary, cutoff)
+            boundary = cutoff
+            print(
+                f"archived {segment['rows']} payments into {segment['name']} "
+                f"({segment['bytes']} bytes, {time.perf_counter() - started:.1f}s)"
+            )
+
+        if boundary is not None and not args.dry_run:
+            deleted = await delete_archived(conn, boundary, args.batch_size, args.pause)
+            print(f"deleted {deleted} archived payments from PostgreSQL")
+            remaining = await conn.fetchval(REMAINING, boundary)
+            if remaining:
+                print(f"{remaining} archived payments wait for reconciliation")
+        stats = archive_stats(Config.ARCHIVE_DIR)
+        print(
+            f"archive: {stats['segments']} segments, "
+            f"{stats['rows']} payments, {stats['bytes']} bytes"
+        )
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--older-than-days", type=int, default=90, help="архивировать старше (дней)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="строк в одном DELETE"
+    )
+    parser.add_argument(
+        "--pause", type=float, default=0.05, help="пауза между пачками (сек)"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="только посчитать строки"
+    )
+    args = parser.parse_args()
+    if args.older_than_days < 1 or args.batch_size < 1:
+        parser.error("--older-than-days and --batch-size must be positive")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
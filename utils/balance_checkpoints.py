@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Построение дневных срезов балансов счетов
+
+Строит срезы (см. app/checkpoints.py) за все дни, которые еще не
+построены и уже закрыты: прошла полночь UTC и RECONCILE_SETTLE_SECONDS
+секунд. Первый запуск строит срезы за всю историю, включая архив
+платежей, порциями по --chunk-days дней; прерванное построение
+продолжается с первого непостроенного дня. Запускается по расписанию
+(например, ежедневно из cron после полуночи) на одной машине с сервером:
+
+    python utils/balance_checkpoints.py
+    python utils/balance_checkpoints.py --until 2024-06-30
+    python utils/balance_checkpoints.py --status
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+
+from app.checkpoints import CheckpointBuilder
+from app.config import Config
+from app.database import engine
+
+STATUS = text("""
+    SELECT s.day, s.updated_at,
+           (SELECT count(*) FROM balance_checkpoints)
+    FROM balance_checkpoint_state s WHERE s.id = 1
+    """)
+
+
+async def status(builder: CheckpointBuilder) -> None:
+    async with engine.connect() as conn:
+        day, updated_at, rows = (await conn.execute(STATUS)).one()
+        first, last = await builder.pending(conn)
+    print(f"built through   {day or '-'} (updated {updated_at:%Y-%m-%d %H:%M:%S})")
+    print(f"checkpoints     {rows}")
+    pending = (last - first).days + 1 if first is not None else 0
+    print(f"pending days    {max(pending, 0)}")
+
+
+def report(day: date, rows: int) -> None:
+    print(f"{day}: {rows} checkpoints")
+
+
+async def run(args) -> int:
+    builder = CheckpointBuilder(Config.RECONCILE_SETTLE_SECONDS, args.chunk_days)
+    try:
+        if args.status:
+            await status(builder)
+            return 0
+        started = time.perf_counter()
+        built = await builder.build(engine, args.until, report)
+        if built is None:
+            print("checkpoints are being built by another process")
+            return 1
+        print(
+            f"built {built['days']} days, {built['checkpoints']} checkpoints "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=None,
+        metavar="YYYY-MM-DD",
+        help="не строить дни позже",
+    )
+    parser.add_argument(
+        "--chunk-days", type=int, default=31, help="дней архива за одно чтение"
+    )
+    parser.add_argument("--status", action="store_true", help="состояние срезов")
+    args = parser.parse_args()
+    if args.chunk_days < 1:
+        parser.error("--chunk-days must be positive")
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
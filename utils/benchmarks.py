@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки горячих путей платежной системы
+
+Сценарии запускаются без сервера и PostgreSQL:
+
+    python utils/benchmarks.py primitives
+    python utils/benchmarks.py render --rows 10000
+    python utils/benchmarks.py projection --rows 10000
+
+Сценарий admin-users требует PostgreSQL из DATABASE_URL с заполненными
+таблицами (например, 100k пользователей):
+
+    python utils/benchmarks.py admin-users --repeat 5
+
+Результаты сохраняются в JSON (--output) и сравниваются с базовым прогоном;
+код возврата 1, если какой-либо замер медленнее базового больше чем на
+--threshold процентов:
+
+    python utils/benchmarks.py primitives --output base.json
+    python utils/benchmarks.py primitives --output new.json
+    python utils/benchmarks.py compare base.json new.json --threshold 10
+"""
+
+import argparse
+import asyncio
+import gc
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from sanic import response
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.auth import AuthService
+from app.config import Config
+from app.database import Base
+from app.models import Account, Payment, PaymentTransaction, User
+from app.renderers import render_many
+from app.rows import AccountRow, PaymentRow, columns
+from app.schemas import (
+    LoginRequest,
+    PaymentResponse,
+    UserWithAccountsResponse,
+    WebhookRequest,
+)
+from app.services import WebhookService
+from app.utils import custom_json_serializer
+
+
+def measure(fn, repeat: int) -> dict:
+    """Замер времени выполнения функции, миллисекунды"""
+    fn()  # Прогрев кешей схем и аллокатора
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+    }
+
+
+async def measure_async(fn, repeat: int) -> dict:
+    """Замер времени и CPU процесса для корутины, миллисекунды"""
+    await fn()
+    timings, cpu = [], []
+    for _ in range(repeat):
+        started, cpu_started = time.perf_counter(), time.process_time()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "cpu_median_ms": round(statistics.median(cpu), 3),
+    }
+
+
+def measure_per_call(fn, repeat: int, min_time: float = 0.05) -> dict:
+    """Время одного вызова быстрой функции, наносекунды.
+
+    Число вызовов в замере подбирается так, чтобы замер длился не меньше
+    min_time; результат - лучший и медианный замер из repeat.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - started) / number * 1e9)
+    return {
+        "min_ns": round(min(timings), 1),
+        "median_ns": round(statistics.median(timings), 1),
+        "calls": number,
+    }
+
+
+def measure_memory(fn) -> int:
+    """Объем памяти, удерживаемой результатом функции, байты"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def make_payments(rows: int) -> list:
+    """Платежи в виде ORM-объектов, как их возвращает сессия"""
+    started_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        Payment(
+            id=i,
+            transaction_id=f"tx-{i:08d}",
+            account_id=i % 100 + 1,
+            user_id=i % 50 + 1,
+            amount=(i % 10000) * 100 + i % 100,
+            created_at=started_at + timedelta(seconds=i),
+        )
+        for i in range(1, rows + 1)
+    ]
+
+
+def bench_render(args) -> dict:
+    """Сравнение model_validate/model_dump/json с рендерингом в один проход"""
+    payments = make_payments(args.rows)
+
+    def legacy():
+        data = [PaymentResponse.model_validate(p).model_dump() for p in payments]
+        return response.json(data, default=custom_json_serializer).body
+
+    def single_pass():
+        return render_many(PaymentResponse, payments)
+
+    return {
+        "rows": args.rows,
+        "legacy": {**measure(legacy, args.repeat), "bytes": len(legacy())},
+        "render_many": {
+            **measure(single_pass, args.repeat),
+            "bytes": len(single_pass()),
+        },
+    }
+
+
+def bench_primitives(args) -> dict:
+    """Стоимость примитивов, выполняемых на каждый запрос"""
+    amount = Decimal("150.50")
+    signature = hashlib.sha256(
+        f"1{amount}tx-1{1}{Config.WEBHOOK_SECRET_KEY}".encode()
+    ).hexdigest()
+    token = AuthService.create_token(1, "user")
+    webhook = {
+        "transaction_id": "tx-1",
+        "user_id": 1,
+        "account_id": 1,
+        "amount": "150.50",
+        "signature": signature,
+    }
+    login = {"email": "user@example.com", "password": "userpassword"}
+    assert WebhookService.verify_signature("tx-1", 1, 1, amount, signature)
+
+    results = {
+        "verify_signature": lambda: WebhookService.verify_signature(
+            "tx-1", 1, 1, amount, signature
+        ),
+        "create_token": lambda: AuthService.create_token(1, "user"),
+        "decode_token": lambda: AuthService.decode_token(token),
+        "validate_webhook_request": lambda: WebhookRequest.model_validate(webhook),
+        "validate_login_request": lambda: LoginRequest.model_validate(login),
+    }
+
+    # Построение выражений из services.py и ключа кеша компиляции, который
+    # SQLAlchemy вычисляет при каждом выполнении
+    statements = {
+        "payments_by_user": lambda: select(Payment).where(Payment.user_id == 1),
+        "payment_rows_by_user": lambda: select(*columns(Payment, PaymentRow)).where(
+            Payment.user_id == 1
+        ),
+        "account_rows_by_user": lambda: select(*columns(Account, AccountRow)).where(
+            Account.user_id == 1
+        ),
+        "account_by_id_and_user": lambda: select(Account).where(
+            Account.id == 1, Account.user_id == 1
+        ),
+        # Проверка повтора в PaymentService._transaction_exists
+        "transaction_exists": lambda: select(PaymentTransaction.payment_id).where(
+            PaymentTransaction.transaction_id == "tx-1"
+        ),
+    }
+    for name, build in statements.items():
+        results[f"statement.{name}"] = build
+        results[f"statement.{name}.cache_key"] = (
+            lambda build=build: build()._generate_cache_key()
+        )
+
+    report = {name: measure_per_call(fn, args.repeat) for name, fn in results.items()}
+
+    # Сериализация: model_validate/model_dump + custom_json_serializer против
+    # render_many на 1/100/10k строк
+    for rows in (1, 100, 10000):
+        payments = make_payments(rows)
+        report[f"serialize.legacy.{rows}"] = measure_per_call(
+            lambda: response.json(
+                [PaymentResponse.model_validate(p).model_dump() for p in payments],
+                default=custom_json_serializer,
+            ),
+            args.repeat,
+        )
+        report[f"serialize.render_many.{rows}"] = measure_per_call(
+            lambda: render_many(PaymentResponse, payments), args.repeat
+        )
+    return report
+
+
+def make_database(rows: int):
+    """SQLite в памяти с платежами одного пользователя"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with Session(engine) as session:
+        session.execute(
+            insert(User),
+            [
+                {
+                    "id": 1,
+                    "email": "user@example.com",
+                    "full_name": "Test User",
+                    "password_hash": "x",
+                    "created_at": created_at,
+                }
+            ],
+        )
+        session.execute(
+            insert(Account),
+            [{"id": 1, "user_id": 1, "balance": 0, "created_at": created_at}],
+        )
+        session.execute(
+            insert(Payment),
+            [
+                {
+                    "id": payment.id,
+                    "transaction_id": payment.transaction_id,
+                    "account_id": 1,
+                    "user_id": 1,
+                    "amount": payment.amount,
+                    "created_at": payment.created_at,
+                }
+                for payment in make_payments(rows)
+            ],
+        )
+        session.commit()
+    return engine
+
+
+def bench_projection(args) -> dict:
+    """Сравнение загрузки ORM-объектов с выборкой колонок в PaymentRow"""
+    engine = make_database(args.rows)
+
+    def load_entities():
+        with Session(engine) as session:
+            stmt = select(Payment).where(Payment.user_id == 1)
+            return session.execute(stmt).scalars().all()
+
+    def load_rows():
+        with Session(engine) as session:
+            stmt = select(*columns(Payment, PaymentRow)).where(Payment.user_id == 1)
+            return list(map(PaymentRow._make, session.execute(stmt)))
+
+    entities = load_entities()
+    rows = load_rows()
+    return {
+        "rows": args.rows,
+        "orm": {
+            "load": measure(load_entities, args.repeat),
+            "render": measure(
+                lambda: render_many(PaymentResponse, entities), args.repeat
+            ),
+            "retained_bytes": measure_memory(load_entities),
+        },
+        "projection": {
+            "load": measure(load_rows, args.repeat),
+            "render": measure(lambda: render_many(PaymentResponse, rows), args.repeat),
+            "retained_bytes": measure_memory(load_rows),
+        },
+    }
+
+
+def bench_admin_users(args) -> dict:
+    """Список пользователей со счетами: ORM-проекция и JSON из PostgreSQL"""
+    from app.database import async_session, engine
+    from app.services import UserService
+
+    engine.echo = False
+    limit = args.limit or None
+
+    async def orm_path():
+        async with async_session() as session:
+            users = await UserService.get_user_rows(session, 0, limit)
+        return render_many(UserWithAccountsResponse, users)
+
+    async def sql_json_path():
+        async with async_session() as session:
+            body, _, _ = await UserService.get_users_json(session, 0, limit)
+        return body
+
+    async def run():
+        try:
+            return {
+                "rows": len(json.loads(await sql_json_path())),
+                "orm": {
+                    **await measure_async(orm_path, args.repeat),
+                    "bytes": len(await orm_path()),
+                },
+                "sql_json": {
+                    **await measure_async(sql_json_path, args.repeat),
+                    "bytes": len(await sql_json_path()),
+                },
+            }
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+SCENARIOS = {
+    "admin-users": bench_admin_users,
+    "primitives": bench_primitives,
+    "projection": bench_projection,
+    "render": bench_render,
+}
+
+
+def print_results(name: str, results: dict) -> None:
+    """Печать результатов сценария"""
+    print(f"\n{name}: rows={results.get('rows')}")
+    for variant, stats in results.items():
+        if isinstance(stats, dict):
+            details = ", ".join(f"{key}={value}" for key, value in stats.items())
+            print(f"  {variant:<44} {details}")
+
+
+# Метрики времени, которые сравниваются между прогонами
+TIMING_KEYS = ("min_ms", "min_ns")
+
+
+def flatten_timings(results: dict, prefix: str = "") -> dict:
+    """Плоский словарь замеров вида сценарий.вариант.метрика -> значение"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten_timings(value, path))
+        elif key in TIMING_KEYS:
+            flat[path] = value
+    return flat
+
+
+def compare(base: dict, new: dict, threshold: float) -> list:
+    """Сравнение прогонов; возвращает строки (замер, было, стало, изменение %)"""
+    base_timings = flatten_timings(base["results"])
+    new_timings = flatten_timings(new["results"])
+    rows = []
+    for path in sorted(base_timings.keys() & new_timings.keys()):
+        before, after = base_timings[path], new_timings[path]
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append((path, before, after, change, change > threshold))
+    return rows
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_compare(args) -> None:
+    base, new = (json.loads(Path(path).read_text()) for path in args.paths)
+    rows = compare(base, new, args.threshold)
+    regressions = [row for row in rows if row[4]]
+    print(f"base: {base.get('commit')}, new: {new.get('commit')}")
+    for path, before, after, change, regressed in rows:
+        mark = "REGRESSION" if regressed else ""
+        print(f"  {path:<60} {before:>12} -> {after:>12} {change:+7.1f}% {mark}")
+    print(f"\n{len(regressions)} regression(s) above {args.threshold}%")
+    if regressions:
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("scenario", choices=sorted([*SCENARIOS, "compare"]))
+    parser.add_argument("paths", nargs="*", help="base.json new.json для compare")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=0, help="размер страницы")
+    parser.add_argument("--output", help="файл для JSON-результата")
+    parser.add_argument(
+        "--threshold", type=float, default=10.0, help="порог регрессии, %%"
+    )
+    args = parser.parse_args()
+
+    if args.scenario == "compare":
+        if len(args.paths) != 2:
+            parser.error("compare требует два файла: base.json new.json")
+        run_compare(args)
+        return
+
+    results = SCENARIOS[args.scenario](args)
+    print_results(args.scenario, results)
+    if args.output:
+        report = {
+            "scenario": args.scenario,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "args": {key: value for key, value in vars(args).items() if key != "paths"},
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
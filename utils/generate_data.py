@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Генератор тестовых данных промышленного объема
+
+Пользователи, счета и платежи загружаются в PostgreSQL из DATABASE_URL
+через COPY (asyncpg copy_records_to_table) одной транзакцией. Данные
+дописываются к существующим: идентификаторы начинаются после текущего
+максимума, последовательности id сдвигаются в конце. Недостающие месячные
+секции payments за период создаются, для каждого платежа пишется запись
+payment_transactions.
+
+Распределения:
+- число счетов у пользователя: 1 + геометрическое (--accounts-per-user среднее)
+- платежи по счетам: степенной закон (Zipf с показателем --alpha), часть
+  платежей (--hot-share) приходится на --hot-accounts «горячих» счетов
+- время платежей: равномерно за --days дней до --end, id растут со временем
+- суммы: логнормальные (таблица из 4096 значений), от 0.01 до 99999.99
+
+Баланс каждого счета равен сумме его платежей. Все пользователи получают
+один пароль (--password), bcrypt-хеш вычисляется один раз с солью из
+--seed. Одинаковые --seed и --end на пустой базе дают одинаковые данные,
+включая хеш пароля.
+
+Платежи старше границы архива (app/archive.py) не показываются в списке
+платежей, поэтому генератор отказывается писать период, начинающийся
+раньше границы: выберите более позднее --end или меньшее --days.
+
+    python utils/generate_data.py --users 1000000 --payments 10000000 --seed 1
+    python utils/generate_data.py --users 100000 --payments 1000000 --dry-run
+"""
+
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy.engine import make_url
+
+from app.archive import PaymentArchive
+from app.auth import AuthService
+from app.config import Config
+from app.partitions import ensure_partitions
+
+FIRST_NAMES = ["Anna", "Ivan", "Maria", "Petr", "Olga", "Sergey", "Elena", "Dmitry"]
+LAST_NAMES = ["Ivanov", "Petrov", "Smirnov", "Kuznetsov", "Popov", "Sokolov"]
+MAX_CENTS = 9_999_999
+AMOUNT_TABLE_SIZE = 4096
+BCRYPT_ALPHABET = b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+TRANSACTION_COLUMNS = ("transaction_id", "payment_id", "created_at")
+USER_COLUMNS = ("id", "email", "full_name", "password_hash", "created_at")
+ACCOUNT_COLUMNS = ("id", "user_id", "balance", "created_at")
+PAYMENT_COLUMNS = (
+    "id",
+    "transaction_id",
+    "account_id",
+    "user_id",
+    "amount",
+    "created_at",
+)
+
+
+def seeded_salt(rng: random.Random) -> bytes:
+    """Соль bcrypt из генератора данных: 22 символа base64 bcrypt (128 бит,
+    у последнего символа значимы только старшие 2 бита)"""
+    chars = bytes(rng.choice(BCRYPT_ALPHABET) for _ in range(21))
+    return b"$2b$12$" + chars + bytes([rng.choice(b".Oeu")])
+
+
+class Dataset:
+    """Детерминированная генерация строк по seed и начальным id"""
+
+    def __init__(self, args, first_user: int, first_account: int, first_payment: int):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.first_user = first_user
+        self.first_account = first_account
+        self.first_payment = first_payment
+        self.end = args.end
+        self.start = args.end - timedelta(days=args.days)
+        self.password_hash = AuthService.hash_password(
+            args.password, seeded_salt(self.rng)
+        )
+
+        # Владельцы счетов: счет i принадлежит пользователю owners[i]
+        stop = 1 / max(args.accounts_per_user, 1.0)
+        self.owners: List[int] = []
+        for user_id in range(first_user, first_user + args.users):
+            count = 1
+            while count < 20 and self.rng.random() > stop:
+                count += 1
+            self.owners.extend(itertools.repeat(user_id, count))
+        self.balances = [0] * len(self.owners)
+
+        # Степенной закон: вес счета 1 / rank^alpha при случайном порядке рангов
+        ranks = list(range(1, len(self.owners) + 1))
+        self.rng.shuffle(ranks)
+        self.cum_weights = list(
+            itertools.accumulate(rank**-args.alpha for rank in ranks)
+        )
+        hot = min(args.hot_accounts, len(self.owners))
+        self.hot = self.rng.sample(range(len(self.owners)), hot) if hot else []
+
+    def created_at(self) -> datetime:
+        return self.start - timedelta(seconds=self.rng.random() * 86400 * 30)
+
+    def users(self, batch_size: int) -> Iterator[list]:
+        rng = self.rng
+        batch = []
+        for user_id in range(self.first_user, self.first_user + self.args.users):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            batch.append(
+                (
+                    user_id,
+                    f"user{user_id}@example.com",
+                    name,
+                    self.password_hash,
+                    self.created_at(),
+                )
+            )
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def accounts(self, batch_size: int) -> Iterator[list]:
+        batch = []
+        for index, user_id in enumerate(self.owners):
+            batch.append((self.first_account + index, user_id, 0, self.created_at()))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def balances_of(self, batch_size: int) -> Iterator[list]:
+        """Итоговые балансы счетов с платежами (после генерации платежей)"""
+        batch = []
+        for index, cents in enumerate(self.balances):
+            if cents:
+                batch.append((self.first_account + index, cents))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def payments(self, batch_size: int) -> Iterator[list]:
+        """Платежи в порядке времени; попутно накапливаются балансы счетов"""
+        args, rng = self.args, self.rng
+        total = args.payments
+        start = self.start.timestamp()
+        span = self.end.timestamp() - start
+        population = range(len(self.owners))
+        owners, balances, first_account = self.owners, self.balances, self.first_account
+        # Суммы (в копейках) выбираются из таблицы логнормальных значений:
+        # lognormvariate на каждую строку заметно замедляет генерацию
+        cents_table = [
+            min(max(int(rng.lognormvariate(math.log(2000), 1.2)), 1), MAX_CENTS)
+            for _ in range(AMOUNT_TABLE_SIZE)
+        ]
+        amount_population = range(AMOUNT_TABLE_SIZE)
+        getrandbits, fromtimestamp, utc = (
+            rng.getrandbits,
+            datetime.fromtimestamp,
+            timezone.utc,
+        )
+        payment_id = self.first_payment
+
+        for offset in range(0, total, batch_size):
+            size = min(batch_size, total - offset)
+            indexes = rng.choices(population, cum_weights=self.cum_weights, k=size)
+            if self.hot:
+                for i in rng.sample(range(size), round(size * args.hot_share)):
+                    indexes[i] = rng.choice(self.hot)
+            amounts = rng.choices(amount_population, k=size)
+            for index, amount in zip(indexes, amounts):
+                balances[index] += cents_table[amount]
+
+            # Отрезок времени пакета, внутри пакета время отсортировано
+            base = start + span * offset / total
+            width = span * size / total
+            moments = sorted([base + rng.random() * width for _ in range(size)])
+
+            yield [
+                (
+                    payment_id + i,
+                    getrandbits(128).to_bytes(16, "big").hex(),
+                    first_account + index,
+                    owners[index],
+                    cents_table[amount],
+                    fromtimestamp(moment, utc),
+                )
+                for i, (index, amount, moment) in enumerate(
+                    zip(indexes, amounts, moments)
+                )
+            ]
+            payment_id += size
+
+
+async def next_ids(conn) -> tuple:
+    row = await conn.fetchrow("""
+        SELECT (SELECT coalesce(max(id), 0) + 1 FROM users),
+               (SELECT coalesce(max(id), 0) + 1 FROM accounts),
+               (SELECT coalesce(max(id), 0) + 1 FROM payments)
+        """)
+    return tuple(row)
+
+
+async def copy(conn, table: str, columns, batches, stats: dict, derived=None) -> None:
+    """COPY пакетов; следующий пакет генерируется в потоке, пока сервер
+    обрабатывает текущий. derived — (таблица, колонки, функция) для строк,
+    вычисляемых из каждого пакета"""
+    started = time.perf_counter()
+    rows = 0
+    loop = asyncio.get_running_loop()
+    batches = iter(batches)
+    pending = loop.run_in_executor(None, next, batches, None)
+    while (batch := await pending) is not None:
+        pending = loop.run_in_executor(None, next, batches, None)
+        if conn is not None:
+            await conn.copy_records_to_table(table, records=batch, columns=columns)
+            if derived is not None:
+                derived_table, derived_columns, project = derived
+                await conn.copy_records_to_table(
+                    derived_table, records=project(batch), columns=derived_columns
+                )
+        rows += len(batch)
+    elapsed = time.perf_counter() - started
+    stats[table] = (rows, elapsed)
+    print(
+        f"{table:<10} {rows:>12,} rows {elapsed:>8.1f}s {rows / elapsed:>12,.0f} rows/s"
+    )
+
+
+def check_archive_boundary(start: datetime) -> None:
+    """Отказ, если период платежей начинается до границы архива"""
+    boundary = PaymentArchive(Config.ARCHIVE_DIR, 0).boundary()
+    if boundary is not None and start < boundary:
+        raise SystemExit(
+            f"payments would start at {start.isoformat()}, before the archive "
+            f"boundary {boundary.isoformat()}; such payments are never listed. "
+            "Use a later --end or fewer --days"
+        )
+
+
+async def load(args) -> None:
+    conn = None
+    first_ids = (1, 1, 1)
+    if not args.dry_run:
+        import asyncpg
+
+        check_archive_boundary(args.end - timedelta(days=args.days))
+
+        dsn = make_url(Config.DATABASE_URL).set(drivername="postgresql")
+        conn = await asyncpg.connect(dsn.render_as_string(hide_password=False))
+        first_ids = await next_ids(conn)
+
+    dataset = Dataset(args, *first_ids)
+    stats = {}
+    started = time.perf_counter()
+    transaction = conn.transaction() if conn is not None else None
+    try:
+        if transaction is not None:
+            await transaction.start()
+        await copy(conn, "users", USER_COLUMNS, dataset.users(args.batch_size), stats)
+        # Счета вставляются с нулевым балансом (на них ссылаются платежи),
+        # итоговые балансы записываются одним UPDATE после платежей
+        await copy(
+            conn, "accounts", ACCOUNT_COLUMNS, dataset.accounts(args.batch_size), stats
+        )
+        if conn is not None:
+            await ensure_partitions(conn, dataset.end, 0, since=dataset.start)
+        await copy(
+            conn,
+            "payments",
+            PAYMENT_COLUMNS,
+            dataset.payments(args.batch_size),
+            stats,
+            derived=("payment_transactions", TRANSACTION_COLUMNS, transactions_of),
+        )
+        if conn is not None:
+            await set_balances(conn, dataset, args.batch_size)
+            await reset_sequences(conn)
+            await transaction.commit()
+    except BaseException:
+        if transaction is not None:
+            await transaction.rollback()
+        raise
+    finally:
+        if conn is not None:
+            await conn.close()
+
+    rows = sum(count for count, _ in stats.values())
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'total':<10} {rows:>12,} rows {elapsed:>8.1f}s {rows / elapsed:>12,.0f} rows/s"
+    )
+
+
+def transactions_of(payments: list) -> list:
+    """Записи payment_transactions для пакета платежей"""
+    return [(row[1], row[0], row[5]) for row in payments]
+
+
+async def set_balances(conn, dataset: Dataset, batch_size: int) -> None:
+    await conn.execute(
+        "CREATE TEMP TABLE generated_balances (id integer, balance bigint) "
+        "ON COMMIT DROP"
+    )
+    for batch in dataset.balances_of(batch_size):
+        await conn.copy_records_to_table("generated_balances", records=batch)
+    await conn.execute("""
+        UPDATE accounts a SET balance = g.balance
+        FROM generated_balances g
+        WHERE a.id = g.id
+        """)
+
+
+async def reset_sequences(conn) -> None:
+    for table in ("users", "accounts", "payments"):
+        await conn.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT max(id) FROM {table}))"
+        )
+
+
+def parse_end(value: Optional[str]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc).replace(microsecond=0)
+    end = datetime.fromisoformat(value)
+    return end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--accounts-per-user", type=float, default=1.5)
+    parser.add_argument("--payments", type=int, default=1000000)
+    parser.add_argument("--alpha", type=float, default=1.1, help="показатель Zipf")
+    parser.add_argument("--hot-accounts", type=int, default=10)
+    parser.add_argument("--hot-share", type=float, default=0.05)
+    parser.add_argument("--days", type=float, default=365)
+    parser.add_argument("--end", type=parse_end, default=None, help="ISO-дата")
+    parser.add_argument("--password", default="userpassword")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="только генерация, без БД"
+    )
+    args = parser.parse_args()
+    if args.end is None:
+        args.end = parse_end(None)
+
+    asyncio.run(load(args))
+
+
+if __name__ == "__main__":
+    main()
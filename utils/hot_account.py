@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Нагрузка на «горячие» счета с проверкой корректности балансов
+
+Отправляет --payments уникальных вебхуков на --accounts счетов (id начиная
+с --account-offset) и вдобавок повторы части из них (--duplicate-ratio);
+повторы перемешаны с оригиналами, поэтому часть из них приходит
+одновременно с исходной транзакцией. Замеряются rps и p50/p95/p99, затем
+по PostgreSQL из DATABASE_URL проверяется, что:
+
+- каждая транзакция принята ровно один раз (200), остальные попытки — 409
+- в payments ровно одна строка на каждую отправленную транзакцию
+- accounts.balance равен сумме payments.amount по счету и сумме
+  уникальных отправленных платежей
+
+    python utils/hot_account.py --payments 5000 --accounts 1 --concurrency 100
+    python utils/hot_account.py --accounts 3 --duplicate-ratio 0.3 \\
+        --output hot.json
+
+Ответ 503 (очередь вебхуков заполнена или перегружена полоса пула
+соединений) не нарушает корректность: как провайдер, клиент возвращает
+вебхук в очередь через Retry-After секунд и считает такие попытки
+отдельно (retries). Вебхук, получивший 503 больше --max-retries раз,
+считается неожиданным статусом.
+
+Требует запущенный сервер и пользователя --user-id. Перед прогоном
+платежи и счета из диапазона --account-offset удаляются. Код возврата 1,
+если проверка не прошла.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.schemas import to_minor_units
+from load_test import HttpClient, git_commit, retry_after, sign, summarize
+
+ACCOUNT_IDS = "SELECT unnest(CAST(:ids AS integer[]))"
+
+
+def make_webhooks(args, rng: random.Random):
+    """Уникальные платежи и перемешанный поток отправки с повторами"""
+    account_ids = [args.account_offset + i for i in range(args.accounts)]
+    payments = []
+    for _ in range(args.payments):
+        account_id = rng.choice(account_ids)
+        amount = str(Decimal(rng.randint(1, 100000)) / 100)
+        transaction_id = uuid.uuid4().hex
+        payments.append(
+            {
+                "transaction_id": transaction_id,
+                "user_id": args.user_id,
+                "account_id": account_id,
+                "amount": amount,
+                "signature": sign(transaction_id, args.user_id, account_id, amount),
+            }
+        )
+    duplicates = [
+        rng.choice(payments) for _ in range(round(args.payments * args.duplicate_ratio))
+    ]
+    stream = payments + duplicates
+    rng.shuffle(stream)
+    return account_ids, payments, stream
+
+
+async def reset_accounts(account_ids) -> None:
+    async with engine.begin() as conn:
+        params = {"ids": account_ids}
+        await conn.execute(
+            text(
+                "DELETE FROM payment_transactions WHERE transaction_id IN "
+                f"(SELECT transaction_id FROM payments WHERE account_id IN ({ACCOUNT_IDS}))"
+            ),
+            params,
+        )
+        await conn.execute(
+            text(f"DELETE FROM payments WHERE account_id IN ({ACCOUNT_IDS})"), params
+        )
+        await conn.execute(
+            text(f"DELETE FROM accounts WHERE id IN ({ACCOUNT_IDS})"), params
+        )
+
+
+async def fire(args, stream):
+    """Отправка потока вебхуков с --concurrency соединений.
+
+    Вебхук, получивший 503, возвращается в очередь через Retry-After.
+    Возвращает времена ответов, статусы, число 200 по транзакциям, число
+    повторов после 503 и длительность прогона.
+    """
+    url = urlsplit(args.url)
+    queue = asyncio.Queue()
+    for body in stream:
+        queue.put_nowait((body, 0))
+    latencies = []
+    statuses = Counter()
+    accepted = Counter()
+    retries = 0
+    # Вебхуки, ожидающие повтора: воркер не завершается, пока они есть
+    waiting = 0
+
+    async def worker():
+        nonlocal retries, waiting
+        client = HttpClient(url.hostname, url.port or 80)
+        try:
+            while not queue.empty() or waiting:
+                if queue.empty():
+                    await asyncio.sleep(0.01)
+                    continue
+                body, attempt = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    status, _ = await client.request(
+                        "POST", "/api/webhooks/payment", body
+                    )
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    client.close()
+                    status = 0
+                if status == 503 and attempt < args.max_retries:
+                    # Перегрузка сервера: провайдер повторит вебхук позже
+                    retries += 1
+                    waiting += 1
+                    try:
+                        await asyncio.sleep(retry_after(client.headers))
+                        queue.put_nowait((body, attempt + 1))
+                    finally:
+                        waiting -= 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+                if status == 200:
+                    accepted[body["transaction_id"]] += 1
+        finally:
+            client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, statuses, accepted, retries, time.perf_counter() - started
+
+
+def check_responses(payments, statuses, accepted) -> list:
+    """Расхождения в ответах: только 200 и 409, каждая транзакция принята
+    ровно один раз"""
+    problems = []
+    unexpected = {s: n for s, n in statuses.items() if s not in (200, 409)}
+    if unexpected:
+        problems.append(f"unexpected statuses: {unexpected}")
+    sent = {payment["transaction_id"] for payment in payments}
+    not_once = {tx: accepted[tx] for tx in sent if accepted[tx] != 1}
+    if not_once:
+        problems.append(
+            f"{len(not_once)} transactions not accepted exactly once, "
+            f"e.g. {next(iter(not_once.items()))}"
+        )
+    return problems
+
+
+async def verify(account_ids, payments, statuses, accepted) -> list:
+    """Расхождения между отправленными платежами, ответами и состоянием БД"""
+    problems = check_responses(payments, statuses, accepted)
+    sent = {payment["transaction_id"] for payment in payments}
+
+    # Суммы в БД хранятся в минимальных единицах
+    expected = defaultdict(int)
+    for payment in payments:
+        expected[payment["account_id"]] += to_minor_units(Decimal(payment["amount"]))
+
+    params = {"ids": account_ids}
+    async with engine.connect() as conn:
+        rows = await conn.execute(
+            text(
+                "SELECT transaction_id, count(*) FROM payments "
+                f"WHERE account_id IN ({ACCOUNT_IDS}) GROUP BY transaction_id"
+            ),
+            params,
+        )
+        stored = dict(rows.all())
+        balances = await conn.execute(
+            text(
+                "SELECT a.id, a.balance, coalesce(sum(p.amount), 0) FROM accounts a "
+                "LEFT JOIN payments p ON p.account_id = a.id "
+                f"WHERE a.id IN ({ACCOUNT_IDS}) GROUP BY a.id, a.balance"
+            ),
+            params,
+        )
+        balances = {row[0]: (row[1], row[2]) for row in balances}
+
+    applied_twice = {tx: n for tx, n in stored.items() if n > 1}
+    if applied_twice:
+        problems.append(f"{len(applied_twice)} transactions stored more than once")
+    if set(stored) != sent:
+        problems.append(
+            f"payments mismatch: {len(sent - set(stored))} missing, "
+            f"{len(set(stored) - sent)} unexpected"
+        )
+    for account_id in sorted(expected):
+        balance, total = balances.get(account_id, (None, None))
+        if not (balance == total == expected[account_id]):
+            problems.append(
+                f"account {account_id}: balance={balance} payments={total} "
+                f"expected={expected[account_id]}"
+            )
+    return problems
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    account_ids, payments, stream = make_webhooks(args, rng)
+    await reset_accounts(account_ids)
+    latencies, statuses, accepted, retries, elapsed = await fire(args, stream)
+    problems = await verify(account_ids, payments, statuses, accepted)
+    await engine.dispose()
+    return {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "webhooks": summarize(
+            latencies,
+            statuses,
+            sum(n for status, n in statuses.items() if status not in (200, 409)),
+            elapsed,
+            retries,
+        ),
+        "consistent": not problems,
+        "problems": problems,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--payments", type=int, default=5000, help="уникальных")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--account-offset", type=int, default=900000)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument(
+        "--max-retries", type=int, default=20, help="повторов вебхука после 503"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="файл для JSON-результата")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text_report = json.dumps(report, indent=2)
+    print(text_report)
+    if args.output:
+        Path(args.output).write_text(text_report + "\n")
+    if not report["consistent"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
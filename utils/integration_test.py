@@ -36,6 +36,23 @@ import requests
 BASE_URL = "http://localhost:8000"
 REQUEST_TIMEOUT = 30  # Увеличенный таймаут для Docker
 
+# Ответы обработчиков, заблокировавших event loop. Заголовок X-Loop-Blocked-Ms
+# выставляет сервер, запущенный с LOOP_WATCHDOG_STRICT=true
+loop_blocks = []
+
+
+def record_loop_block(response, *args, **kwargs):
+    """Запоминание ответов с заголовком блокировки event loop"""
+    blocked = response.headers.get("X-Loop-Blocked-Ms")
+    if blocked:
+        loop_blocks.append(
+            f"{response.request.method} {response.request.path_url}: {blocked} ms"
+        )
+
+
+http = requests.Session()
+http.hooks["response"].append(record_loop_block)
+
 
 # ANSI цвета для красивого вывода
 class Colors:
@@ -90,7 +107,7 @@ def check_user_auth():
     print_header("АВТОРИЗАЦИЯ ПОЛЬЗОВАТЕЛЯ")
 
     try:
-        response = requests.post(
+        response = http.post(
             f"{BASE_URL}/api/auth/user/login",
             json={"email": "user@example.com", "password": "userpassword"},
             timeout=REQUEST_TIMEOUT,
@@ -125,7 +142,7 @@ def check_admin_auth():
     print_header("АВТОРИЗАЦИЯ АДМИНИСТРАТОРА")
 
     try:
-        response = requests.post(
+        response = http.post(
             f"{BASE_URL}/api/auth/admin/login",
             json={"email": "admin@example.com", "password": "adminpassword"},
             timeout=REQUEST_TIMEOUT,
@@ -164,7 +181,7 @@ def check_user_endpoints(token):
 
     # Получение данных о себе
     try:
-        response = requests.get(
+        response = http.get(
             f"{BASE_URL}/api/users/me", headers=headers, timeout=REQUEST_TIMEOUT
         )
         if response.status_code == 200:
@@ -187,7 +204,7 @@ def check_user_endpoints(token):
 
     # Получение счетов
     try:
-        response = requests.get(
+        response = http.get(
             f"{BASE_URL}/api/users/me/accounts",
             headers=headers,
             timeout=REQUEST_TIMEOUT,
@@ -213,7 +230,7 @@ def check_user_endpoints(token):
 
     # Получение платежей
     try:
-        response = requests.get(
+        response = http.get(
             f"{BASE_URL}/api/users/me/payments",
             headers=headers,
             timeout=REQUEST_TIMEOUT,
@@ -245,7 +262,7 @@ def check_admin_endpoints(token):
 
     # Получение данных о себе
     try:
-        response = requests.get(
+        response = http.get(
             f"{BASE_URL}/api/admin/me", headers=headers, timeout=REQUEST_TIMEOUT
         )
         if response.status_code == 200:
@@ -268,7 +285,7 @@ def check_admin_endpoints(token):
 
     # Получение списка пользователей
     try:
-        response = requests.get(
+        response = http.get(
             f"{BASE_URL}/api/admin/users", headers=headers, timeout=REQUEST_TIMEOUT
         )
         if response.status_code == 200:
@@ -331,7 +348,7 @@ def check_webhook():
     }
 
     try:
-        response = requests.post(
+        response = http.post(
             f"{BASE_URL}/api/webhooks/payment",
             json=webhook_data,
             timeout=REQUEST_TIMEOUT,
@@ -354,7 +371,7 @@ def check_webhook():
     # Тест с невалидной подписью
     webhook_data["signature"] = "invalid_signature"
     try:
-        response = requests.post(
+        response = http.post(
             f"{BASE_URL}/api/webhooks/payment",
             json=webhook_data,
             timeout=REQUEST_TIMEOUT,
@@ -379,7 +396,7 @@ def check_webhook():
     # Тест дублирующейся транзакции
     webhook_data["signature"] = signature
     try:
-        response = requests.post(
+        response = http.post(
             f"{BASE_URL}/api/webhooks/payment",
             json=webhook_data,
             timeout=REQUEST_TIMEOUT,
@@ -420,7 +437,7 @@ def check_admin_user_management(token):
     }
 
     try:
-        response = requests.post(
+        response = http.post(
             f"{BASE_URL}/api/admin/users",
             headers=headers,
             json=new_user_data,
@@ -441,7 +458,7 @@ def check_admin_user_management(token):
             # Обновление пользователя
             update_data = {"full_name": "Updated Test User"}
             try:
-                response = requests.put(
+                response = http.put(
                     f"{BASE_URL}/api/admin/users/{user_id}",
                     headers=headers,
                     json=update_data,
@@ -466,7 +483,7 @@ def check_admin_user_management(token):
 
             # Удаление пользователя
             try:
-                response = requests.delete(
+                response = http.delete(
                     f"{BASE_URL}/api/admin/users/{user_id}",
                     headers=headers,
                     timeout=REQUEST_TIMEOUT,
@@ -500,6 +517,21 @@ def check_admin_user_management(token):
     return passed, total
 
 
+def check_loop_blocks():
+    """Проверка, что ни один обработчик не блокировал event loop"""
+    print_header("БЛОКИРОВКИ EVENT LOOP")
+
+    for block in loop_blocks:
+        print(f"   📋 {block}")
+    print_test_result(
+        "Обработчики не блокируют event loop",
+        len(loop_blocks),
+        0,
+        "Проверка работает при LOOP_WATCHDOG_STRICT=true на сервере",
+    )
+    return (0 if loop_blocks else 1), 1
+
+
 def main():
     """Основная функция тестирования"""
     print(f"{Colors.BOLD}{Colors.PURPLE}")
@@ -514,7 +546,7 @@ def main():
 
     # Проверяем доступность сервера
     try:
-        response = requests.get(f"{BASE_URL}/", timeout=REQUEST_TIMEOUT)
+        response = http.get(f"{BASE_URL}/", timeout=REQUEST_TIMEOUT)
         print(f"{Colors.GREEN}✅ Сервер доступен{Colors.END}")
     except requests.exceptions.ConnectionError:
         print(
@@ -568,6 +600,11 @@ def main():
     total_passed += passed
     total_tests += total
 
+    # Блокировки event loop
+    passed, total = check_loop_blocks()
+    total_passed += passed
+    total_tests += total
+
     # Итоговая сводка
     print_summary(total_passed, total_tests)
 
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное тестирование API платежной системы
+
+Асинхронный генератор нагрузки с keep-alive соединениями: каждое из
+--concurrency соединений выполняет запросы из смеси операций до истечения
+--duration секунд. Результат (rps, p50/p95/p99, доля ошибок по эндпоинтам)
+выводится в JSON, чтобы сравнивать прогоны между коммитами.
+
+    python utils/load_test.py --concurrency 50 --duration 30
+    python utils/load_test.py --mix webhook=1 --duplicate-ratio 0.1 \\
+        --hot-account-ratio 0.5 --output results.json
+
+Вебхуки зачисляют платежи на --accounts счетов (id начиная с
+--account-offset), распределенных по пользователям --webhook-users;
+счета создаются при первом платеже. Ответ 503 (перегрузка: очередь
+вебхуков или полоса пула соединений) — не ошибка: как провайдер, тест
+повторяет вебхук через Retry-After и считает такие попытки отдельно
+(retries). Требует запущенный сервер и тестовые данные (см. README).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from app.config import Config
+
+DEFAULT_MIX = "login=1,me=4,accounts=4,payments=2,webhook=6"
+GET_OPERATIONS = {
+    "me": "/api/users/me",
+    "accounts": "/api/users/me/accounts",
+    "payments": "/api/users/me/payments",
+}
+
+
+class HttpClient:
+    """Минимальный HTTP/1.1 клиент с keep-alive на одном соединении"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Заголовки последнего ответа (имена в нижнем регистре)
+        self.headers: Dict[str, str] = {}
+
+    async def request(
+        self, method: str, path: str, body: Optional[dict] = None, headers=None
+    ) -> Tuple[int, bytes]:
+        """Запрос; при разрыве простаивавшего соединения повторяется один раз"""
+        payload = json.dumps(body).encode() if body is not None else b""
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(payload)}",
+        ]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode() + payload
+
+        reused = self._writer is not None
+        try:
+            return await self._send(data)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+            return await self._send(data)
+
+    async def _send(self, data: bytes) -> Tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self._writer.write(data)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            body = b""
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self._reader.readexactly(int(headers.get("content-length", 0)))
+
+        self.headers = headers
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, body
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+def retry_after(headers: Dict[str, str], default: float = 1.0) -> float:
+    """Задержка повтора после 503 из заголовка Retry-After, секунды"""
+    try:
+        return max(float(headers.get("retry-after", default)), 0.0)
+    except ValueError:
+        return default
+
+
+def sign(transaction_id: str, user_id: int, account_id: int, amount: str) -> str:
+    """Подпись вебхука (как WebhookService.verify_signature)"""
+    data = f"{account_id}{amount}{transaction_id}{user_id}{Config.WEBHOOK_SECRET_KEY}"
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class LoadTest:
+    """Смесь операций и сбор результатов"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.token: Optional[str] = None
+        self.users = [int(user) for user in args.webhook_users.split(",")]
+        self.accounts = [
+            (args.account_offset + i, self.users[i % len(self.users)])
+            for i in range(args.accounts)
+        ]
+        self.sent: List[dict] = []
+        # Вебхуки, получившие 503: (время повтора, тело, повтор ли это)
+        self.pending: deque = deque()
+        self.measure_from = 0.0
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+        self.retries: Counter = Counter()
+
+    def choose(self) -> str:
+        names, weights = zip(*self.mix.items())
+        return self.rng.choices(names, weights)[0]
+
+    def webhook_body(self) -> Tuple[dict, bool]:
+        """Отложенный после 503 вебхук, новый платеж или повтор принятого"""
+        if self.pending and self.pending[0][0] <= time.perf_counter():
+            _, body, duplicate = self.pending.popleft()
+            return body, duplicate
+        if self.sent and self.rng.random() < self.args.duplicate_ratio:
+            return self.rng.choice(self.sent), True
+
+        if self.rng.random() < self.args.hot_account_ratio:
+            account_id, user_id = self.accounts[0]
+        else:
+            account_id, user_id = self.rng.choice(self.accounts)
+        amount = str(Decimal(self.rng.randint(100, 100000)) / 100)
+        transaction_id = uuid.uuid4().hex
+        body = {
+            "transaction_id": transaction_id,
+            "user_id": user_id,
+            "account_id": account_id,
+            "amount": amount,
+            "signature": sign(transaction_id, user_id, account_id, amount),
+        }
+        return body, False
+
+    def accepted(self, body: dict) -> None:
+        # Повторяются только принятые платежи: для них ожидается 409
+        if len(self.sent) < 10000:
+            self.sent.append(body)
+        else:
+            self.sent[self.rng.randrange(len(self.sent))] = body
+
+    async def login(self, client: HttpClient) -> Tuple[int, bytes]:
+        return await client.request(
+            "POST",
+            "/api/auth/user/login",
+            {"email": self.args.email, "password": self.args.password},
+        )
+
+    async def run_operation(self, client: HttpClient, name: str) -> Tuple[int, set]:
+        """Выполнение операции; возвращает статус и ожидаемые статусы"""
+        auth = {"Authorization": f"Bearer {self.token}"}
+        if name == "login":
+            status, _ = await self.login(client)
+            return status, {200}
+        if name in GET_OPERATIONS:
+            path = GET_OPERATIONS[name]
+            return (await client.request("GET", path, headers=auth))[0], {200}
+        if name == "webhook":
+            body, duplicate = self.webhook_body()
+            status, _ = await client.request("POST", "/api/webhooks/payment", body)
+            if status == 200 and not duplicate:
+                self.accepted(body)
+            elif status == 503:
+                # Провайдер повторит вебхук через Retry-After
+                due = time.perf_counter() + retry_after(client.headers)
+                self.pending.append((due, body, duplicate))
+            return status, {409} if duplicate else {200}
+        raise ValueError(f"unknown operation: {name}")
+
+    async def worker(self, host: str, port: int, deadline: float) -> None:
+        client = HttpClient(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                name = self.choose()
+                started = time.perf_counter()
+                try:
+                    status, expected = await self.run_operation(client, name)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    client.close()
+                    status, expected = 0, {200}
+                finished = time.perf_counter()
+                if status == 503:
+                    # Перегрузка сервера — не ошибка: пауза на Retry-After
+                    if started >= self.measure_from:
+                        self.retries[name] += 1
+                    await asyncio.sleep(retry_after(client.headers))
+                    continue
+                if started < self.measure_from:
+                    continue
+                self.latencies[name].append(finished - started)
+                self.statuses[name][status] += 1
+                if status not in expected:
+                    self.errors[name] += 1
+        finally:
+            client.close()
+
+    async def run(self) -> dict:
+        url = urlsplit(self.args.url)
+        host, port = url.hostname, url.port or 80
+
+        client = HttpClient(host, port)
+        status, body = await self.login(client)
+        client.close()
+        if status != 200:
+            raise SystemExit(f"login failed: {status} {body[:200]!r}")
+        self.token = json.loads(body)["access_token"]
+
+        started = time.perf_counter()
+        self.measure_from = started + self.args.warmup
+        deadline = self.measure_from + self.args.duration
+        await asyncio.gather(
+            *(self.worker(host, port, deadline) for _ in range(self.args.concurrency))
+        )
+        elapsed = time.perf_counter() - self.measure_from
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {
+            name: summarize(
+                self.latencies[name],
+                self.statuses[name],
+                self.errors[name],
+                elapsed,
+                self.retries[name],
+            )
+            for name in sorted(set(self.latencies) | set(self.retries))
+        }
+        all_latencies = [
+            value for values in self.latencies.values() for value in values
+        ]
+        all_statuses = sum(self.statuses.values(), Counter())
+        return {
+            "commit": git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {
+                key: value
+                for key, value in vars(self.args).items()
+                if key != "password"
+            },
+            "elapsed_s": round(elapsed, 3),
+            "total": summarize(
+                all_latencies,
+                all_statuses,
+                sum(self.errors.values()),
+                elapsed,
+                sum(self.retries.values()),
+            ),
+            "endpoints": endpoints,
+        }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(
+    latencies: List[float],
+    statuses: Counter,
+    errors: int,
+    elapsed: float,
+    retries: int = 0,
+) -> dict:
+    """Сводка по эндпоинту: rps, перцентили (мс), ошибки и повторы после 503"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "rps": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        "retries": retries,
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Разбор смеси операций вида name=weight,..."""
+    result = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        result[name.strip()] = float(weight or 1)
+    unknown = set(result) - {"login", "webhook", *GET_OPERATIONS}
+    if unknown:
+        raise SystemExit(f"unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="секунды")
+    parser.add_argument("--warmup", type=float, default=2.0, help="секунды без учета")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса операций")
+    parser.add_argument("--email", default="user@example.com")
+    parser.add_argument("--password", default="userpassword")
+    parser.add_argument("--webhook-users", default="1", help="id пользователей")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--account-offset", type=int, default=100000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    parser.add_argument("--hot-account-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="файл для JSON-результата")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
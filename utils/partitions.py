@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Обслуживание месячных секций таблицы payments
+
+Создает секции на --ahead месяцев вперед и отсоединяет
+(DETACH PARTITION CONCURRENTLY) секции старше --retain полных месяцев.
+Отсоединенные таблицы payments_YYYY_MM остаются в базе для архивации;
+--drop удаляет их. Запускается по расписанию (например, ежедневно из cron):
+
+    python utils/partitions.py --ahead 3
+    python utils/partitions.py --ahead 3 --retain 24
+    python utils/partitions.py --list
+
+Работает с PostgreSQL из DATABASE_URL (14+).
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy.engine import make_url
+
+from app.config import Config
+from app.partitions import LIST_PARTITIONS, detach_partitions, ensure_partitions
+
+
+async def run(args) -> None:
+    import asyncpg
+
+    dsn = make_url(Config.DATABASE_URL).set(drivername="postgresql")
+    conn = await asyncpg.connect(dsn.render_as_string(hide_password=False))
+    try:
+        if args.list:
+            for row in await conn.fetch(LIST_PARTITIONS):
+                print(row[0] + (" (detach pending)" if row[1] else ""))
+            return
+
+        now = datetime.now(timezone.utc)
+        for name in await ensure_partitions(conn, now, args.ahead):
+            print(f"created  {name}")
+        if args.retain is not None:
+            for name in await detach_partitions(conn, now, args.retain, args.drop):
+                print(f"{'dropped' if args.drop else 'detached'} {name}")
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--ahead", type=int, default=3, help="месяцев вперед")
+    parser.add_argument(
+        "--retain", type=int, default=None, help="хранить месяцев (без — не трогать)"
+    )
+    parser.add_argument("--drop", action="store_true", help="удалять отсоединенные")
+    parser.add_argument("--list", action="store_true", help="только список секций")
+    args = parser.parse_args()
+    if args.drop and args.retain is None:
+        parser.error("--drop requires --retain")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
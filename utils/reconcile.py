@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Сверка балансов счетов с платежами
+
+Выполняет шаги сверки app/reconciliation.py, пока watermark не догонит
+новые платежи (с --full-audit — и пока аудит не обойдет все счета), с
+ограничением скорости --rate платежей в секунду. Может работать
+одновременно с фоновой сверкой воркеров (RECONCILE_ENABLED): шаги
+разделены advisory lock.
+
+    python utils/reconcile.py
+    python utils/reconcile.py --full-audit --repair
+    python utils/reconcile.py --status
+    python utils/reconcile.py --report 20
+
+Выход с кодом 1, если найдены неисправленные расхождения.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+
+from app.config import Config
+from app.database import engine
+from app.reconciliation import Reconciler
+
+STATUS = text("""
+    SELECT s.watermark, s.audit_after, s.updated_at,
+           (SELECT count(*) FROM payments WHERE id > s.watermark),
+           (SELECT count(*) FROM balance_drifts WHERE NOT repaired)
+    FROM reconciliation_state s WHERE s.id = 1
+    """)
+
+REPORT = text("""
+    SELECT detected_at, account_id, balance, expected, repaired
+    FROM balance_drifts ORDER BY id DESC LIMIT :limit
+    """)
+
+
+async def status() -> None:
+    async with engine.connect() as conn:
+        row = (await conn.execute(STATUS)).one()
+    print(f"watermark       {row[0]} (updated {row[2]:%Y-%m-%d %H:%M:%S})")
+    print(f"audit after     account {row[1]}")
+    print(f"unreconciled    {row[3]} payments")
+    print(f"open drifts     {row[4]}")
+
+
+async def report(limit: int) -> None:
+    async with engine.connect() as conn:
+        rows = (await conn.execute(REPORT, {"limit": limit})).all()
+    for detected_at, account_id, balance, expected, repaired in rows:
+        print(
+            f"{detected_at:%Y-%m-%d %H:%M:%S}  account {account_id}: "
+            f"balance={balance} expected={expected} drift={balance - expected}"
+            f"{' (repaired)' if repaired else ''}"
+        )
+
+
+async def reconcile(args) -> int:
+    reconciler = Reconciler(
+        batch_size=args.batch_size,
+        audit_accounts=args.audit_accounts,
+        settle=Config.RECONCILE_SETTLE_SECONDS,
+        repair=args.repair,
+        max_rows_per_second=args.rate,
+        interval=Config.RECONCILE_INTERVAL,
+        statement_timeout_ms=Config.RECONCILE_STATEMENT_TIMEOUT_MS,
+    )
+    started = time.perf_counter()
+    payments = checked = unrepaired = 0
+    audit_wrapped = not args.full_audit
+    while True:
+        step_started = time.perf_counter()
+        async with engine.connect() as conn:
+            result = await reconciler.step(conn)
+        if result is None:
+            # Шаг выполняет воркер; ждем освобождения блокировки
+            await asyncio.sleep(reconciler.interval)
+            continue
+
+        payments += result["payments"]
+        checked += result["checked"]
+        if result["seeded_accounts"]:
+            print(f"seeded {result['seeded_accounts']} accounts from the archive")
+        for drift in result["drifts"]:
+            unrepaired += not drift["repaired"]
+            print(
+                f"drift: account {drift['account_id']} balance={drift['balance']} "
+                f"expected={drift['expected']}"
+                f"{' (repaired)' if drift['repaired'] else ''}"
+            )
+        audit_wrapped = audit_wrapped or result["audit_wrapped"]
+        if result["caught_up"] and audit_wrapped:
+            break
+        pause = result["payments"] / args.rate
+        await asyncio.sleep(max(pause - (time.perf_counter() - step_started), 0))
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"reconciled {payments} payments, checked {checked} accounts "
+        f"in {elapsed:.1f}s, watermark {result['watermark']}"
+    )
+    return 1 if unrepaired else 0
+
+
+async def run(args) -> int:
+    try:
+        if args.status:
+            await status()
+            return 0
+        if args.report is not None:
+            await report(args.report)
+            return 0
+        return await reconcile(args)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=Config.RECONCILE_BATCH_SIZE,
+        help="платежей за шаг",
+    )
+    parser.add_argument(
+        "--audit-accounts",
+        type=int,
+        default=Config.RECONCILE_AUDIT_ACCOUNTS,
+        help="счетов аудита за шаг",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=Config.RECONCILE_MAX_ROWS_PER_SECOND,
+        help="не больше платежей в секунду",
+    )
+    parser.add_argument("--repair", action="store_true", help="исправлять расхождения")
+    parser.add_argument(
+        "--full-audit", action="store_true", help="дождаться конца круга аудита счетов"
+    )
+    parser.add_argument("--status", action="store_true", help="состояние сверки")
+    parser.add_argument(
+        "--report", type=int, default=None, metavar="N", help="последние расхождения"
+    )
+    args = parser.parse_args()
+    if args.batch_size < 1 or args.audit_accounts < 1 or args.rate <= 0:
+        parser.error("--batch-size, --audit-accounts and --rate must be positive")
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Профилирование холодного старта воркера
+
+Отчет содержит:
+- время импорта по модулям и пакетам (python -X importtime)
+- время импорта app.main и вызова create_app
+- время до первого ответа /health у python -m app.server (--serve)
+
+    python utils/startup_profile.py --top 20
+    python utils/startup_profile.py --serve --json
+
+Код возврата 1, если импорт и create_app не уложились в STARTUP_BUDGET_MS.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH если его там нет
+project_root = Path(__file__).resolve().parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from app.config import Config
+
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+from app.main import create_app
+imported = time.perf_counter()
+create_app()
+finished = time.perf_counter()
+print((imported - started) * 1000, (finished - imported) * 1000)
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """Разбор вывода -X importtime в список (модуль, self_us, cumulative_us)"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_startup() -> dict:
+    """Замер импорта и create_app в отдельном интерпретаторе"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_ms, create_app_ms = map(float, result.stdout.split())
+    return {
+        "import_ms": round(import_ms, 1),
+        "create_app_ms": round(create_app_ms, 1),
+        "total_ms": round(import_ms + create_app_ms, 1),
+        "modules": parse_importtime(result.stderr),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(timeout: float) -> float:
+    """Время от запуска app.server до первого успешного /health, мс"""
+    port = free_port()
+    env = dict(os.environ, WORKERS="1", PORT=str(port), HOST="127.0.0.1")
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/health", timeout=1
+                ) as response:
+                    if response.status == 200:
+                        return round((time.perf_counter() - started) * 1000, 1)
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("server did not answer /health")
+    finally:
+        # SIGTERM во время старта воркера Sanic может не обработать,
+        # поэтому даем воркеру завершить запуск и страхуемся kill
+        time.sleep(1)
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=Config.GRACEFUL_SHUTDOWN_TIMEOUT + 5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize(modules: list, top: int) -> dict:
+    """Самые дорогие модули и суммарное время по пакетам верхнего уровня"""
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    return {
+        "modules": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cum / 1000}
+            for name, self_us, cum in sorted(modules, key=lambda m: -m[2])[:top]
+        ],
+        "packages": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(packages.items(), key=lambda p: -p[1])[:top]
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--serve", action="store_true", help="замерить первый ответ")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = parser.parse_args()
+
+    startup = measure_startup()
+    report = {
+        "import_ms": startup["import_ms"],
+        "create_app_ms": startup["create_app_ms"],
+        "total_ms": startup["total_ms"],
+        "budget_ms": Config.STARTUP_BUDGET_MS,
+        **summarize(startup["modules"], args.top),
+    }
+    if args.serve:
+        report["first_request_ms"] = measure_first_request(args.timeout)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(
+            f"import: {report['import_ms']} ms, create_app: "
+            f"{report['create_app_ms']} ms, budget: {report['budget_ms']} ms"
+        )
+        if "first_request_ms" in report:
+            print(f"first request: {report['first_request_ms']} ms")
+        print("\nPackages (self time):")
+        for item in report["packages"]:
+            print(f"  {item['self_ms']:>8.1f} ms  {item['package']}")
+        print("\nModules (cumulative time):")
+        for item in report["modules"]:
+            print(f"  {item['cumulative_ms']:>8.1f} ms  {item['module']}")
+
+    if report["total_ms"] > Config.STARTUP_BUDGET_MS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()